@@ -3,17 +3,24 @@ FastAPI application entrypoint for EcoGrid AI backend.
 
 Exposes CRUD APIs, ML prediction retrieval, and simulation triggers.
 Integrates routers under /api/* and enables CORS for local dev.
+Request latency and ML stage timings are exposed at /metrics (Prometheus text).
 """
 
 from __future__ import annotations
 
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from .routes.admin import router as admin_router
 from .routes.predict import router as predict_router
 from .routes.sensors import router as sensors_router
 from .routes.simulate import router as simulate_router
 
+from ...ml.metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, render_prometheus
+from ...ml.profiling import capture_request_inputs, is_armed
+
 
 def create_app() -> FastAPI:
     app = FastAPI(title="EcoGrid AI Backend", version="0.1.0")
@@ -27,15 +34,51 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        # Label by handler name (not raw path) to keep series cardinality bounded
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=request.method,
+                handler=getattr(route, "name", "unmatched"),
+                status=str(status_code),
+            )
+
+    @app.middleware("http")
+    async def record_profile_inputs(request: Request, call_next):
+        # Only pays the body read when request profiling is armed
+        if is_armed("request"):
+            capture_request_inputs(
+                method=request.method,
+                path=request.url.path,
+                query=dict(request.query_params),
+                body=await request.body(),
+                content_type=request.headers.get("content-type"),
+            )
+        return await call_next(request)
+
     app.include_router(sensors_router, prefix="/api/sensors", tags=["sensors"])
     app.include_router(predict_router, prefix="/api/predict", tags=["predict"])
     app.include_router(simulate_router, prefix="/api/simulate", tags=["simulate"])
+    app.include_router(admin_router, prefix="/api/admin", tags=["admin"])
 
     @app.get("/health")
     def health():
         # Basic liveness endpoint
         return {"status": "ok"}
 
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(content=render_prometheus(), media_type=CONTENT_TYPE)
+
     return app
 
 
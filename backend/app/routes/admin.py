@@ -0,0 +1,41 @@
+"""
+Admin endpoints for operational controls.
+
+Arms opt-in profiling of the next N cascade jobs and/or API requests and lists
+recent profile captures (see ml/profiling.py).
+"""
+
+from __future__ import annotations
+
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+
+from ..auth import require_api_key
+
+from ....ml.profiling import PROFILE_KINDS, arm, list_captures, status
+
+
+router = APIRouter()
+
+
+class ProfileRequest(BaseModel):
+    count: int = Field(1, ge=0, le=100, description="Number of runs to profile per kind; 0 disarms")
+    kinds: List[str] = Field(default_factory=lambda: list(PROFILE_KINDS), description="job and/or request")
+
+
+@router.get("/profile")
+def get_profile_status(_: str = Depends(require_api_key)):
+    # Current arming state and the most recent captures
+    return {**status(), "captures": list_captures()}
+
+
+@router.post("/profile")
+def arm_profiling(req: ProfileRequest, _: str = Depends(require_api_key)):
+    # Arm profiling for the next N jobs/requests in this process
+    try:
+        remaining = arm(req.count, req.kinds)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return {"remaining": remaining}
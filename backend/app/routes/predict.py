@@ -2,55 +2,134 @@
 Prediction retrieval endpoints.
 
 Reads latest entries from SQLite DB written by the ML cascade orchestrator
-and returns energy/water predictions and anomaly summaries.
+and returns energy/water predictions and anomaly summaries. The water outlook
+is computed from the models directly (cached per 10-minute cascade tick).
+
+DB reads run on a small dedicated thread pool, not Starlette's shared one, so
+a slow query or a writer lock cannot stall unrelated routes. Reads open the
+DB read-only and are bounded three ways: a non-blocking slot check (503 when
+all slots are busy), a per-query deadline that interrupts SQLite, and an
+overall request timeout (504).
+
+Configuration: ECOGRID_DB_READ_WORKERS (default 4),
+ECOGRID_DB_QUERY_TIMEOUT seconds (default 2.0)
 """
 
 from __future__ import annotations
 
 import os
+import time
+import asyncio
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 
 from ..auth import require_api_key
+from ..serialization import NumpyJSONResponse, negotiated_response
+from ....ml.metrics import REGISTRY
+from ....ml.water_model import forecast_water_horizon
 
 
 router = APIRouter()
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
 DB_PATH = os.path.join(BASE_DIR, "ecogrid.db")
+DB_READ_WORKERS = int(os.environ.get("ECOGRID_DB_READ_WORKERS", "4"))
+DB_QUERY_TIMEOUT = float(os.environ.get("ECOGRID_DB_QUERY_TIMEOUT", "2.0"))
+
+DB_READS = REGISTRY.counter(
+    "ecogrid_db_reads_total",
+    "Prediction DB reads by outcome (ok, busy, timeout).",
+    ("outcome",),
+)
+
+_DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_READ_WORKERS, thread_name_prefix="db-read")
+# Allows a short queue behind the workers; beyond that, callers get 503 at once
+_DB_SLOTS = threading.BoundedSemaphore(DB_READ_WORKERS * 2)
+
 
+class _QueryTimeout(Exception):
+    pass
 
-def _fetch_one(query: str) -> Dict[str, Any] | None:
+
+def _fetch_one(query: str, timeout: float = DB_QUERY_TIMEOUT) -> Dict[str, Any] | None:
     if not os.path.exists(DB_PATH):
         return None
-    con = sqlite3.connect(DB_PATH)
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
-    cur.execute(query)
-    row = cur.fetchone()
-    con.close()
+    deadline = time.monotonic() + timeout
+    # Read-only URI: never creates the file or takes a write lock
+    con = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, timeout=timeout, check_same_thread=False)
+    try:
+        con.row_factory = sqlite3.Row
+        # Returning non-zero aborts the running statement with "interrupted"
+        con.set_progress_handler(lambda: int(time.monotonic() > deadline), 10_000)
+        try:
+            row = con.execute(query).fetchone()
+        except sqlite3.OperationalError as exc:
+            if time.monotonic() > deadline or "locked" in str(exc):
+                raise _QueryTimeout(str(exc)) from exc
+            raise
+    finally:
+        con.close()
     if not row:
         return None
     return dict(row)
 
 
+async def _read_one(query: str) -> Dict[str, Any] | None:
+    if not _DB_SLOTS.acquire(blocking=False):
+        DB_READS.inc(outcome="busy")
+        raise HTTPException(status_code=503, detail="Prediction store busy, retry shortly")
+    future = _DB_EXECUTOR.submit(_fetch_one, query, DB_QUERY_TIMEOUT)
+    # The slot is held until the worker thread is really done, even after a timeout
+    future.add_done_callback(lambda _: _DB_SLOTS.release())
+    try:
+        row = await asyncio.wait_for(asyncio.wrap_future(future), timeout=DB_QUERY_TIMEOUT + 0.5)
+    except (asyncio.TimeoutError, _QueryTimeout):
+        DB_READS.inc(outcome="timeout")
+        raise HTTPException(status_code=504, detail="Prediction store query timed out")
+    DB_READS.inc(outcome="ok")
+    return row
+
+
 @router.get("/energy")
-def get_latest_energy(_: str = Depends(require_api_key)):
+async def get_latest_energy(_: str = Depends(require_api_key)):
     # Return latest energy prediction row
-    row = _fetch_one("SELECT * FROM energy_predictions ORDER BY id DESC LIMIT 1")
+    row = await _read_one("SELECT * FROM energy_predictions ORDER BY id DESC LIMIT 1")
     if not row:
         raise HTTPException(status_code=404, detail="No energy predictions found")
     return row
 
 
 @router.get("/water")
-def get_latest_water(_: str = Depends(require_api_key)):
+async def get_latest_water(_: str = Depends(require_api_key)):
     # Return latest water prediction row
-    row = _fetch_one("SELECT * FROM water_predictions ORDER BY id DESC LIMIT 1")
+    row = await _read_one("SELECT * FROM water_predictions ORDER BY id DESC LIMIT 1")
     if not row:
         raise HTTPException(status_code=404, detail="No water predictions found")
     return row
 
 
+@router.get("/water/outlook", response_class=NumpyJSONResponse)
+def get_water_outlook(
+    hours: int = Query(6, ge=1, le=24),
+    accept: str | None = Header(default=None),
+    _: str = Depends(require_api_key),
+):
+    # Multi-step [flow, pressure] outlook per zone at 10-minute resolution
+    try:
+        preds, meta = forecast_water_horizon(steps=hours * 6)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return negotiated_response(
+        {
+            "zones": meta["zones"],
+            "step_minutes": 10,
+            "hours": hours,
+            "flow": preds[..., 0],
+            "pressure": preds[..., 1],
+        },
+        accept,
+    )
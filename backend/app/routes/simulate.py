@@ -7,36 +7,94 @@ log results to SQLite, making it easy to prime data for the dashboard.
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel, Field
 
 from ..auth import require_api_key
+from ..serialization import NumpyJSONResponse, negotiated_response
 
 # Import ML cascade orchestrator
-from ....ml.cascade import run_energy_forecast, run_water_forecast
+from ....ml.cascade import PipelineBusy, pipeline_run, run_energy_forecast, run_water_forecast
+from ....ml.energy_model import simulate_energy_scenarios
+from ....ml.profiling import profiled
+from ....ml.water_model import impacted_zones
 
 
 router = APIRouter()
 
 
-@router.post("/energy")
-def simulate_energy(_: str = Depends(require_api_key)):
-    # Trigger an on-demand energy forecast and DB log
-    preds, anomaly, score = run_energy_forecast()
-    return {
-        "predictions_next_6h": preds.tolist() if preds.size else [],
-        "anomaly": bool(anomaly),
-        "anomaly_score": float(score),
-    }
+class EnergyScenarioRequest(BaseModel):
+    perturbations: Dict[str, List[float]] = Field(
+        ..., description="Additive deltas per feature, e.g. {\"temperature\": [1, 2, 3, 4, 5]}"
+    )
+    days: int = Field(7, ge=1, le=90, description="Number of daily windows each scenario is applied to")
+
+
+class WaterImpactRequest(BaseModel):
+    zone_scores: Dict[int, float] = Field(
+        ..., min_length=1, description="Anomaly score per flagged zone, e.g. errors from detect_water_anomalies"
+    )
+    hops: int = Field(3, ge=1, le=20)
+    decay: float = Field(0.5, gt=0, le=1)
+    min_impact: float = Field(0.0, ge=0)
+
+
+@router.post("/energy", response_class=NumpyJSONResponse)
+@profiled("request")
+def simulate_energy(accept: str | None = Header(default=None), _: str = Depends(require_api_key)):
+    # Trigger an on-demand energy forecast and DB log, never alongside a scheduled run
+    try:
+        with pipeline_run("energy"):
+            preds, anomaly, score = run_energy_forecast()
+    except PipelineBusy as exc:
+        raise HTTPException(status_code=409, detail=f"{exc}, retry shortly")
+    return negotiated_response(
+        {
+            "predictions_next_6h": preds,
+            "anomaly": bool(anomaly),
+            "anomaly_score": float(score),
+        },
+        accept,
+    )
+
+
+@router.post("/energy/scenarios")
+@profiled("request")
+def simulate_energy_scenario_grid(req: EnergyScenarioRequest, _: str = Depends(require_api_key)):
+    # Score every perturbation in the grid across `days` windows in batched predicts
+    try:
+        return simulate_energy_scenarios(req.perturbations, days=req.days)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
 
 
-@router.post("/water")
-def simulate_water(_: str = Depends(require_api_key)):
-    # Trigger an on-demand water forecast and DB log
-    preds, is_anom, errors = run_water_forecast()
-    return {
-        "predictions": preds.tolist() if preds.size else [],
-        "anomaly_flags": is_anom.astype(bool).tolist() if is_anom.size else [],
-        "errors": errors.tolist() if errors.size else [],
-    }
+@router.post("/water", response_class=NumpyJSONResponse)
+@profiled("request")
+def simulate_water(accept: str | None = Header(default=None), _: str = Depends(require_api_key)):
+    # Trigger an on-demand water forecast and DB log, never alongside a scheduled run
+    try:
+        with pipeline_run("water"):
+            preds, is_anom, errors = run_water_forecast()
+    except PipelineBusy as exc:
+        raise HTTPException(status_code=409, detail=f"{exc}, retry shortly")
+    return negotiated_response(
+        {
+            "predictions": preds,
+            "anomaly_flags": is_anom.astype(bool),
+            "errors": errors,
+        },
+        accept,
+    )
 
 
+@router.post("/water/impact")
+@profiled("request")
+def simulate_water_impact(req: WaterImpactRequest, _: str = Depends(require_api_key)):
+    # Spread anomaly scores over the zone graph to find affected downstream zones
+    try:
+        impacted = impacted_zones(req.zone_scores, hops=req.hops, decay=req.decay, min_impact=req.min_impact)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return {"source_zones": sorted(req.zone_scores), "impacted": impacted}
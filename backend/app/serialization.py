@@ -0,0 +1,179 @@
+"""
+NumPy-aware API responses.
+
+Routes can return dicts that contain NumPy arrays and scalars directly; the
+arrays are serialized straight from their buffers instead of being converted
+to nested Python lists first and then walked by the default JSON encoder.
+
+The encoding is negotiated from the Accept header:
+
+- application/json (default): plain JSON numbers. Uses orjson's native NumPy
+  support when orjson is installed, and json.dumps otherwise.
+- application/vnd.ecogrid.b64+json: JSON where each array becomes
+  {"dtype", "shape", "data"}, with data holding the base64 of its little-endian
+  bytes. Float arrays are sent as float32.
+- application/msgpack: the same array objects with raw bytes as data (only
+  when msgpack is installed, else JSON).
+"""
+
+from __future__ import annotations
+
+import json
+import base64
+from typing import Any, Optional
+
+import numpy as np
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None  # type: ignore
+
+
+MEDIA_JSON = "application/json"
+MEDIA_B64_JSON = "application/vnd.ecogrid.b64+json"
+MEDIA_MSGPACK = "application/msgpack"
+
+
+# ---------- Encoders ----------
+def _wire_array(arr: np.ndarray) -> np.ndarray:
+    # Floats go out as float32; bool/int keep their dtype. Always little-endian.
+    if arr.dtype.kind == "f":
+        arr = arr.astype("<f4", copy=False)
+    elif arr.dtype.byteorder == ">":
+        arr = arr.astype(arr.dtype.newbyteorder("<"))
+    return np.ascontiguousarray(arr)
+
+
+def _array_header(arr: np.ndarray) -> dict:
+    return {"dtype": arr.dtype.str.lstrip("<|="), "shape": list(arr.shape)}
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        # With orjson, only reached for arrays it cannot take as-is: retry
+        # non-contiguous views as a contiguous copy, list-convert the rest
+        if orjson is not None:
+            contiguous = np.ascontiguousarray(obj)
+            if contiguous is not obj:
+                return contiguous
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _b64_default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        arr = _wire_array(obj)
+        return {**_array_header(arr), "data": base64.b64encode(arr.data).decode("ascii")}
+    return _json_default(obj)
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, np.ndarray):
+        arr = _wire_array(obj)
+        return {**_array_header(arr), "data": arr.tobytes()}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not MessagePack serializable")
+
+
+def _native_byteorder(obj: Any) -> Any:
+    # orjson reads array buffers as native-endian, so swap big-endian arrays first
+    if isinstance(obj, np.ndarray):
+        return obj if obj.dtype.isnative else obj.astype(obj.dtype.newbyteorder("="))
+    if isinstance(obj, dict):
+        return {key: _native_byteorder(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_native_byteorder(value) for value in obj]
+    return obj
+
+
+def encode_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(
+            _native_byteorder(content),
+            default=_json_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+    return json.dumps(content, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def encode_b64_json(content: Any) -> bytes:
+    if orjson is not None:
+        # No OPT_SERIALIZE_NUMPY here, so every array goes through _b64_default
+        return orjson.dumps(content, default=_b64_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_b64_default, separators=(",", ":")).encode("utf-8")
+
+
+# ---------- Responses ----------
+class NumpyJSONResponse(Response):
+    media_type = MEDIA_JSON
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+class Base64ArrayResponse(Response):
+    media_type = MEDIA_B64_JSON
+
+    def render(self, content: Any) -> bytes:
+        return encode_b64_json(content)
+
+
+class MsgpackResponse(Response):
+    media_type = MEDIA_MSGPACK
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def _preferred(accept: str) -> list:
+    # Media types ordered by q-value (stable for ties); q=0 means "not acceptable"
+    ranked = []
+    for i, part in enumerate(accept.split(",")):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media and q > 0:
+            ranked.append((-q, i, media.lower()))
+    return [media for _, _, media in sorted(ranked)]
+
+
+def negotiated_response(content: Any, accept: Optional[str], status_code: int = 200) -> Response:
+    """Encode `content` in the best format the Accept header allows (JSON by default)."""
+    # The body depends on Accept, so caches must key on it
+    headers = {"Vary": "Accept"}
+    for media in _preferred(accept or ""):
+        if media == MEDIA_B64_JSON:
+            return Base64ArrayResponse(content, status_code=status_code, headers=headers)
+        if media in (MEDIA_MSGPACK, "application/x-msgpack") and msgpack is not None:
+            return MsgpackResponse(content, status_code=status_code, headers=headers)
+        if media in (MEDIA_JSON, "application/*", "*/*"):
+            break
+    return NumpyJSONResponse(content, status_code=status_code, headers=headers)
+
+
+__all__ = [
+    "MEDIA_JSON",
+    "MEDIA_B64_JSON",
+    "MEDIA_MSGPACK",
+    "encode_json",
+    "encode_b64_json",
+    "NumpyJSONResponse",
+    "Base64ArrayResponse",
+    "MsgpackResponse",
+    "negotiated_response",
+]
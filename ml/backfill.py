@@ -0,0 +1,366 @@
+"""
+Historical backfill / replay for the energy and water forecasters.
+
+Replays a historical time range through the same windowing, scaling and
+anomaly logic the cascade uses for "now", so a newly deployed model can be
+compared against months of history:
+
+- energy: one tick per hour, 30h lookback (per-window MinMax), next 6h forecast,
+  residual AE scored against the actual next 6h of demand
+- water: one tick per 10 minutes, 12h lookback (MinMax over all zones), next-step
+  [flow, pressure] per zone, AE scored on the actual next-step reading
+
+Every tick in a chunk is built with strided sliding-window views and scored in a
+single batched predict. Chunks are spread across worker processes; the parent
+writes each finished chunk and its checkpoint row in one SQLite transaction, so
+rerunning the same command (same --run-id) resumes where it stopped.
+
+History comes from the simulators, seeded per chunk so replays are deterministic.
+
+Run: python -m ml.backfill --start 2026-06-01 --end 2026-09-01 --workers 4
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import energy_model, water_model
+from .parallel import run_pool
+from .water_model import WATER_FEATURE_COLS
+
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+DB_PATH = os.path.join(BASE_DIR, "ecogrid.db")
+
+# Mirrors the live cascade: fetch_energy_data(hours_back=30), fetch_water_data(hours_back=12)
+ENERGY_LOOKBACK_HOURS = 30
+ENERGY_HORIZON = 6
+ENERGY_SEQUENCE_LENGTH = 24
+WATER_LOOKBACK_STEPS = 12 * 6
+WATER_SEQUENCE_LENGTH = 12
+PREDICT_BATCH_SIZE = 4096
+
+logger = logging.getLogger("backfill")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+# ---------- DB ----------
+def _init_backfill_db(db_path: str) -> None:
+    con = sqlite3.connect(db_path)
+    cur = con.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS backfill_runs (
+            run_id TEXT PRIMARY KEY,
+            args_json TEXT,
+            started_at TEXT
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS backfill_chunks (
+            run_id TEXT,
+            pipeline TEXT,
+            chunk_start TEXT,
+            chunk_end TEXT,
+            rows INTEGER,
+            completed_at TEXT,
+            PRIMARY KEY (run_id, pipeline, chunk_start)
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS energy_backfill (
+            run_id TEXT,
+            timestamp TEXT,
+            preds_json TEXT,
+            anomaly INTEGER,
+            anomaly_score REAL,
+            PRIMARY KEY (run_id, timestamp)
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS water_backfill (
+            run_id TEXT,
+            timestamp TEXT,
+            zone_ids TEXT,
+            preds_json TEXT,
+            anomaly_flags_json TEXT,
+            anomaly_count INTEGER,
+            avg_anomaly_score REAL,
+            PRIMARY KEY (run_id, timestamp)
+        )
+        """
+    )
+    con.commit()
+    con.close()
+
+
+def _completed_chunks(db_path: str, run_id: str) -> set:
+    con = sqlite3.connect(db_path)
+    rows = con.execute("SELECT pipeline, chunk_start FROM backfill_chunks WHERE run_id = ?", (run_id,)).fetchall()
+    con.close()
+    return {(pipeline, start) for pipeline, start in rows}
+
+
+def _write_chunk(con: sqlite3.Connection, run_id: str, pipeline: str, chunk: Tuple[str, str], rows: List[tuple]) -> None:
+    # Results and checkpoint commit together, so a chunk is either fully recorded or redone
+    with con:
+        if pipeline == "energy":
+            con.executemany(
+                "INSERT OR REPLACE INTO energy_backfill(run_id, timestamp, preds_json, anomaly, anomaly_score) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, *row) for row in rows],
+            )
+        else:
+            con.executemany(
+                "INSERT OR REPLACE INTO water_backfill(run_id, timestamp, zone_ids, preds_json, anomaly_flags_json, anomaly_count, avg_anomaly_score) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, *row) for row in rows],
+            )
+        con.execute(
+            "INSERT OR REPLACE INTO backfill_chunks(run_id, pipeline, chunk_start, chunk_end, rows, completed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, pipeline, chunk[0], chunk[1], len(rows), datetime.utcnow().isoformat()),
+        )
+
+
+# ---------- Windowing ----------
+def _minmax_scale(values: np.ndarray, mn: np.ndarray, mx: np.ndarray) -> np.ndarray:
+    """MinMaxScaler semantics with broadcastable per-window min/max (constant features map to 0)."""
+    rng = mx - mn
+    rng[rng == 0] = 1.0
+    return (values - mn) / rng
+
+
+def _energy_chunk(start: datetime, end: datetime, seed: int) -> List[tuple]:
+    np.random.seed(seed)
+    lookback = ENERGY_LOOKBACK_HOURS
+    hist_start = start - timedelta(hours=lookback - 1)
+    periods = int((end - hist_start).total_seconds() // 3600) + ENERGY_HORIZON
+    df = energy_model._simulate_energy_series(start=hist_start, periods=periods, freq_minutes=60)
+
+    demand = df["demand"].to_numpy(dtype=np.float32)
+    base = df[energy_model.ENERGY_FEATURE_COLS[:-1]].to_numpy(dtype=np.float32)
+    # previous_demand, dropping the first row as the live path's dropna does
+    features = np.column_stack([base[1:], demand[:-1]])
+    demand = demand[1:]
+    timestamps = df["timestamp"].to_numpy()[1:]
+
+    win = lookback - 1  # rows left after dropna in the live 30h fetch
+    n_ticks = len(features) - win + 1 - ENERGY_HORIZON
+    if n_ticks <= 0:
+        return []
+    windows = sliding_window_view(features, win, axis=0)[:n_ticks]  # (M, F, win) view
+    mn = windows.min(axis=2)[:, :, np.newaxis]
+    mx = windows.max(axis=2)[:, :, np.newaxis]
+    seq = _minmax_scale(windows[:, :, -ENERGY_SEQUENCE_LENGTH:], mn, mx)
+    X = np.ascontiguousarray(seq.transpose(0, 2, 1), dtype=np.float32)  # (M, seq, F)
+
+    ends = np.arange(n_ticks) + win - 1
+    actual = sliding_window_view(demand, ENERGY_HORIZON)[ends + 1]
+
+    model = energy_model._load_or_train_energy()
+    preds = model.predict(X, batch_size=PREDICT_BATCH_SIZE, verbose=0)
+    is_anom, errors = energy_model.detect_energy_anomalies_batch(preds, actual)
+
+    rows: List[tuple] = []
+    for ts, p, a, e in zip(timestamps[ends], preds, is_anom, errors):
+        ts = np.datetime64(ts, "s").astype(datetime)
+        if start <= ts < end:
+            rows.append((ts.isoformat(), json.dumps(p.tolist()), int(a), float(e)))
+    return rows
+
+
+def _water_chunk(start: datetime, end: datetime, seed: int, zone_ids: Sequence[int]) -> List[tuple]:
+    np.random.seed(seed)
+    hist_start = start - timedelta(minutes=10 * WATER_LOOKBACK_STEPS)
+    hist_end = end + timedelta(minutes=10)  # one step past the range for the observed reading
+    df = water_model._simulate_water_series(hist_start, hist_end, zone_ids)
+    n_zones = len(zone_ids)
+    values = df[WATER_FEATURE_COLS].to_numpy(dtype=np.float32).reshape(n_zones, -1, len(WATER_FEATURE_COLS))
+    timestamps = df["timestamp"].to_numpy()[: values.shape[1]]
+
+    win = WATER_LOOKBACK_STEPS + 1  # inclusive 12h range at 10-minute resolution
+    n_ticks = values.shape[1] - win  # last tick needs one future step
+    if n_ticks <= 0:
+        return []
+    ends = np.arange(n_ticks) + win - 1
+
+    # Live scaling fits one MinMax over every zone in the lookback window
+    windows = sliding_window_view(values, win, axis=1)[:, :n_ticks]  # (Z, M, F, win) view
+    mn = windows.min(axis=(0, 3))[np.newaxis, :, :, np.newaxis]
+    mx = windows.max(axis=(0, 3))[np.newaxis, :, :, np.newaxis]
+    seq = sliding_window_view(values, WATER_SEQUENCE_LENGTH, axis=1)[:, ends - WATER_SEQUENCE_LENGTH + 1]
+    seq = _minmax_scale(seq, mn, mx)  # (Z, M, F, seq)
+    X = np.ascontiguousarray(seq.transpose(1, 0, 3, 2), dtype=np.float32).reshape(-1, WATER_SEQUENCE_LENGTH, len(WATER_FEATURE_COLS))
+
+    model = water_model._load_or_train_water_lstm()
+    preds = model.predict(X, batch_size=PREDICT_BATCH_SIZE, verbose=0).reshape(n_ticks, n_zones, 2)
+    # Observed next-step [flow, pressure] in sensor units, as the AE was trained
+    observed = values[:, ends + 1][:, :, [1, 0]].transpose(1, 0, 2).reshape(-1, 2)
+    is_anom, errors = water_model.detect_water_anomalies(observed, zone_ids=np.tile(np.asarray(zone_ids), n_ticks))
+    is_anom = is_anom.reshape(n_ticks, n_zones)
+    errors = errors.reshape(n_ticks, n_zones)
+
+    zones_json = json.dumps([int(z) for z in zone_ids])
+    rows: List[tuple] = []
+    for ts, p, a, e in zip(timestamps[ends], preds, is_anom, errors):
+        ts = np.datetime64(ts, "s").astype(datetime)
+        if start <= ts < end:
+            rows.append((ts.isoformat(), zones_json, json.dumps(p.tolist()), json.dumps(a.tolist()), int(a.sum()), float(e.mean())))
+    return rows
+
+
+# ---------- Workers ----------
+def _init_worker(models_dir: Optional[str]) -> None:
+    if models_dir:
+        energy_model.ENERGY_MODEL_PATH = os.path.join(models_dir, os.path.basename(energy_model.ENERGY_MODEL_PATH))
+        energy_model.ENERGY_AE_PATH = os.path.join(models_dir, os.path.basename(energy_model.ENERGY_AE_PATH))
+        water_model.WATER_LSTM_PATH = os.path.join(models_dir, os.path.basename(water_model.WATER_LSTM_PATH))
+        water_model.WATER_AE_PATH = os.path.join(models_dir, os.path.basename(water_model.WATER_AE_PATH))
+
+
+def _run_chunk(pipeline: str, start: datetime, end: datetime, seed: int, zone_ids: Sequence[int]) -> Tuple[str, str, str, List[tuple], float]:
+    t0 = time.perf_counter()
+    if pipeline == "energy":
+        rows = _energy_chunk(start, end, seed)
+    else:
+        rows = _water_chunk(start, end, seed, zone_ids)
+    return pipeline, start.isoformat(), end.isoformat(), rows, time.perf_counter() - t0
+
+
+def _chunks(start: datetime, end: datetime, chunk_hours: int) -> List[Tuple[datetime, datetime]]:
+    out = []
+    cursor = start
+    while cursor < end:
+        nxt = min(end, cursor + timedelta(hours=chunk_hours))
+        out.append((cursor, nxt))
+        cursor = nxt
+    return out
+
+
+def run_backfill(
+    start: datetime,
+    end: datetime,
+    pipelines: Sequence[str] = ("energy", "water"),
+    zones: int = 5,
+    chunk_hours: int = 24 * 7,
+    workers: int = 2,
+    run_id: Optional[str] = None,
+    seed: int = 0,
+    models_dir: Optional[str] = None,
+    db_path: str = DB_PATH,
+) -> Tuple[str, int]:
+    """Backfill [start, end); returns (run id, failed chunks). Completed chunks are skipped.
+
+    A chunk that fails is logged and left unrecorded, so rerunning with the
+    same run id retries just the failed chunks.
+    """
+    run_id = run_id or f"{start:%Y%m%d%H}-{end:%Y%m%d%H}-s{seed}"
+    _init_backfill_db(db_path)
+    done = _completed_chunks(db_path, run_id)
+    zone_ids = list(range(1, zones + 1))
+
+    con = sqlite3.connect(db_path)
+    con.execute(
+        "INSERT OR IGNORE INTO backfill_runs(run_id, args_json, started_at) VALUES (?, ?, ?)",
+        (
+            run_id,
+            json.dumps({"start": start.isoformat(), "end": end.isoformat(), "pipelines": list(pipelines), "zones": zones, "seed": seed, "models_dir": models_dir}),
+            datetime.utcnow().isoformat(),
+        ),
+    )
+    con.commit()
+
+    tasks = []
+    for pipeline in pipelines:
+        for i, (c_start, c_end) in enumerate(_chunks(start, end, chunk_hours)):
+            if (pipeline, c_start.isoformat()) in done:
+                continue
+            # Per-chunk seed keeps replays and resumes deterministic
+            chunk_seed = (seed * 1_000_003 + i * 2 + (pipeline == "water")) % 2**32
+            tasks.append((pipeline, c_start, c_end, chunk_seed, zone_ids))
+    logger.info("Backfill %s: %d chunks pending (%d already done)", run_id, len(tasks), len(done))
+
+    t0 = time.perf_counter()
+    total_rows = 0
+    failed = 0
+
+    def _store(result) -> None:
+        nonlocal total_rows
+        pipeline, c_start, c_end, rows, elapsed = result
+        _write_chunk(con, run_id, pipeline, (c_start, c_end), rows)
+        total_rows += len(rows)
+        logger.info("%s %s..%s: %d ticks in %.1fs", pipeline, c_start, c_end, len(rows), elapsed)
+
+    def _failed(task, exc: BaseException) -> None:
+        # No checkpoint row is written, so the next run with this run id retries it
+        nonlocal failed
+        failed += 1
+        logger.error("%s %s..%s failed: %r", task[0], task[1].isoformat(), task[2].isoformat(), exc)
+
+    try:
+        run_pool(tasks, _run_chunk, workers, on_result=_store, on_error=_failed, initializer=_init_worker, initargs=(models_dir,))
+    finally:
+        con.close()
+    logger.info("Backfill %s wrote %d ticks in %.1fs", run_id, total_rows, time.perf_counter() - t0)
+    if failed:
+        logger.warning("Backfill %s: %d of %d chunks failed; rerun with --run-id %s to retry them", run_id, failed, len(tasks), run_id)
+    return run_id, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a historical range through the energy and water forecasters")
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--end", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--pipelines", type=lambda v: v.split(","), default=["energy", "water"])
+    parser.add_argument("--zones", type=int, default=5)
+    parser.add_argument("--chunk-hours", type=int, default=24 * 7)
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes; 0 runs inline")
+    parser.add_argument("--run-id", default=None, help="Reuse to resume an interrupted run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--models-dir", default=None, help="Score with models from this directory")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    if args.end <= args.start:
+        parser.error("--end must be after --start")
+    unknown = set(args.pipelines) - {"energy", "water"}
+    if unknown:
+        parser.error(f"unknown pipelines: {sorted(unknown)}")
+    _, failed = run_backfill(
+        start=args.start,
+        end=args.end,
+        pipelines=args.pipelines,
+        zones=args.zones,
+        chunk_hours=args.chunk_hours,
+        workers=args.workers,
+        run_id=args.run_id,
+        seed=args.seed,
+        models_dir=args.models_dir,
+        db_path=args.db,
+    )
+    # A partial backfill must be visible to cron / CI
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
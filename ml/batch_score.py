@@ -0,0 +1,254 @@
+"""
+Offline batch scoring of bulk SCADA exports with the water models.
+
+Streams a large CSV or Parquet file in bounded-memory chunks and, for every
+reading, writes the water LSTM's next-step [flow, pressure] forecast (made
+from that zone's preceding window) and the AE anomaly score/flag. Per-zone
+window tails are carried across chunk boundaries, so results do not depend on
+the chunk size. All windows of a chunk are scored in one batched predict, and
+output is appended chunk by chunk in input row order.
+
+Scaling matches training (one MinMax over the whole dataset): a first cheap
+streaming pass collects per-column min/max. Pass --single-pass to fit the
+scaler on the first chunk instead.
+
+Input columns: timestamp, zone_id, pressure, flow, turbidity, temperature
+(rows must be time-ordered within each zone). Parquet needs pyarrow.
+
+Run: python -m ml.batch_score export.csv scored.csv --chunk-rows 200000
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+import argparse
+import logging
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import water_model
+from .features import sort_order
+from .water_model import WATER_FEATURE_COLS
+
+
+INPUT_COLS = ["timestamp"] + WATER_FEATURE_COLS
+PREDICT_BATCH_SIZE = 4096
+# Explicit, so a chunk whose timestamps are all midnight is not written date-only
+CSV_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+logger = logging.getLogger("batch_score")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+# ---------- IO ----------
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def iter_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield DataFrame chunks of at most `chunk_rows` rows."""
+    if _is_parquet(path):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("pyarrow is required to read Parquet input.") from exc
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=INPUT_COLS):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=INPUT_COLS, parse_dates=["timestamp"], chunksize=chunk_rows)
+
+
+class _ChunkWriter:
+    """Appends scored chunks to CSV or Parquet without holding earlier chunks."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._parquet_writer = None
+        self._wrote_header = False
+
+    def write(self, df: pd.DataFrame) -> None:
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(
+                self.path,
+                mode="a" if self._wrote_header else "w",
+                header=not self._wrote_header,
+                index=False,
+                date_format=CSV_DATE_FORMAT,
+            )
+            self._wrote_header = True
+
+    def close(self) -> None:
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+# ---------- Scoring ----------
+def fit_minmax(path: str, chunk_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Streaming per-column min/max over the whole file."""
+    mn = np.full(len(WATER_FEATURE_COLS), np.inf)
+    mx = np.full(len(WATER_FEATURE_COLS), -np.inf)
+    for chunk in iter_chunks(path, chunk_rows):
+        values = chunk[WATER_FEATURE_COLS].to_numpy(dtype=np.float64)
+        mn = np.minimum(mn, values.min(axis=0))
+        mx = np.maximum(mx, values.max(axis=0))
+    return mn, mx
+
+
+class WaterStreamScorer:
+    """Scores chunks while carrying each zone's last `sequence_length` scaled rows."""
+
+    def __init__(self, data_min: np.ndarray, data_max: np.ndarray, sequence_length: int = 12, threshold: Optional[float] = None):
+        self.sequence_length = sequence_length
+        self.threshold = threshold
+        self.data_min = data_min.astype(np.float32)
+        rng = (data_max - data_min).astype(np.float32)
+        rng[rng == 0] = 1.0
+        self.data_range = rng
+        self.model = water_model._load_or_train_water_lstm()
+        self._tails: Dict[int, np.ndarray] = {}
+
+    def score(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Scored rows of `chunk`, in the same order as the input."""
+        raw = chunk[WATER_FEATURE_COLS].to_numpy(dtype=np.float32)
+        zone_ids = chunk["zone_id"].to_numpy()
+        pred = np.full((len(chunk), 2), np.nan, dtype=np.float32)
+        # Windows are built zone-major; predictions are scattered back to input rows
+        order = sort_order(chunk, ["zone_id", "timestamp"])
+        if order is None:
+            order = np.arange(len(chunk))
+        self._forecast(raw[order], zone_ids[order], order, pred)
+
+        observed = raw[:, [1, 0]]
+        is_anom, errors = water_model.detect_water_anomalies(observed, threshold=self.threshold, zone_ids=zone_ids)
+        return pd.DataFrame(
+            {
+                "timestamp": chunk["timestamp"].to_numpy(),
+                "zone_id": zone_ids,
+                "flow": observed[:, 0],
+                "pressure": observed[:, 1],
+                "pred_flow": pred[:, 0],
+                "pred_pressure": pred[:, 1],
+                "anomaly_score": errors.astype(np.float32),
+                "is_anomaly": is_anom,
+            }
+        )
+
+    def _forecast(self, raw: np.ndarray, zone_ids: np.ndarray, rows_out: np.ndarray, pred: np.ndarray) -> None:
+        # raw/zone_ids are zone-major; row i's forecast goes to pred[rows_out[i]]
+        scaled = (raw - self.data_min) / self.data_range
+        seq = self.sequence_length
+
+        # Contiguous per-zone row ranges
+        boundaries = np.flatnonzero(np.diff(zone_ids)) + 1
+        starts = np.concatenate([[0], boundaries])
+        stops = np.concatenate([boundaries, [len(raw)]])
+
+        windows = []
+        target_rows = []
+        for lo, hi in zip(starts, stops):
+            zone = int(zone_ids[lo])
+            tail = self._tails.get(zone)
+            history = scaled[lo:hi] if tail is None else np.concatenate([tail, scaled[lo:hi]])
+            offset = 0 if tail is None else len(tail)
+            # Window i covers history[i : i + seq] and forecasts history[i + seq]
+            n_windows = len(history) - seq
+            if n_windows > 0:
+                first = max(0, offset - seq)
+                windows.append(sliding_window_view(history, (seq, history.shape[1]))[first:n_windows, 0])
+                target_rows.append(np.arange(first + seq, n_windows + seq) - offset + lo)
+            self._tails[zone] = history[-seq:].copy()
+
+        if windows:
+            X = np.concatenate(windows)
+            rows = rows_out[np.concatenate(target_rows)]
+            out = self.model.predict(X, batch_size=PREDICT_BATCH_SIZE, verbose=0)
+            # Model outputs scaled [flow, pressure]; map back to sensor units
+            pred[rows, 0] = out[:, 0] * self.data_range[1] + self.data_min[1]
+            pred[rows, 1] = out[:, 1] * self.data_range[0] + self.data_min[0]
+
+
+def score_file(
+    input_path: str,
+    output_path: str,
+    chunk_rows: int = 200_000,
+    sequence_length: int = 12,
+    threshold: Optional[float] = None,
+    single_pass: bool = False,
+) -> dict:
+    """Score `input_path` into `output_path`; returns row count and throughput."""
+    t0 = time.perf_counter()
+    if single_pass:
+        first = next(iter_chunks(input_path, chunk_rows))
+        values = first[WATER_FEATURE_COLS].to_numpy(dtype=np.float64)
+        data_min, data_max = values.min(axis=0), values.max(axis=0)
+    else:
+        data_min, data_max = fit_minmax(input_path, chunk_rows)
+        logger.info("Scaler pass done in %.1fs", time.perf_counter() - t0)
+
+    scorer = WaterStreamScorer(data_min, data_max, sequence_length=sequence_length, threshold=threshold)
+    writer = _ChunkWriter(output_path)
+    total_rows = 0
+    anomalies = 0
+    try:
+        for i, chunk in enumerate(iter_chunks(input_path, chunk_rows)):
+            c0 = time.perf_counter()
+            scored = scorer.score(chunk)
+            writer.write(scored)
+            total_rows += len(scored)
+            anomalies += int(scored["is_anomaly"].sum())
+            elapsed = time.perf_counter() - c0
+            logger.info("Chunk %d: %d rows in %.2fs (%.0f rows/s)", i, len(scored), elapsed, len(scored) / max(elapsed, 1e-9))
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - t0
+    summary = {
+        "rows": total_rows,
+        "anomalies": anomalies,
+        "seconds": elapsed,
+        "rows_per_second": total_rows / max(elapsed, 1e-9),
+    }
+    logger.info("Scored %d rows (%d anomalies) in %.1fs: %.0f rows/s", total_rows, anomalies, elapsed, summary["rows_per_second"])
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream-score a SCADA export with the water LSTM and AE")
+    parser.add_argument("input", help="CSV or Parquet file")
+    parser.add_argument("output", help="CSV or Parquet output path")
+    parser.add_argument("--chunk-rows", type=int, default=200_000)
+    parser.add_argument("--sequence-length", type=int, default=12)
+    parser.add_argument("--threshold", type=float, default=None, help="Override the calibrated per-zone thresholds")
+    parser.add_argument("--single-pass", action="store_true", help="Fit the scaler on the first chunk only")
+    args = parser.parse_args()
+
+    if os.path.abspath(args.input) == os.path.abspath(args.output):
+        parser.error("output must differ from input")
+    score_file(
+        args.input,
+        args.output,
+        chunk_rows=args.chunk_rows,
+        sequence_length=args.sequence_length,
+        threshold=args.threshold,
+        single_pass=args.single_pass,
+    )
+
+
+if __name__ == "__main__":
+    main()
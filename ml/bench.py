@@ -0,0 +1,293 @@
+"""
+Benchmark suite for the forecasting, anomaly and logging hot paths.
+
+Times preprocessing, data simulation, prediction, anomaly detection and the
+SQLite logging functions over a grid of history lengths, zone counts and batch
+sizes. Reports latency percentiles, throughput and peak Python heap usage,
+writes machine-readable JSON, and optionally compares against a saved baseline
+(listing before/after latency and peak memory per case, and failing on
+regressions).
+
+Model-backed benchmarks train small throwaway models into a temporary
+directory (and log into a temporary DB) so production artifacts are untouched.
+
+Run: python -m ml.bench --history 48,168 --zones 5,20 --batch 1,256
+     python -m ml.bench --save-baseline data/bench_baseline.json
+     python -m ml.bench --baseline data/bench_baseline.json --tolerance 0.2
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import energy_model, water_model, cascade
+
+
+logger = logging.getLogger("bench")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+DEFAULT_RESULTS_PATH = os.path.join(cascade.DATA_DIR, "bench_results.json")
+
+# A benchmark case: (name, params, items per call, unit, zero-arg callable)
+Case = Tuple[str, Dict[str, int], int, str, Callable[[], object]]
+
+
+# ---------- Measurement ----------
+def _measure(fn: Callable[[], object], repeats: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    timings = np.empty(repeats, dtype=np.float64)
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - t0
+
+    # Separate traced run: tracemalloc slows allocation-heavy code noticeably.
+    # Native TF/BLAS buffers are not visible to tracemalloc.
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        "repeats": repeats,
+        "mean_ms": float(timings.mean() * 1e3),
+        "p50_ms": float(p50 * 1e3),
+        "p95_ms": float(p95 * 1e3),
+        "p99_ms": float(p99 * 1e3),
+        "peak_mem_mb": peak / 2**20,
+    }
+
+
+# ---------- Cases ----------
+def _data_cases(histories: List[int], zones: List[int]) -> List[Case]:
+    cases: List[Case] = []
+    for hours in histories:
+        df_energy = energy_model.fetch_energy_data(hours_back=hours)
+        cases.append(
+            ("preprocess_energy_data", {"history_h": hours}, len(df_energy), "rows",
+             lambda df=df_energy: energy_model.preprocess_energy_data(df))
+        )
+        for z in zones:
+            df_water = water_model.fetch_water_data(hours_back=hours, zones=z)
+            cases.append(
+                ("fetch_water_data", {"history_h": hours, "zones": z}, len(df_water), "rows",
+                 lambda h=hours, z=z: water_model.fetch_water_data(hours_back=h, zones=z))
+            )
+            cases.append(
+                ("preprocess_water_data", {"history_h": hours, "zones": z}, len(df_water), "rows",
+                 lambda df=df_water: water_model.preprocess_water_data(df))
+            )
+    return cases
+
+
+def _model_cases(zones: List[int], batches: List[int]) -> List[Case]:
+    cases: List[Case] = []
+    df_energy = energy_model.fetch_energy_data(hours_back=30)
+    cases.append(
+        ("predict_energy_demand", {}, 1, "forecasts",
+         lambda: energy_model.predict_energy_demand(df_recent=df_energy.copy()))
+    )
+    preds = np.full(6, 1000.0, dtype=np.float32)
+    actual = preds + np.random.normal(0, 10, size=6).astype(np.float32)
+    cases.append(
+        ("detect_energy_anomalies", {}, 1, "vectors",
+         lambda: energy_model.detect_energy_anomalies(predicted=preds, actual_future=actual))
+    )
+    for z in zones:
+        df_water = water_model.fetch_water_data(hours_back=6, zones=z)
+        cases.append(
+            ("predict_water_conditions", {"zones": z}, z, "zones",
+             lambda df=df_water: water_model.predict_water_conditions(df_recent=df))
+        )
+    for b in batches:
+        observed = np.random.normal(50, 5, size=(b, 2)).astype(np.float32)
+        cases.append(
+            ("detect_water_anomalies", {"batch": b}, b, "rows",
+             lambda obs=observed: water_model.detect_water_anomalies(obs))
+        )
+    return cases
+
+
+def _db_cases(zones: List[int]) -> List[Case]:
+    cases: List[Case] = []
+    preds = np.random.normal(1000, 50, size=6).astype(np.float32)
+    cases.append(
+        ("_log_energy_result", {}, 1, "rows",
+         lambda: cascade._log_energy_result(preds, False, 0.1))
+    )
+    for z in zones:
+        water_preds = np.random.normal(0.5, 0.1, size=(z, 2)).astype(np.float32)
+        is_anom = np.zeros(z, dtype=bool)
+        errors = np.random.random(z).astype(np.float32)
+        zone_ids = list(range(1, z + 1))
+        cases.append(
+            ("_log_water_result", {"zones": z}, 1, "rows",
+             lambda p=water_preds, a=is_anom, e=errors, ids=zone_ids: cascade._log_water_result(ids, p, a, e))
+        )
+    return cases
+
+
+def _isolate_artifacts(workdir: str) -> None:
+    """Point model and DB paths at a scratch directory and train tiny models."""
+    energy_model.ENERGY_MODEL_PATH = os.path.join(workdir, "energy_lstm.h5")
+    energy_model.ENERGY_AE_PATH = os.path.join(workdir, "energy_residual_autoencoder.h5")
+    water_model.WATER_LSTM_PATH = os.path.join(workdir, "water_lstm.h5")
+    water_model.WATER_AE_PATH = os.path.join(workdir, "water_autoencoder.h5")
+    cascade.DB_PATH = os.path.join(workdir, "bench.db")
+    cascade._init_db()
+
+
+def _train_tiny_models() -> None:
+    df_energy = energy_model.fetch_energy_data(hours_back=24 * 7)
+    energy_model.train_energy_model(df=df_energy, epochs=1)
+    energy_model.train_residual_autoencoder(df=df_energy, epochs=1)
+    df_water = water_model.fetch_water_data(hours_back=24)
+    water_model.train_water_lstm(df=df_water, epochs=1)
+    water_model.train_water_autoencoder(df=df_water, epochs=1)
+
+
+# ---------- Baseline comparison ----------
+def _key(result: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def compare_to_baseline(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """Return human-readable regressions where p50 latency or peak memory grew past tolerance."""
+    base = {_key(r): r for r in baseline}
+    regressions: List[str] = []
+    for r in results:
+        b = base.get(_key(r))
+        if b is None:
+            continue
+        for metric in ("p50_ms", "peak_mem_mb"):
+            if b[metric] > 0 and r[metric] > b[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{_key(r)} {metric}: {b[metric]:.3f} -> {r[metric]:.3f} (+{(r[metric] / b[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def baseline_deltas(results: List[dict], baseline: List[dict]) -> List[str]:
+    """Before -> after p50 latency and peak memory for every case present in both runs."""
+    base = {_key(r): r for r in baseline}
+    lines: List[str] = []
+    for r in results:
+        b = base.get(_key(r))
+        if b is None:
+            continue
+        lines.append(
+            f"{_key(r):<48} p50 {b['p50_ms']:9.2f} -> {r['p50_ms']:9.2f}ms"
+            f"   peak {b['peak_mem_mb']:8.2f} -> {r['peak_mem_mb']:8.2f}MB"
+        )
+    return lines
+
+
+# ---------- Entry point ----------
+def run_suite(
+    histories: List[int],
+    zones: List[int],
+    batches: List[int],
+    repeats: int = 20,
+    groups: Optional[List[str]] = None,
+    seed: int = 0,
+) -> List[dict]:
+    groups = groups or ["data", "model", "db"]
+    np.random.seed(seed)
+    results: List[dict] = []
+    with tempfile.TemporaryDirectory(prefix="ecogrid-bench-") as workdir:
+        _isolate_artifacts(workdir)
+        cases: List[Case] = []
+        if "data" in groups:
+            cases += _data_cases(histories, zones)
+        if "model" in groups:
+            _train_tiny_models()
+            cases += _model_cases(zones, batches)
+        if "db" in groups:
+            cases += _db_cases(zones)
+
+        for name, params, items, unit, fn in cases:
+            stats = _measure(fn, repeats=repeats)
+            stats["throughput"] = items / (stats["mean_ms"] / 1e3) if stats["mean_ms"] > 0 else 0.0
+            stats["unit"] = f"{unit}/s"
+            result = {"name": name, "params": params, **stats}
+            results.append(result)
+            logger.info(
+                "%-40s p50=%8.2fms p95=%8.2fms p99=%8.2fms %12.1f %s peak=%7.2fMB",
+                _key(result), stats["p50_ms"], stats["p95_ms"], stats["p99_ms"],
+                stats["throughput"], stats["unit"], stats["peak_mem_mb"],
+            )
+    return results
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark EcoGrid forecasting and anomaly hot paths")
+    parser.add_argument("--history", type=_int_list, default=[48, 168, 720], help="History lengths in hours")
+    parser.add_argument("--zones", type=_int_list, default=[5, 20])
+    parser.add_argument("--batch", type=_int_list, default=[1, 64, 1024], help="Anomaly scoring batch sizes")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--groups", type=lambda v: v.split(","), default=None, help="Subset of data,model,db")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=DEFAULT_RESULTS_PATH, help="Where to write JSON results")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", default=None, help="Also write results to this baseline path")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    results = run_suite(args.history, args.zones, args.batch, repeats=args.repeats, groups=args.groups, seed=args.seed)
+    payload = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    for path in filter(None, [args.out, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(payload, f, indent=2)
+        logger.info("Wrote %s", path)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        logger.info("Changes vs %s:", args.baseline)
+        for line in baseline_deltas(results, baseline):
+            logger.info("  %s", line)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            logger.info("Regressions vs %s:", args.baseline)
+            for line in regressions:
+                logger.info("  %s", line)
+            sys.exit(1)
+        logger.info("No regressions vs %s (tolerance %.0f%%)", args.baseline, args.tolerance * 100)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,31 @@
-    """
+"""
 Cascade orchestrator for EcoGrid AI Urban Resilience System.
 
 Schedules periodic prediction and retraining jobs for Energy and Water models
 using APScheduler. Logs predictions and anomalies to a local SQLite database.
 
+Every 10 minutes a single cascade tick runs the energy and water forecasts
+concurrently (at most ECOGRID_TICK_CONCURRENCY at once, default 2). Each
+pipeline has its own non-blocking lock, so a run that overruns its tick is
+never started twice: the next tick skips that pipeline and counts the skip.
+The tick job itself never overlaps and coalesces missed runs. Tick duration,
+per-pipeline status/duration and skips go to the `cascade_ticks` table and to
+metrics.
+
 Run: python -m ml.cascade  (or python ml/cascade.py if PYTHONPATH is set)
 """
 
 from __future__ import annotations
 
 import os
+import time
 import sqlite3
 import logging
-from datetime import datetime
-from typing import Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
 
 import numpy as np
 
@@ -22,24 +34,50 @@ from apscheduler.triggers.interval import IntervalTrigger
 
 from .energy_model import (
     fetch_energy_data,
-    predict_energy_demand,
+    predict_energy_demand_by_feeder,
+    predict_energy_demand_from_buffer,
+    EnergyFeatureBuffer,
     detect_energy_anomalies,
+    detect_energy_anomalies_batch,
     train_energy_model,
     train_residual_autoencoder,
 )
 from .water_model import (
     fetch_water_data,
     predict_water_conditions,
+    water_scaling_bounds,
     detect_water_anomalies,
     train_water_autoencoder,
     train_water_lstm,
 )
+from .metrics import CASCADE_RUNS, REGISTRY, span
+from .profiling import is_armed, profiled
+from .sharding import CASCADE_SHARDS, ShardCoordinator
+from .training import CHECKPOINT_DIR
+from .retention import (
+    RAW_RETENTION_DAYS,
+    AGG_RETENTION_DAYS,
+    apply_retention,
+    init_retention_schema,
+)
 
 
 # ---------- Paths and Logger ----------
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DB_PATH = os.path.join(BASE_DIR, "ecogrid.db")
+RETENTION_INTERVAL_HOURS = int(os.environ.get("ECOGRID_RETENTION_INTERVAL_HOURS", "6"))
+# Retrain jobs stop after this many epochs without val_loss improvement
+TRAIN_PATIENCE = int(os.environ.get("ECOGRID_TRAIN_PATIENCE", "2"))
+# Forecast this many feeders per tick (0 = single city-wide series)
+ENERGY_FEEDERS = int(os.environ.get("ECOGRID_ENERGY_FEEDERS", "0"))
+# Forecast pipelines run concurrently within a tick, at most this many at once
+TICK_CONCURRENCY = max(1, int(os.environ.get("ECOGRID_TICK_CONCURRENCY", "2")))
+TICK_MINUTES = 10
+# Recent water data each forecast scales over and predicts from
+WATER_LOOKBACK_HOURS = 12
+# Simulated [flow, pressure] sensor noise added to forecasts before anomaly scoring
+WATER_SENSOR_NOISE = np.array([1.5, 0.05])
 os.makedirs(DATA_DIR, exist_ok=True)
 
 logger = logging.getLogger("cascade")
@@ -50,6 +88,29 @@ if not logger.handlers:
     logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
+TICK_SECONDS = REGISTRY.histogram(
+    "ecogrid_cascade_tick_duration_seconds",
+    "Wall time of a cascade tick (until all its pipelines finished or the tick timed out).",
+)
+TICK_SKIPS = REGISTRY.counter(
+    "ecogrid_cascade_tick_skips_total",
+    "Pipelines skipped by a tick because their previous run was still in progress.",
+    ("pipeline",),
+)
+
+
+# Set by schedule_jobs when water zones are sharded across processes
+_coordinator: Optional[ShardCoordinator] = None
+# Last 30h of city-wide energy features; each tick only fetches the new hours
+ENERGY_LOOKBACK_HOURS = 30
+_energy_buffer = EnergyFeatureBuffer(window=ENERGY_LOOKBACK_HOURS - 1, sequence_length=24)
+# Scheduled ticks and API-triggered runs share the buffer; its window is a view,
+# so the lock covers both the update and the predict that reads it
+_energy_buffer_lock = threading.Lock()
+_tick_executor = ThreadPoolExecutor(max_workers=TICK_CONCURRENCY, thread_name_prefix="cascade-tick")
+# Held by a pipeline's scheduled run or API-triggered run, so the two never overlap
+_pipeline_locks: Dict[str, threading.Lock] = {"energy": threading.Lock(), "water": threading.Lock()}
+
 
 # ---------- DB Setup ----------
 def _init_db():
@@ -78,49 +139,253 @@ def _init_db():
         )
         """
     )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS energy_feeder_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            feeder_id INTEGER,
+            preds_json TEXT,
+            anomaly INTEGER,
+            anomaly_score REAL
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_energy_feeder_predictions_ts ON energy_feeder_predictions(timestamp)")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS cascade_ticks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            duration_s REAL,
+            energy_status TEXT,
+            energy_s REAL,
+            water_status TEXT,
+            water_s REAL,
+            skipped INTEGER
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_cascade_ticks_ts ON cascade_ticks(timestamp)")
     con.commit()
+    init_retention_schema(con)
     con.close()
 
 
 # ---------- Orchestrated Steps ----------
+# Jobs that honour profiling (ECOGRID_PROFILE_NEXT / admin endpoint) and can be replayed
+PROFILED_JOBS = ("run_energy_forecast", "run_water_forecast", "_retrain_energy_models", "_retrain_water_models")
+
+
+@profiled("job", hours_back=30)
 def run_energy_forecast() -> Tuple[np.ndarray, bool, float]:
     try:
         logger.info("Running energy forecast...")
-        df_recent = fetch_energy_data(hours_back=30)
-        preds, _ = predict_energy_demand(df_recent=df_recent)
-        # No actuals in live mode; simulate a small random variation as pseudo-actuals for anomaly demo
-        simulated_actual = preds + np.random.normal(0, 10, size=preds.shape)
-        is_anom, score = detect_energy_anomalies(predicted=preds, actual_future=simulated_actual)
-        _log_energy_result(preds, is_anom, score)
+        with span("energy", "total"):
+            if ENERGY_FEEDERS > 0:
+                preds, is_anom, score = _run_feeder_forecast(ENERGY_FEEDERS)
+            else:
+                with _energy_buffer_lock:
+                    with span("energy", "fetch"):
+                        _refresh_energy_buffer()
+                    preds, _ = predict_energy_demand_from_buffer(_energy_buffer)
+                # No actuals in live mode; simulate a small random variation as pseudo-actuals for anomaly demo
+                simulated_actual = preds + np.random.normal(0, 10, size=preds.shape)
+                is_anom, score = detect_energy_anomalies(predicted=preds, actual_future=simulated_actual)
+            with span("energy", "db_write"):
+                _log_energy_result(preds, is_anom, score)
+        CASCADE_RUNS.inc(pipeline="energy", status="ok")
         if is_anom:
             logger.warning("Energy anomaly detected! score=%.3f", score)
         else:
             logger.info("Energy forecast complete. No anomaly.")
         return preds, is_anom, score
     except Exception as exc:
+        CASCADE_RUNS.inc(pipeline="energy", status="error")
         logger.exception("Energy forecast failed: %s", exc)
         return np.array([]), False, 0.0
 
 
-def run_water_forecast() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+def _refresh_energy_buffer() -> int:
+    """Fetch only the hours the buffer has not seen yet (all 30h on first use).
+
+    Callers must hold `_energy_buffer_lock`.
+    """
+    last = _energy_buffer.last_timestamp
+    if last is None:
+        hours = ENERGY_LOOKBACK_HOURS
+    else:
+        # Rows are hour-aligned; the overlap with already-buffered hours is dropped by extend()
+        hours = min(ENERGY_LOOKBACK_HOURS, int((datetime.utcnow() - last) / timedelta(hours=1)) + 1)
+    return _energy_buffer.extend(fetch_energy_data(hours_back=hours))
+
+
+def _run_feeder_forecast(feeders: int) -> Tuple[np.ndarray, bool, float]:
+    """Forecast every feeder in one batch and log per-feeder rows.
+
+    Returns the city-wide total (sum over feeders), whether any feeder is
+    anomalous, and the worst feeder score, for `energy_predictions`.
+    """
+    with span("energy", "fetch"):
+        df_recent = fetch_energy_data(hours_back=30, feeders=feeders)
+    preds, feeder_ids = predict_energy_demand_by_feeder(df_recent=df_recent)
+    simulated_actual = preds + np.random.normal(0, 10, size=preds.shape)
+    is_anom, scores = detect_energy_anomalies_batch(preds, simulated_actual)
+    with span("energy", "db_write"):
+        _log_feeder_results(feeder_ids, preds, is_anom, scores)
+    if np.any(is_anom):
+        logger.warning("Energy anomalies on feeders %s", [f for f, a in zip(feeder_ids, is_anom) if a])
+    return preds.sum(axis=0), bool(np.any(is_anom)), float(np.max(scores))
+
+
+@profiled("job", hours_back=WATER_LOOKBACK_HOURS)
+def run_water_forecast(
+    zone_ids: Optional[Sequence[int]] = None, bounds: Optional[Tuple[np.ndarray, np.ndarray]] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Forecast and log water zones; all zones unless `zone_ids` (a shard's zones) is given.
+
+    A shard passes the tick's all-zone scaling `bounds` so its zones are scaled
+    exactly as in an unsharded run.
+    """
     try:
-        logger.info("Running water forecast...")
-        df_recent = fetch_water_data(hours_back=12)
-        preds, meta = predict_water_conditions(df_recent=df_recent)
-        # Treat predictions as observed for demo; add noise for anomaly simulation
-        observed = preds + np.random.normal(0, 0.5, size=preds.shape)
-        is_anom, errors = detect_water_anomalies(observed)
-        _log_water_result(meta.get("zones", []), preds, is_anom, errors)
+        logger.info("Running water forecast%s...", f" for {len(zone_ids)} zones" if zone_ids is not None else "")
+        with span("water", "total"):
+            with span("water", "fetch"):
+                df_recent = fetch_water_data(hours_back=WATER_LOOKBACK_HOURS, zone_ids=zone_ids)
+            preds, meta = predict_water_conditions(df_recent=df_recent, bounds=bounds)
+            # Treat predictions as observed for demo, plus simulated sensor noise. The AE and
+            # its thresholds work on raw [flow, pressure], so score in sensor units.
+            sensor_preds = meta["sensor_preds"]
+            observed = sensor_preds + np.random.normal(0, WATER_SENSOR_NOISE, size=sensor_preds.shape)
+            is_anom, errors = detect_water_anomalies(observed, zone_ids=meta.get("zones"))
+            with span("water", "db_write"):
+                _log_water_result(meta.get("zones", []), preds, is_anom, errors)
+        CASCADE_RUNS.inc(pipeline="water", status="ok")
         if np.any(is_anom):
             logger.warning("Water anomalies detected in %d zones", int(np.sum(is_anom)))
         else:
             logger.info("Water forecast complete. No anomalies.")
         return preds, is_anom, errors
     except Exception as exc:
+        CASCADE_RUNS.inc(pipeline="water", status="error")
         logger.exception("Water forecast failed: %s", exc)
         return np.array([]), np.array([]), np.array([])
 
 
+def _energy_tick() -> str:
+    preds, _, _ = run_energy_forecast()
+    return "ok" if preds.size else "error"
+
+
+def _water_tick() -> str:
+    if _coordinator is not None:
+        # Sharded: shards run the forecast and record their own completion.
+        # One scaling over all zones keeps shard results equal to an unsharded run.
+        try:
+            df = fetch_water_data(hours_back=WATER_LOOKBACK_HOURS, zone_ids=_coordinator.zone_ids)
+            bounds = water_scaling_bounds(df)
+        except Exception as exc:
+            logger.warning("Could not compute water scaling for shards; each shard scales its own zones: %s", exc)
+            bounds = None
+        _coordinator.dispatch_tick(bounds)
+        return "dispatched"
+    preds, _, _ = run_water_forecast()
+    return "ok" if preds.size else "error"
+
+
+class PipelineBusy(RuntimeError):
+    """A pipeline was requested while a run of it is still in progress."""
+
+
+@contextmanager
+def pipeline_run(pipeline: str) -> Iterator[None]:
+    """Hold `pipeline`'s tick lock for an on-demand run; raises PipelineBusy if it is taken.
+
+    A scheduled tick that finds the lock held skips the pipeline, as it does
+    for its own overrunning runs.
+    """
+    lock = _pipeline_locks[pipeline]
+    if not lock.acquire(blocking=False):
+        raise PipelineBusy(f"{pipeline} forecast already running")
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def _run_locked(pipeline: str, lock: threading.Lock, job: Callable[[], str]) -> Tuple[str, float]:
+    t0 = time.perf_counter()
+    try:
+        status = job()
+    except Exception as exc:
+        # Recorded as an error so the tick row is still written
+        logger.exception("%s tick failed: %s", pipeline, exc)
+        status = "error"
+    finally:
+        lock.release()
+    return status, time.perf_counter() - t0
+
+
+def run_cascade_tick(timeout: Optional[float] = None) -> Dict[str, Tuple[str, Optional[float]]]:
+    """Run one tick of the energy and water forecasts concurrently.
+
+    A pipeline whose previous run (scheduled or from the API) still holds its
+    lock is skipped, and one that raises is recorded as "error". The tick
+    waits up to `timeout` seconds (default: most of the tick interval) for
+    its pipelines; one still going by then is recorded as "running" and keeps
+    its lock until it finishes. While job profiling is armed the pipelines
+    run one after the other, so a profiled run has NumPy's global RNG to
+    itself and its capture can be replayed. Returns {pipeline: (status, seconds)}.
+    """
+    timeout = TICK_MINUTES * 60 * 0.9 if timeout is None else timeout
+    started = time.time()
+    deadline = started + timeout
+    sequential = is_armed("job")
+    outcome: Dict[str, Tuple[str, Optional[float]]] = {}
+    futures = {}
+    for pipeline, job in (("energy", _energy_tick), ("water", _water_tick)):
+        lock = _pipeline_locks[pipeline]
+        if not lock.acquire(blocking=False):
+            TICK_SKIPS.inc(pipeline=pipeline)
+            logger.warning("Skipping %s this tick: previous run still in progress", pipeline)
+            outcome[pipeline] = ("skipped", None)
+            continue
+        futures[pipeline] = _tick_executor.submit(_run_locked, pipeline, lock, job)
+        if sequential:
+            wait([futures[pipeline]], timeout=max(0.0, deadline - time.time()))
+    done, _ = wait(futures.values(), timeout=max(0.0, deadline - time.time()))
+    for pipeline, future in futures.items():
+        outcome[pipeline] = future.result() if future in done else ("running", None)
+    duration = time.time() - started
+    TICK_SECONDS.observe(duration)
+    _log_tick(started, duration, outcome)
+    logger.info(
+        "Cascade tick done in %.2fs: %s",
+        duration,
+        ", ".join(f"{p}={s}" + (f" ({d:.2f}s)" if d is not None else "") for p, (s, d) in outcome.items()),
+    )
+    return outcome
+
+
+def _log_tick(started: float, duration: float, outcome: Dict[str, Tuple[str, Optional[float]]]):
+    con = sqlite3.connect(DB_PATH)
+    with con:
+        con.execute(
+            "INSERT INTO cascade_ticks(timestamp, duration_s, energy_status, energy_s, water_status, water_s, skipped) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                datetime.utcfromtimestamp(started).isoformat(),
+                duration,
+                outcome["energy"][0],
+                outcome["energy"][1],
+                outcome["water"][0],
+                outcome["water"][1],
+                sum(1 for status, _ in outcome.values() if status == "skipped"),
+            ),
+        )
+    con.close()
+
+
 def detect_anomalies():
     """Manual trigger for anomaly checks if needed (covered in forecast functions)."""
     return run_energy_forecast(), run_water_forecast()
@@ -142,6 +407,20 @@ def _log_energy_result(preds: np.ndarray, anomaly: bool, score: float):
     con.close()
 
 
+def _log_feeder_results(feeder_ids, preds: np.ndarray, is_anom: np.ndarray, scores: np.ndarray):
+    ts = datetime.utcnow().isoformat()
+    con = sqlite3.connect(DB_PATH)
+    with con:
+        con.executemany(
+            "INSERT INTO energy_feeder_predictions(timestamp, feeder_id, preds_json, anomaly, anomaly_score) VALUES (?, ?, ?, ?, ?)",
+            [
+                (ts, int(f), str(p.tolist()), int(a), float(sc))
+                for f, p, a, sc in zip(feeder_ids, preds, is_anom, scores)
+            ],
+        )
+    con.close()
+
+
 def _log_water_result(zones, preds: np.ndarray, is_anom: np.ndarray, errors: np.ndarray):
     con = sqlite3.connect(DB_PATH)
     cur = con.cursor()
@@ -159,39 +438,77 @@ def _log_water_result(zones, preds: np.ndarray, is_anom: np.ndarray, errors: np.
     con.close()
 
 
+@profiled("job", hours_back=24 * 30, epochs=5)
 def _retrain_energy_models():
     logger.info("Retraining energy models (LSTM + residual AE)...")
     try:
-        df = fetch_energy_data(hours_back=24 * 30)
-        train_energy_model(df=df, epochs=5)
-        train_residual_autoencoder(df=df, epochs=5)
+        with span("energy", "retrain"):
+            df = fetch_energy_data(hours_back=24 * 30)
+            # A retrain killed mid-way (e.g. by a restart) resumes from its checkpoint
+            train_energy_model(df=df, epochs=5, checkpoint_dir=CHECKPOINT_DIR, resume=True, patience=TRAIN_PATIENCE)
+            train_residual_autoencoder(df=df, epochs=5, checkpoint_dir=CHECKPOINT_DIR, resume=True, patience=TRAIN_PATIENCE)
+        CASCADE_RUNS.inc(pipeline="energy_retrain", status="ok")
         logger.info("Energy models retrained.")
     except Exception as exc:
+        CASCADE_RUNS.inc(pipeline="energy_retrain", status="error")
         logger.exception("Energy retraining failed: %s", exc)
 
 
+@profiled("job", hours_back=72, epochs=5)
 def _retrain_water_models():
     logger.info("Retraining water models (AE + LSTM)...")
     try:
-        df = fetch_water_data(hours_back=72)
-        train_water_autoencoder(df=df, epochs=5)
-        train_water_lstm(df=df, epochs=5)
+        with span("water", "retrain"):
+            df = fetch_water_data(hours_back=72)
+            train_water_autoencoder(df=df, epochs=5, checkpoint_dir=CHECKPOINT_DIR, resume=True, patience=TRAIN_PATIENCE)
+            train_water_lstm(df=df, epochs=5, checkpoint_dir=CHECKPOINT_DIR, resume=True, patience=TRAIN_PATIENCE)
+        CASCADE_RUNS.inc(pipeline="water_retrain", status="ok")
         logger.info("Water models retrained.")
     except Exception as exc:
+        CASCADE_RUNS.inc(pipeline="water_retrain", status="error")
         logger.exception("Water retraining failed: %s", exc)
 
 
+def _apply_retention():
+    logger.info("Applying retention (raw %dd, aggregates %dd)...", RAW_RETENTION_DAYS, AGG_RETENTION_DAYS)
+    try:
+        summary = apply_retention(DB_PATH)
+        logger.info("Retention complete: %s", summary)
+    except Exception as exc:
+        logger.exception("Retention failed: %s", exc)
+
+
 def schedule_jobs():
+    global _coordinator
     _init_db()
     scheduler = BackgroundScheduler()
-    # Real-time prediction every 10 minutes
-    scheduler.add_job(run_energy_forecast, trigger=IntervalTrigger(minutes=10), id="energy_forecast")
-    scheduler.add_job(run_water_forecast, trigger=IntervalTrigger(minutes=10), id="water_forecast")
+    if CASCADE_SHARDS > 1:
+        # Water zones are split across shard processes; the tick only dispatches to them
+        _coordinator = ShardCoordinator(DB_PATH, shards=CASCADE_SHARDS)
+        _coordinator.start()
+    # Real-time prediction every 10 minutes: one tick for both pipelines, never
+    # overlapping itself; missed ticks collapse into one run
+    scheduler.add_job(
+        run_cascade_tick,
+        trigger=IntervalTrigger(minutes=TICK_MINUTES),
+        id="cascade_tick",
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=TICK_MINUTES * 60 // 2,
+    )
     # Retraining every 12 hours
     scheduler.add_job(_retrain_energy_models, trigger=IntervalTrigger(hours=12), id="energy_retrain")
     scheduler.add_job(_retrain_water_models, trigger=IntervalTrigger(hours=12), id="water_retrain")
+    # Compaction of old prediction rows
+    scheduler.add_job(_apply_retention, trigger=IntervalTrigger(hours=RETENTION_INTERVAL_HOURS), id="retention")
     scheduler.start()
-    logger.info("Scheduler started: energy/water forecasts every 10m, retraining every 12h")
+    logger.info(
+        "Scheduler started: energy/water tick every %dm (concurrency %d, %d water shard(s)), retraining every 12h, retention every %dh",
+        TICK_MINUTES,
+        TICK_CONCURRENCY,
+        max(1, CASCADE_SHARDS),
+        RETENTION_INTERVAL_HOURS,
+    )
     return scheduler
 
 
@@ -199,13 +516,14 @@ def main():
     scheduler = schedule_jobs()
     try:
         # Keep main thread alive
-        import time
-
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
         logger.info("Shutting down scheduler...")
         scheduler.shutdown()
+        _tick_executor.shutdown(wait=True)
+        if _coordinator is not None:
+            _coordinator.stop()
 
 
 if __name__ == "__main__":
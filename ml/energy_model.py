@@ -19,8 +19,10 @@ import math
 import time
 import json
 import logging
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Tuple, Optional, List
+from itertools import product
+from typing import Dict, Sequence, Tuple, Optional, List
 
 import numpy as np
 import pandas as pd
@@ -37,6 +39,12 @@ except Exception:  # pragma: no cover - allow import fallback on systems without
 
 import requests
 
+from .features import column_block, fit_scale_inplace, segment_bounds, sort_order, take_column
+from .inference_server import remote_model, shared_recent
+from .metrics import span
+from .training import clear_checkpoint, load_model_cached, prepare_training
+from .thresholds import ANOMALY_QUANTILE, calibrate, resolve_thresholds, save_thresholds
+
 
 # ---------- Paths and Logger ----------
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
@@ -48,6 +56,14 @@ os.makedirs(DATA_DIR, exist_ok=True)
 ENERGY_MODEL_PATH = os.path.join(MODELS_DIR, "energy_lstm.h5")
 ENERGY_AE_PATH = os.path.join(MODELS_DIR, "energy_residual_autoencoder.h5")
 
+# LSTM input layout, in column order
+ENERGY_FEATURE_COLS = ["temperature", "humidity", "wind_speed", "hour", "day", "previous_demand"]
+# Features a what-if scenario may perturb (calendar and lag features are fixed)
+SCENARIO_FEATURES = ("temperature", "humidity", "wind_speed")
+MAX_SCENARIO_WINDOWS = 250_000
+# Used only when no calibrated threshold has been saved with the residual AE
+DEFAULT_ENERGY_THRESHOLD = 2.5
+
 logger = logging.getLogger("energy_model")
 if not logger.handlers:
     handler = logging.StreamHandler()
@@ -60,8 +76,10 @@ logger.setLevel(logging.INFO)
 # ---------- Data Fetching ----------
 def _simulate_energy_series(start: datetime, periods: int, freq_minutes: int = 60) -> pd.DataFrame:
     rng = pd.date_range(start=start, periods=periods, freq=f"{freq_minutes}min")
-    # Simulate seasonality and daily cycle
-    hours = np.arange(periods)
+    # Simulate seasonality and daily cycle, phased by wall-clock hour so that
+    # consecutive fetches continue the same curve
+    # Unit-independent (pandas may store datetime64[us] or [ns])
+    hours = ((rng - pd.Timestamp(0)) // pd.Timedelta(hours=1)).to_numpy()
     daily_cycle = 1000 + 200 * np.sin(2 * np.pi * (hours % 24) / 24)
     weekly_cycle = 50 * np.sin(2 * np.pi * (hours % (24 * 7)) / (24 * 7))
     noise = np.random.normal(0, 30, size=periods)
@@ -86,11 +104,29 @@ def _simulate_energy_series(start: datetime, periods: int, freq_minutes: int = 6
     return df
 
 
-def fetch_energy_data(hours_back: int = 24 * 30, use_api: bool = False) -> pd.DataFrame:
+def _simulate_feeder_series(start: datetime, periods: int, feeders: int, freq_minutes: int = 60) -> pd.DataFrame:
+    """Per-feeder demand sharing one city-wide weather series.
+
+    Rows are feeder-major (sorted by feeder_id, then timestamp).
+    """
+    base = _simulate_energy_series(start=start, periods=periods, freq_minutes=freq_minutes)
+    # Feeders differ in load level and have independent noise
+    scale = np.linspace(0.8, 1.2, feeders)[:, np.newaxis]
+    noise = np.random.normal(0, 30, size=(feeders, periods))
+    demand = np.maximum(300, base["demand"].to_numpy()[np.newaxis, :] * scale + noise)
+
+    df = base.drop(columns="demand").iloc[np.tile(np.arange(periods), feeders)].reset_index(drop=True)
+    df.insert(1, "feeder_id", np.repeat(np.arange(1, feeders + 1), periods))
+    df["demand"] = demand.ravel()
+    return df
+
+
+def fetch_energy_data(hours_back: int = 24 * 30, use_api: bool = False, feeders: Optional[int] = None) -> pd.DataFrame:
     """Fetch energy demand time series.
 
     Attempts remote API if requested, else falls back to simulation.
     Returns a DataFrame with columns: timestamp, temperature, humidity, wind_speed, hour, day, demand
+    When `feeders` is given, returns one series per feeder with an extra feeder_id column.
     """
     if use_api:
         try:
@@ -101,7 +137,15 @@ def fetch_energy_data(hours_back: int = 24 * 30, use_api: bool = False) -> pd.Da
         except Exception as exc:
             logger.warning("Energy API unavailable, using simulated data: %s", exc)
 
-    start = datetime.utcnow() - timedelta(hours=hours_back)
+    if not feeders:
+        # Multi-worker deployments read the loader process's shared buffer
+        shared = shared_recent("energy", hours_back)
+        if shared is not None:
+            return shared
+    # Hourly rows on the hour, ending with the last completed hour
+    start = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours_back)
+    if feeders:
+        return _simulate_feeder_series(start=start, periods=hours_back, feeders=feeders, freq_minutes=60)
     return _simulate_energy_series(start=start, periods=hours_back, freq_minutes=60)
 
 
@@ -111,52 +155,180 @@ def preprocess_energy_data(df: pd.DataFrame, sequence_length: int = 24) -> Tuple
 
     X features: temperature, humidity, wind_speed, hour, day, previous_demand
     y: next 6-hour total demand (MW) or per-step; here we predict 6 future steps.
+    If df has a feeder_id column, windows are built per feeder (never crossing
+    feeders) and concatenated, with one scaler over all feeders.
     """
-    df = df.copy().sort_values("timestamp")
-    df["previous_demand"] = df["demand"].shift(1)
-    df.dropna(inplace=True)
-
-    feature_cols = [
-        "temperature",
-        "humidity",
-        "wind_speed",
-        "hour",
-        "day",
-        "previous_demand",
-    ]
-
-    scaler = MinMaxScaler()
-    features_scaled = scaler.fit_transform(df[feature_cols])
-
-    # Build input-output sequences for next 6 steps
+    if "feeder_id" in df.columns:
+        return _preprocess_feeder_energy_data(df, sequence_length=sequence_length)
+    features, demand, _ = _energy_feature_block(df)
+    scaler = fit_scale_inplace(features)
+
+    # Input-output sequences for the next 6 steps, as read-only views of `features`
     horizon = 6
-    X_list: List[np.ndarray] = []
-    y_list: List[np.ndarray] = []
-    for i in range(len(df) - sequence_length - horizon + 1):
-        X_list.append(features_scaled[i : i + sequence_length])
-        y_future = df["demand"].values[i + sequence_length : i + sequence_length + horizon]
-        y_list.append(y_future)
-
-    X = np.asarray(X_list, dtype=np.float32)
-    y = np.asarray(y_list, dtype=np.float32)
+    n = len(features) - sequence_length - horizon + 1
+    if n <= 0:
+        return np.empty((0, sequence_length, len(ENERGY_FEATURE_COLS)), np.float32), np.empty((0, horizon), np.float32), scaler
+    X = np.lib.stride_tricks.sliding_window_view(features, (sequence_length, features.shape[1]))[:n, 0]
+    y = np.lib.stride_tricks.sliding_window_view(demand[sequence_length:], horizon)[:n]
     return X, y, scaler
 
 
+def _energy_feature_block(df: pd.DataFrame, group_col: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """float32 ENERGY_FEATURE_COLS block, demand and group ids, in time order per group.
+
+    previous_demand is the prior row's demand within the group; each group's
+    first row (and any row with missing values) is dropped, as dropna would.
+    """
+    keys = [group_col, "timestamp"] if group_col else ["timestamp"]
+    order = sort_order(df, keys)
+    n_rows = len(df)
+    demand = take_column(df, "demand", order).astype(np.float32, copy=False)
+    features = np.empty((n_rows, len(ENERGY_FEATURE_COLS)), dtype=np.float32)
+    column_block(df, ENERGY_FEATURE_COLS[:-1], order, out=features)
+    groups = take_column(df, group_col, order) if group_col else None
+
+    if n_rows:
+        features[1:, -1] = demand[:-1]
+        features[segment_bounds(groups)[0] if groups is not None else 0, -1] = np.nan
+    valid = ~(np.isnan(features).any(axis=1) | np.isnan(demand))
+    if groups is None and valid[1:].all():
+        # Common case: only the first row goes, so return views instead of copies
+        return features[1:], demand[1:], None
+    return features[valid], demand[valid], groups[valid] if groups is not None else None
+
+
+def _preprocess_feeder_energy_data(df: pd.DataFrame, sequence_length: int = 24, horizon: int = 6) -> Tuple[np.ndarray, np.ndarray, MinMaxScaler]:
+    features, demand, feeder_ids = _energy_feature_block(df, "feeder_id")
+    scaler = fit_scale_inplace(features)
+
+    X_parts: List[np.ndarray] = []
+    y_parts: List[np.ndarray] = []
+    for lo, hi in zip(*segment_bounds(feeder_ids)):
+        n = hi - lo - sequence_length - horizon + 1
+        if n <= 0:
+            continue
+        windows = np.lib.stride_tricks.sliding_window_view(features[lo:hi], (sequence_length, features.shape[1]))
+        X_parts.append(windows[:n, 0])
+        y_parts.append(np.lib.stride_tricks.sliding_window_view(demand[lo + sequence_length : hi], horizon)[:n])
+    if not X_parts:
+        return np.empty((0, sequence_length, len(ENERGY_FEATURE_COLS)), np.float32), np.empty((0, horizon), np.float32), scaler
+    return np.concatenate(X_parts), np.concatenate(y_parts), scaler
+
+
+class EnergyFeatureBuffer:
+    """Rolling window of model-ready energy features, updated one row at a time.
+
+    Holds the last `window` feature rows (previous_demand derived from the prior
+    row's demand) both raw and MinMax-scaled over the window, exactly as
+    `predict_energy_demand` scales a freshly fetched DataFrame of `window + 1`
+    rows. Rows are written twice into a (2 * window) ring, so the newest
+    `sequence_length` rows are always one contiguous slice and `latest_window`
+    returns a view without copying. Window min/max per feature are tracked
+    with monotonic deques; when they do not move, only the new row is scaled.
+    """
+
+    def __init__(self, window: int = 29, sequence_length: int = 24):
+        if sequence_length > window:
+            raise ValueError("sequence_length cannot exceed window")
+        self.window = window
+        self.sequence_length = sequence_length
+        n_features = len(ENERGY_FEATURE_COLS)
+        self._raw = np.zeros((2 * window, n_features), dtype=np.float64)
+        self._scaled = np.zeros((2 * window, n_features), dtype=np.float32)
+        self._min_q = [deque() for _ in range(n_features)]
+        self._max_q = [deque() for _ in range(n_features)]
+        self._lo: Optional[np.ndarray] = None
+        self._hi: Optional[np.ndarray] = None
+        self._count = 0
+        self._last_demand: Optional[float] = None
+        self.last_timestamp: Optional[pd.Timestamp] = None
+        self.rescales = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.window)
+
+    def extend(self, df: pd.DataFrame) -> int:
+        """Append rows newer than `last_timestamp`; returns how many were added."""
+        df = df.sort_values("timestamp")
+        if self.last_timestamp is not None:
+            df = df[df["timestamp"] > self.last_timestamp]
+        if df.empty:
+            return 0
+        values = df[["temperature", "humidity", "wind_speed", "hour", "day"]].to_numpy(dtype=np.float64)
+        demand = df["demand"].to_numpy(dtype=np.float64)
+        for row, d in zip(values, demand):
+            # The first row ever has no previous demand and is dropped, as in dropna()
+            if self._last_demand is not None:
+                self._append(np.append(row, self._last_demand))
+            self._last_demand = float(d)
+        self.last_timestamp = df["timestamp"].iloc[-1]
+        return len(df)
+
+    def _append(self, features: np.ndarray) -> None:
+        n = self._count
+        pos = n % self.window
+        self._raw[pos] = features
+        self._raw[pos + self.window] = features
+        expired = n - self.window
+        for f, value in enumerate(features):
+            min_q, max_q = self._min_q[f], self._max_q[f]
+            while min_q and min_q[-1][1] >= value:
+                min_q.pop()
+            while max_q and max_q[-1][1] <= value:
+                max_q.pop()
+            min_q.append((n, value))
+            max_q.append((n, value))
+            while min_q[0][0] <= expired:
+                min_q.popleft()
+            while max_q[0][0] <= expired:
+                max_q.popleft()
+        self._count = n + 1
+
+        lo = np.array([q[0][1] for q in self._min_q])
+        hi = np.array([q[0][1] for q in self._max_q])
+        rng = hi - lo
+        rng[rng == 0] = 1.0  # MinMaxScaler leaves constant features at 0
+        if self._lo is not None and np.array_equal(lo, self._lo) and np.array_equal(hi, self._hi):
+            scaled = ((features - lo) / rng).astype(np.float32)
+            self._scaled[pos] = scaled
+            self._scaled[pos + self.window] = scaled
+        else:
+            np.divide(self._raw - lo, rng, out=self._scaled, casting="same_kind")
+            self._lo, self._hi = lo, hi
+            self.rescales += 1
+
+    def latest_window(self) -> np.ndarray:
+        """Read-only (sequence_length, features) view of the newest scaled rows."""
+        if len(self) < self.sequence_length:
+            raise ValueError("Insufficient recent data for prediction.")
+        end = self._count % self.window + self.window
+        view = self._scaled[end - self.sequence_length : end]
+        view.flags.writeable = False
+        return view
+
+
 # ---------- Models ----------
-def _build_energy_lstm(input_shape: Tuple[int, int]) -> models.Model:
+def _build_energy_lstm(
+    input_shape: Tuple[int, int],
+    lstm_units: Tuple[int, int] = (64, 32),
+    dropout: float = 0.2,
+    dense_units: int = 32,
+    learning_rate: Optional[float] = None,
+) -> models.Model:
     if tf is None:
         raise RuntimeError("TensorFlow is required to build the model.")
     model = models.Sequential(
         [
             layers.Input(shape=input_shape),
-            layers.LSTM(64, return_sequences=True),
-            layers.Dropout(0.2),
-            layers.LSTM(32),
-            layers.Dense(32, activation="relu"),
+            layers.LSTM(lstm_units[0], return_sequences=True),
+            layers.Dropout(dropout),
+            layers.LSTM(lstm_units[1]),
+            layers.Dense(dense_units, activation="relu"),
             layers.Dense(6, activation="linear"),
         ]
     )
-    model.compile(optimizer="adam", loss="mse")
+    optimizer = tf.keras.optimizers.Adam(learning_rate) if learning_rate else "adam"
+    model.compile(optimizer=optimizer, loss="mse")
     return model
 
 
@@ -175,23 +347,41 @@ def _build_residual_autoencoder(vector_length: int = 6) -> models.Model:
 
 
 # ---------- Training ----------
-def train_energy_model(df: Optional[pd.DataFrame] = None, sequence_length: int = 24, epochs: int = 10) -> models.Model:
+def train_energy_model(
+    df: Optional[pd.DataFrame] = None,
+    sequence_length: int = 24,
+    epochs: int = 10,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    patience: Optional[int] = None,
+) -> models.Model:
+    """Train and save the energy LSTM.
+
+    With `checkpoint_dir`, progress is checkpointed every epoch and `resume`
+    continues an interrupted run; `patience` enables early stopping.
+    """
     if df is None:
         df = fetch_energy_data(hours_back=24 * 30)
     X, y, _ = preprocess_energy_data(df, sequence_length=sequence_length)
     if len(X) < 10:
         raise ValueError("Not enough data to train the energy model.")
-    model = _build_energy_lstm(input_shape=(X.shape[1], X.shape[2]))
-    model.fit(X, y, epochs=epochs, batch_size=32, validation_split=0.1, verbose=0)
+    model, initial_epoch, callbacks = prepare_training(
+        "energy_lstm", lambda: _build_energy_lstm(input_shape=(X.shape[1], X.shape[2])), checkpoint_dir, resume, patience
+    )
+    model.fit(X, y, epochs=epochs, initial_epoch=initial_epoch, batch_size=32, validation_split=0.1, callbacks=callbacks, verbose=0)
     model.save(ENERGY_MODEL_PATH)
+    clear_checkpoint(checkpoint_dir, "energy_lstm")
     logger.info("Saved energy model to %s", ENERGY_MODEL_PATH)
     return model
 
 
 def _load_or_train_energy(df: Optional[pd.DataFrame] = None) -> models.Model:
+    remote = remote_model("energy_lstm")
+    if remote is not None:
+        return remote
     if os.path.exists(ENERGY_MODEL_PATH):
         try:
-            return models.load_model(ENERGY_MODEL_PATH)
+            return load_model_cached(ENERGY_MODEL_PATH)
         except Exception:
             logger.warning("Failed to load energy model; retraining.")
     return train_energy_model(df=df)
@@ -206,25 +396,162 @@ def predict_energy_demand(df_recent: Optional[pd.DataFrame] = None, sequence_len
     """
     if df_recent is None:
         df_recent = fetch_energy_data(hours_back=sequence_length + 6)
-    model = _load_or_train_energy()
+    with span("energy", "model_load"):
+        model = _load_or_train_energy()
 
     # Prepare sequence for the last window
-    df_recent = df_recent.sort_values("timestamp")
-    df_recent["previous_demand"] = df_recent["demand"].shift(1)
-    df_recent.dropna(inplace=True)
-
-    feature_cols = ["temperature", "humidity", "wind_speed", "hour", "day", "previous_demand"]
-    scaler = MinMaxScaler()
-    scaled = scaler.fit_transform(df_recent[feature_cols])
+    with span("energy", "scale"):
+        scaled, _, _ = _energy_feature_block(df_recent)
+        fit_scale_inplace(scaled)
     if len(scaled) < sequence_length:
         raise ValueError("Insufficient recent data for prediction.")
     last_seq = scaled[-sequence_length:]
-    preds = model.predict(last_seq[np.newaxis, ...], verbose=0)[0]
+    with span("energy", "predict"):
+        preds = model.predict(last_seq[np.newaxis, ...], verbose=0)[0]
     return preds, last_seq[-1]
 
 
+def predict_energy_demand_from_buffer(buffer: "EnergyFeatureBuffer") -> Tuple[np.ndarray, np.ndarray]:
+    """`predict_energy_demand` on a rolling buffer's already-scaled window."""
+    with span("energy", "model_load"):
+        model = _load_or_train_energy()
+    with span("energy", "scale"):
+        last_seq = buffer.latest_window()
+    with span("energy", "predict"):
+        preds = model.predict(last_seq[np.newaxis, ...], verbose=0)[0]
+    return preds, last_seq[-1]
+
+
+def predict_energy_demand_by_feeder(
+    df_recent: Optional[pd.DataFrame] = None, sequence_length: int = 24, feeders: int = 1
+) -> Tuple[np.ndarray, List[int]]:
+    """Predict next 6-hour demand for every feeder in one batched model call.
+
+    Each feeder's window is scaled on its own recent history, exactly as
+    `predict_energy_demand` does for the single series. Feeders with fewer
+    than `sequence_length` usable rows are skipped.
+    Returns (predictions of shape (num_feeders, 6), feeder_ids).
+    """
+    if df_recent is None:
+        df_recent = fetch_energy_data(hours_back=sequence_length + 6, feeders=feeders)
+    with span("energy", "model_load"):
+        model = _load_or_train_energy()
+
+    with span("energy", "scale"):
+        features, _, feeder_ids = _energy_feature_block(df_recent, "feeder_id")
+        starts, stops = segment_bounds(feeder_ids)
+        full = (stops - starts) >= sequence_length
+        if not full.any():
+            raise ValueError("Insufficient recent data for any feeder.")
+        keep = feeder_ids[starts[full]]
+        # Min/max over each feeder's whole history, however long it is
+        mn = np.minimum.reduceat(features, starts)[full][:, np.newaxis]
+        rng = np.maximum.reduceat(features, starts)[full][:, np.newaxis] - mn
+        rng[rng == 0] = 1.0
+        # Last `sequence_length` rows per feeder, as one (F, T, features) batch
+        values = features[stops[full][:, np.newaxis] - sequence_length + np.arange(sequence_length)[np.newaxis, :]]
+        X = (values - mn) / rng
+    with span("energy", "predict"):
+        preds = model.predict(X, batch_size=1024, verbose=0)
+    return preds, [int(f) for f in keep]
+
+
+# ---------- Scenario Simulation ----------
+def simulate_energy_scenarios(
+    perturbations: Dict[str, Sequence[float]],
+    days: int = 7,
+    sequence_length: int = 24,
+    batch_size: int = 1024,
+    df_history: Optional[pd.DataFrame] = None,
+) -> dict:
+    """Forecast 6-hour demand under a grid of additive weather perturbations.
+
+    `perturbations` maps a feature in SCENARIO_FEATURES to a list of deltas
+    (e.g. {"temperature": [1, 2, 3, 4, 5]}); the scenario grid is their cartesian
+    product plus an unperturbed baseline. Each scenario is applied to one window
+    per day over the last `days` days, so every scenario yields a distribution of
+    forecasts. The scaler is fitted once on the unperturbed history, so perturbed
+    values may fall outside [0, 1] as they would for unseen weather.
+
+    Returns a dict with per-scenario mean/std/p05/p50/p95 per horizon step and
+    the mean difference from the baseline.
+    """
+    unknown = set(perturbations) - set(SCENARIO_FEATURES)
+    if unknown:
+        raise ValueError(f"Cannot perturb {sorted(unknown)}; allowed: {list(SCENARIO_FEATURES)}")
+    if days < 1:
+        raise ValueError("days must be >= 1")
+    # Size the grid from the delta counts alone, before fetching or building anything
+    names = list(perturbations)
+    n_scenarios = 1 + math.prod(len(perturbations[name]) for name in names) if names else 1
+    if n_scenarios > MAX_SCENARIO_WINDOWS:
+        raise ValueError(f"Scenario grid too large: {n_scenarios} scenarios")
+
+    if df_history is None:
+        df_history = fetch_energy_data(hours_back=days * 24 + sequence_length + 1)
+    scaled, _, _ = _energy_feature_block(df_history)
+    scaler = fit_scale_inplace(scaled)
+    n = len(scaled)
+    # One window per day, ending at the latest row and stepping back 24h
+    ends = np.arange(n - 1, sequence_length - 2, -24)[:days]
+    if ends.size == 0:
+        raise ValueError("Insufficient history for scenario windows.")
+    windows = np.lib.stride_tricks.sliding_window_view(scaled, (sequence_length, scaled.shape[1]))[:, 0]
+    n_windows = len(ends)
+    if n_scenarios * n_windows > MAX_SCENARIO_WINDOWS:
+        raise ValueError(f"Scenario grid too large: {n_scenarios} scenarios x {n_windows} windows")
+    base = windows[ends - sequence_length + 1]  # (W, seq, F)
+
+    # Scenario grid: row 0 is the unperturbed baseline
+    combos = list(product(*(perturbations[name] for name in names))) if names else []
+    deltas = np.zeros((n_scenarios, len(ENERGY_FEATURE_COLS)), dtype=np.float32)
+    col_idx = [ENERGY_FEATURE_COLS.index(name) for name in names]
+    if combos:
+        deltas[1:, col_idx] = np.asarray(combos, dtype=np.float32)
+    # MinMax is affine, so a raw delta maps to delta * scale_ in scaled space
+    deltas_scaled = deltas * scaler.scale_.astype(np.float32)
+
+    X = base[np.newaxis, ...] + deltas_scaled[:, np.newaxis, np.newaxis, :]
+    X = X.reshape(-1, sequence_length, scaled.shape[1])
+
+    with span("energy", "model_load"):
+        model = _load_or_train_energy()
+    with span("energy", "scenario_predict"):
+        preds = model.predict(X, batch_size=batch_size, verbose=0).reshape(n_scenarios, n_windows, -1)
+
+    mean = preds.mean(axis=1)
+    p05, p50, p95 = np.percentile(preds, [5, 50, 95], axis=1)
+    std = preds.std(axis=1)
+    scenarios = []
+    for i in range(n_scenarios):
+        scenarios.append(
+            {
+                "perturbation": {name: float(deltas[i, j]) for name, j in zip(names, col_idx)},
+                "mean": mean[i].tolist(),
+                "std": std[i].tolist(),
+                "p05": p05[i].tolist(),
+                "p50": p50[i].tolist(),
+                "p95": p95[i].tolist(),
+                "delta_vs_baseline": (mean[i] - mean[0]).tolist(),
+            }
+        )
+    return {
+        "windows": int(n_windows),
+        "horizon_hours": int(preds.shape[-1]),
+        "baseline": scenarios[0],
+        "scenarios": scenarios[1:],
+    }
+
+
 # ---------- Anomaly Detection ----------
-def train_residual_autoencoder(df: Optional[pd.DataFrame] = None, sequence_length: int = 24, epochs: int = 10) -> models.Model:
+def train_residual_autoencoder(
+    df: Optional[pd.DataFrame] = None,
+    sequence_length: int = 24,
+    epochs: int = 10,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    patience: Optional[int] = None,
+) -> models.Model:
     """Train an autoencoder on historical residuals to detect anomalies."""
     if df is None:
         df = fetch_energy_data(hours_back=24 * 30)
@@ -233,41 +560,70 @@ def train_residual_autoencoder(df: Optional[pd.DataFrame] = None, sequence_lengt
     X, y_true, _ = preprocess_energy_data(df, sequence_length=sequence_length)
     y_pred = model.predict(X, verbose=0)
     residuals = (y_true - y_pred).astype(np.float32)
-    ae = _build_residual_autoencoder(vector_length=residuals.shape[1])
-    ae.fit(residuals, residuals, epochs=epochs, batch_size=32, validation_split=0.1, verbose=0)
+    ae, initial_epoch, callbacks = prepare_training(
+        "energy_residual_ae", lambda: _build_residual_autoencoder(vector_length=residuals.shape[1]), checkpoint_dir, resume, patience
+    )
+    ae.fit(residuals, residuals, epochs=epochs, initial_epoch=initial_epoch, batch_size=32, validation_split=0.1, callbacks=callbacks, verbose=0)
     ae.save(ENERGY_AE_PATH)
+    clear_checkpoint(checkpoint_dir, "energy_residual_ae")
     logger.info("Saved energy residual AE to %s", ENERGY_AE_PATH)
+    # Calibrate the alert threshold from training reconstruction errors
+    recon = ae.predict(residuals, batch_size=4096, verbose=0)
+    thresholds = calibrate(np.mean((recon - residuals) ** 2, axis=1), quantile=ANOMALY_QUANTILE)
+    save_thresholds(ENERGY_AE_PATH, thresholds)
+    logger.info("Energy AE threshold (q=%.3f): %.4f", ANOMALY_QUANTILE, thresholds["default"])
     return ae
 
 
 def _load_or_train_ae(df: Optional[pd.DataFrame] = None) -> models.Model:
+    remote = remote_model("energy_ae")
+    if remote is not None:
+        return remote
     if os.path.exists(ENERGY_AE_PATH):
         try:
-            return models.load_model(ENERGY_AE_PATH)
+            return load_model_cached(ENERGY_AE_PATH)
         except Exception:
             logger.warning("Failed to load residual AE; retraining.")
     return train_residual_autoencoder(df=df)
 
 
-def detect_energy_anomalies(predicted: np.ndarray, actual_future: Optional[np.ndarray] = None, threshold: float = 2.5) -> Tuple[bool, float]:
+def detect_energy_anomalies(predicted: np.ndarray, actual_future: Optional[np.ndarray] = None, threshold: Optional[float] = None) -> Tuple[bool, float]:
     """Detect anomalies using residual AE reconstruction error or simple deviation.
 
     If actual_future is provided (length 6), compute residual and reconstruction error.
     Else, return False with 0 score as we cannot judge anomaly without actuals.
+    When threshold is None the value calibrated at AE training time is used.
     """
     if actual_future is None or len(actual_future) != 6:
         return False, 0.0
+    is_anom, errors = detect_energy_anomalies_batch(
+        np.asarray(predicted)[np.newaxis, ...], np.asarray(actual_future)[np.newaxis, ...], threshold=threshold
+    )
+    return bool(is_anom[0]), float(errors[0])
+
+
+def detect_energy_anomalies_batch(
+    predicted: np.ndarray, actual_future: np.ndarray, threshold: Optional[float] = None, batch_size: int = 4096
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized `detect_energy_anomalies` over (N, 6) forecasts and actuals.
+
+    Returns (is_anomaly_bool_array, errors) of shape (N,).
+    """
     residual = (actual_future - predicted).astype(np.float32)
     try:
-        ae = _load_or_train_ae()
-        recon = ae.predict(residual[np.newaxis, ...], verbose=0)[0]
-        error = float(np.mean((recon - residual) ** 2))
-        is_anom = error > threshold
-        return is_anom, error
+        with span("energy", "anomaly_model_load"):
+            ae = _load_or_train_ae()
+        with span("energy", "anomaly_score"):
+            recon = ae.predict(residual, batch_size=batch_size, verbose=0)
+            errors = np.mean((recon - residual) ** 2, axis=1)
+        if threshold is None:
+            threshold = resolve_thresholds(ENERGY_AE_PATH, DEFAULT_ENERGY_THRESHOLD)[0]
     except Exception as exc:
         logger.warning("AE unavailable (%s); using MAE fallback.", exc)
-        mae = float(np.mean(np.abs(residual)))
-        return mae > threshold, mae
+        errors = np.mean(np.abs(residual), axis=1)
+        # Calibrated thresholds are on the AE error scale, not MAE
+        threshold = DEFAULT_ENERGY_THRESHOLD if threshold is None else threshold
+    return errors > threshold, errors
 
 
 # Convenience combined flow
@@ -285,8 +641,13 @@ __all__ = [
     "preprocess_energy_data",
     "train_energy_model",
     "predict_energy_demand",
+    "predict_energy_demand_by_feeder",
+    "predict_energy_demand_from_buffer",
+    "EnergyFeatureBuffer",
     "detect_energy_anomalies",
+    "detect_energy_anomalies_batch",
     "train_residual_autoencoder",
+    "simulate_energy_scenarios",
     "fetch_and_predict",
 ]
 
@@ -0,0 +1,78 @@
+"""
+Memory-lean feature extraction shared by the energy and water pipelines.
+
+Feature columns are copied out of a DataFrame one at a time into a single
+float32 (rows, features) block, already in the requested row order, so the
+DataFrame itself is never copied, re-sorted or sliced into sub-frames. Min/max
+scaling is then applied to that block in place, which gives the same values
+as MinMaxScaler.fit_transform. Peak extra memory is about one float32 block
+plus one source column at a time, instead of several float64 frames.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+
+def sort_order(df: pd.DataFrame, keys: Sequence[str]) -> Optional[np.ndarray]:
+    """Stable row order sorting by `keys` (first key primary), or None if already sorted."""
+    order = np.lexsort([df[key].to_numpy() for key in reversed(keys)])
+    if len(order) < 2 or (np.diff(order) == 1).all():
+        return None
+    return order
+
+
+def column_block(
+    df: pd.DataFrame,
+    columns: Sequence[str],
+    order: Optional[np.ndarray] = None,
+    dtype=np.float32,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """C-contiguous (rows, len(columns)) array of `columns`, rows taken in `order`.
+
+    With `out`, columns are written into its first len(columns) columns.
+    """
+    if out is None:
+        out = np.empty((len(df) if order is None else len(order), len(columns)), dtype=dtype)
+    for j, col in enumerate(columns):
+        values = df[col].to_numpy()
+        out[:, j] = values if order is None else values[order]
+    return out
+
+
+def take_column(df: pd.DataFrame, column: str, order: Optional[np.ndarray] = None) -> np.ndarray:
+    """One column as an array in its own dtype, rows taken in `order`."""
+    values = df[column].to_numpy()
+    return values if order is None else values[order]
+
+
+def fit_scale_inplace(block: np.ndarray, bounds: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> MinMaxScaler:
+    """Fit a MinMaxScaler on `block` and scale it in place; returns the scaler.
+
+    With `bounds` (per-column min, max), the scaler is fitted on those instead,
+    so several blocks can share one scaling.
+    """
+    scaler = MinMaxScaler().fit(block if bounds is None else np.vstack(bounds))
+    block *= scaler.scale_.astype(block.dtype, copy=False)
+    block += scaler.min_.astype(block.dtype, copy=False)
+    return scaler
+
+
+def segment_bounds(keys: np.ndarray):
+    """(starts, stops) of the runs of equal values in a grouped `keys` array."""
+    boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    return np.concatenate([[0], boundaries]), np.concatenate([boundaries, [len(keys)]])
+
+
+__all__ = [
+    "sort_order",
+    "column_block",
+    "take_column",
+    "fit_scale_inplace",
+    "segment_bounds",
+]
@@ -0,0 +1,461 @@
+"""
+Shared model serving for multi-worker API deployments.
+
+With several uvicorn workers, each process would otherwise load its own copy
+of every Keras model and keep its own recent-data buffers. In shared mode one
+loader process owns both:
+
+- models: loaded once and served over a local Unix socket
+  (multiprocessing.connection, authenticated). Workers get a `RemoteModel`
+  proxy from the `_load_or_train_*` helpers, whose `predict` /
+  `predict_on_batch` send the input array and receive the output. The loader
+  reloads a model when its file changes (e.g. after a retrain).
+- recent data: energy and water readings live in `SharedRingBuffer`s in POSIX
+  shared memory. The loader appends new readings as time advances; workers
+  attach read-only and copy out the latest rows, so buffer memory is paid once
+  regardless of worker count. Workers re-attach when the loader restarts and
+  fall back to local data while a buffer has stopped updating.
+
+Usage:
+    export ECOGRID_INFERENCE_AUTHKEY=$(python -c "import secrets; print(secrets.token_hex(32))")
+    python -m ml.inference_server --socket /tmp/ecogrid-infer.sock &
+    ECOGRID_INFERENCE_SOCKET=/tmp/ecogrid-infer.sock uvicorn backend.app.main:app --workers 4
+
+Without ECOGRID_INFERENCE_SOCKET every process loads models locally (default).
+The loader and its workers must share ECOGRID_INFERENCE_AUTHKEY; there is no
+default, since the socket carries pickled messages.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import argparse
+import logging
+import threading
+from datetime import datetime, timedelta
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+INFERENCE_SOCKET = os.environ.get("ECOGRID_INFERENCE_SOCKET", "")
+AUTHKEY = os.environ.get("ECOGRID_INFERENCE_AUTHKEY", "").encode()
+SHM_PREFIX = os.environ.get("ECOGRID_SHM_PREFIX", "ecogrid")
+# Rows per call the loader feeds the model at once
+SERVER_BATCH_SIZE = 4096
+
+BUFFER_COLUMNS = {
+    "energy": ["timestamp", "temperature", "humidity", "wind_speed", "hour", "day", "demand"],
+    "water": ["timestamp", "zone_id", "pressure", "flow", "turbidity", "temperature"],
+}
+INT_COLUMNS = ("hour", "day", "zone_id")
+ENERGY_BUFFER_HOURS = 24 * 7
+WATER_BUFFER_HOURS = 24
+
+logger = logging.getLogger("inference_server")
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+# True inside the loader process, which must load models locally
+_serving = False
+
+
+def _authkey() -> bytes:
+    if not AUTHKEY:
+        raise RuntimeError("ECOGRID_INFERENCE_AUTHKEY must be set to use the inference server.")
+    return AUTHKEY
+
+
+# ---------- Shared Ring Buffer ----------
+class SharedRingBuffer:
+    """Fixed-capacity float64 ring of rows in shared memory; one writer, many readers.
+
+    Layout: int64 header [capacity, columns, rows_written, sequence, generation,
+    max_age] followed by the (capacity, columns) data. The writer bumps
+    `sequence` to odd before and to even after each append (a seqlock), so
+    readers retry instead of copying a half-written update. `generation` is
+    set at creation and zeroed when the owner closes the segment, so readers
+    holding a mapping can tell it was retired. `max_age` is how many seconds
+    the newest row (column 0, epoch seconds) may trail the wall clock before
+    readers treat the buffer as stale (0: never).
+    """
+
+    HEADER = 6
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((self.HEADER,), dtype=np.int64, buffer=shm.buf)
+        self.capacity, self.columns = int(header[0]), int(header[1])
+        self.generation, self.max_age = int(header[4]), int(header[5])
+        self._header = header
+        self._data = np.ndarray((self.capacity, self.columns), dtype=np.float64, buffer=shm.buf, offset=self.HEADER * 8)
+
+    @classmethod
+    def create(cls, name: str, capacity: int, columns: int, max_age: int = 0) -> "SharedRingBuffer":
+        size = cls.HEADER * 8 + capacity * columns * 8
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Another loader may be serving from it; never take it over
+            raise RuntimeError(
+                f"Shared memory segment {name!r} already exists. Stop the other loader, "
+                f"remove /dev/shm/{name} if it is stale, or set ECOGRID_SHM_PREFIX."
+            ) from None
+        header = np.ndarray((cls.HEADER,), dtype=np.int64, buffer=shm.buf)
+        header[:] = (capacity, columns, 0, 0, time.time_ns(), max_age)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedRingBuffer":
+        shm = shared_memory.SharedMemory(name=name)
+        # Readers must not unlink the loader's segment when they exit
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        return cls(shm, owner=False)
+
+    @property
+    def rows_written(self) -> int:
+        return int(self._header[2])
+
+    @property
+    def retired(self) -> bool:
+        """True once the segment this mapping points at was closed by its owner."""
+        return int(self._header[4]) != self.generation
+
+    def is_stale(self, rows: np.ndarray) -> bool:
+        """True when `rows` (from `latest`) end more than `max_age` seconds ago."""
+        return bool(self.max_age) and (len(rows) == 0 or rows[-1, 0] < time.time() - self.max_age)
+
+    def append(self, rows: np.ndarray) -> None:
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.columns)[-self.capacity :]
+        start = self.rows_written
+        idx = (start + np.arange(len(rows))) % self.capacity
+        self._header[3] += 1
+        self._data[idx] = rows
+        self._header[2] = start + len(rows)
+        self._header[3] += 1
+
+    def latest(self, n: Optional[int] = None, retries: int = 100) -> np.ndarray:
+        """Copy of the newest `n` rows (all available when None), oldest first."""
+        for _ in range(retries):
+            seq = int(self._header[3])
+            if seq % 2:
+                time.sleep(0)
+                continue
+            written = int(self._header[2])
+            count = min(written, self.capacity) if n is None else min(n, written, self.capacity)
+            out = self._data[(written - count + np.arange(count)) % self.capacity]
+            if int(self._header[3]) == seq:
+                return out
+        raise RuntimeError("Shared buffer kept changing during read.")
+
+    def close(self) -> None:
+        if self.owner:
+            self._header[4] = 0
+        self._header = self._data = None  # release the views so the mapping can close
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _buffer_name(kind: str) -> str:
+    return f"{SHM_PREFIX}_{kind}_recent"
+
+
+def _frame_to_rows(kind: str, df: pd.DataFrame) -> np.ndarray:
+    cols = BUFFER_COLUMNS[kind]
+    out = np.empty((len(df), len(cols)), dtype=np.float64)
+    out[:, 0] = pd.to_datetime(df["timestamp"]).to_numpy(dtype="datetime64[ns]").astype(np.int64) / 1e9
+    for i, col in enumerate(cols[1:], start=1):
+        out[:, i] = df[col].to_numpy(dtype=np.float64)
+    return out
+
+
+def _rows_to_frame(kind: str, rows: np.ndarray) -> pd.DataFrame:
+    cols = BUFFER_COLUMNS[kind]
+    df = pd.DataFrame(rows, columns=cols)
+    df["timestamp"] = pd.to_datetime(np.round(rows[:, 0] * 1e9).astype(np.int64))
+    for col in INT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(np.int64)
+    return df
+
+
+# ---------- Worker Side ----------
+_buffers: Dict[str, SharedRingBuffer] = {}
+_buffers_lock = threading.Lock()
+_local = threading.local()
+
+
+def shared_mode() -> bool:
+    return bool(INFERENCE_SOCKET) and not _serving
+
+
+def _attached(kind: str, renew: bool = False) -> Optional[SharedRingBuffer]:
+    """This process's mapping of the `kind` buffer, re-attached after a loader restart."""
+    with _buffers_lock:
+        buf = _buffers.get(kind)
+        if buf is not None and (renew or buf.retired):
+            # Not closed: other threads may still be copying rows out of it
+            del _buffers[kind]
+            buf = None
+        if buf is None:
+            try:
+                buf = _buffers[kind] = SharedRingBuffer.attach(_buffer_name(kind))
+            except FileNotFoundError:
+                return None
+        return buf
+
+
+def shared_recent(kind: str, hours_back: int, zones: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """Latest `hours_back` hours from the loader's buffer, or None if unavailable.
+
+    Energy rows are hourly; water rows (zones 1..`zones`) are sorted by
+    (zone_id, timestamp) like fetch_water_data returns them. A retired or
+    stale buffer is re-attached once; if it is still stale, None.
+    """
+    if not shared_mode():
+        return None
+    for renew in (False, True):
+        buf = _attached(kind, renew)
+        if buf is None:
+            return None
+        rows = buf.latest()
+        if not buf.is_stale(rows):
+            break
+    else:
+        # The loader stopped refreshing (or crashed) without a replacement
+        logger.warning("Shared %s buffer has stopped updating; using local data.", kind)
+        return None
+    if len(rows) == 0:
+        return None
+    cutoff = rows[-1, 0] - hours_back * 3600
+    if rows[0, 0] > cutoff:
+        return None  # buffer does not reach back far enough
+    rows = rows[rows[:, 0] > cutoff]
+    if zones is not None:
+        if rows[:, 1].max() < zones:
+            return None
+        rows = rows[rows[:, 1] <= zones]
+    df = _rows_to_frame(kind, rows)
+    if kind == "water":
+        df = df.sort_values(["zone_id", "timestamp"], kind="stable").reset_index(drop=True)
+    return df
+
+
+def _request(message: tuple):
+    conn = getattr(_local, "conn", None)
+    for attempt in (0, 1):
+        if conn is None:
+            conn = _local.conn = Client(INFERENCE_SOCKET, family="AF_UNIX", authkey=_authkey())
+        try:
+            conn.send(message)
+            status, payload = conn.recv()
+            break
+        except (EOFError, OSError):
+            # Loader restarted; reconnect once
+            _local.conn = conn = None
+            if attempt:
+                raise
+    if status != "ok":
+        raise RuntimeError(f"Inference server error: {payload}")
+    return payload
+
+
+class RemoteModel:
+    """Stand-in for a Keras model that runs inference in the loader process."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def predict(self, x, batch_size: Optional[int] = None, verbose: int = 0):
+        return _request(("predict", self.name, np.ascontiguousarray(x, dtype=np.float32)))
+
+    def predict_on_batch(self, x):
+        return self.predict(x)
+
+    def __repr__(self) -> str:
+        return f"RemoteModel({self.name!r}, socket={INFERENCE_SOCKET!r})"
+
+
+def remote_model(name: str) -> Optional[RemoteModel]:
+    """A `RemoteModel` for `name` in shared mode, else None (load locally)."""
+    return RemoteModel(name) if shared_mode() else None
+
+
+# ---------- Loader Process ----------
+class _ModelStore:
+    """Loads each model once and reloads it when its file changes."""
+
+    def __init__(self):
+        from . import energy_model, water_model
+
+        self._loaders = {
+            "energy_lstm": (lambda: energy_model.ENERGY_MODEL_PATH, energy_model._load_or_train_energy),
+            "energy_ae": (lambda: energy_model.ENERGY_AE_PATH, energy_model._load_or_train_ae),
+            "water_lstm": (lambda: water_model.WATER_LSTM_PATH, water_model._load_or_train_water_lstm),
+            "water_ae": (lambda: water_model.WATER_AE_PATH, water_model._load_or_train_water_ae),
+        }
+        self._models: Dict[str, tuple] = {}
+        self._locks = {name: threading.Lock() for name in self._loaders}
+
+    def get(self, name: str):
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+        path_fn, load = self._loaders[name]
+        path = path_fn()
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        cached = self._models.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with self._locks[name]:
+            cached = self._models.get(name)
+            if cached is None or cached[0] != mtime:
+                model = load()
+                mtime = os.path.getmtime(path) if os.path.exists(path) else None
+                self._models[name] = cached = (mtime, model)
+                logger.info("Loaded %s from %s", name, path)
+        return cached[1]
+
+    def predict(self, name: str, x: np.ndarray) -> np.ndarray:
+        model = self.get(name)
+        if len(x) <= SERVER_BATCH_SIZE:
+            # Direct call is thread-safe and skips predict()'s per-call setup
+            return np.asarray(model(x, training=False))
+        return model.predict(x, batch_size=SERVER_BATCH_SIZE, verbose=0)
+
+
+class _BufferFeeder:
+    """Owns the shared recent-data buffers and appends new readings over time."""
+
+    def __init__(self, zones: int, refresh_seconds: float = 30.0):
+        from . import energy_model, water_model
+
+        self._energy_model = energy_model
+        self._water_model = water_model
+        self.zone_ids = list(range(1, zones + 1))
+        now = datetime.utcnow().replace(second=0, microsecond=0)
+        # Newest rows lag by up to one step plus a refresh; allow a missed refresh too
+        slack = int(2 * refresh_seconds)
+        self.energy = SharedRingBuffer.create(
+            _buffer_name("energy"), ENERGY_BUFFER_HOURS, len(BUFFER_COLUMNS["energy"]), max_age=3600 + slack
+        )
+        self.water = SharedRingBuffer.create(
+            _buffer_name("water"), WATER_BUFFER_HOURS * 6 * zones, len(BUFFER_COLUMNS["water"]), max_age=600 + slack
+        )
+        self.energy_last = now.replace(minute=0)
+        start = self.energy_last - timedelta(hours=ENERGY_BUFFER_HOURS - 1)
+        self.energy.append(_frame_to_rows("energy", energy_model._simulate_energy_series(start, ENERGY_BUFFER_HOURS)))
+        self.water_last = now.replace(minute=now.minute - now.minute % 10)
+        water = water_model._simulate_water_series(self.water_last - timedelta(hours=WATER_BUFFER_HOURS) + timedelta(minutes=10), self.water_last, self.zone_ids)
+        self.water.append(_frame_to_rows("water", water.sort_values(["timestamp", "zone_id"])))
+
+    def refresh(self) -> None:
+        now = datetime.utcnow()
+        due_hours = int((now - self.energy_last) / timedelta(hours=1))
+        if due_hours > 0:
+            series = self._energy_model._simulate_energy_series(self.energy_last + timedelta(hours=1), due_hours)
+            self.energy.append(_frame_to_rows("energy", series))
+            self.energy_last += timedelta(hours=due_hours)
+        if now - self.water_last >= timedelta(minutes=10):
+            new = self._water_model._simulate_water_series(self.water_last + timedelta(minutes=10), now, self.zone_ids)
+            if len(new):
+                self.water.append(_frame_to_rows("water", new.sort_values(["timestamp", "zone_id"])))
+                self.water_last = pd.Timestamp(new["timestamp"].max()).to_pydatetime()
+
+    def close(self) -> None:
+        self.energy.close()
+        self.water.close()
+
+
+def _serve_connection(conn, store: _ModelStore) -> None:
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if message[0] == "predict":
+                    conn.send(("ok", store.predict(message[1], message[2])))
+                elif message[0] == "ping":
+                    conn.send(("ok", "pong"))
+                else:
+                    conn.send(("error", f"unknown command {message[0]!r}"))
+            except Exception as exc:
+                logger.exception("Request %s failed", message[0])
+                conn.send(("error", str(exc)))
+
+
+def serve(socket_path: str, zones: int = 5, refresh_seconds: float = 30.0) -> None:
+    """Run the loader: model server on `socket_path` plus shared data buffers."""
+    global _serving
+    authkey = _authkey()
+    _serving = True
+    store = _ModelStore()
+    for name in ("energy_lstm", "energy_ae", "water_lstm", "water_ae"):
+        store.get(name)
+    feeder = _BufferFeeder(zones, refresh_seconds)
+    stop = threading.Event()
+
+    def _feed():
+        while not stop.wait(refresh_seconds):
+            try:
+                feeder.refresh()
+            except Exception as exc:
+                logger.warning("Buffer refresh failed: %s", exc)
+
+    threading.Thread(target=_feed, name="buffer-feeder", daemon=True).start()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    old_umask = os.umask(0o177)
+    try:
+        listener = Listener(socket_path, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(old_umask)
+    logger.info("Serving models on %s (buffers: %s, %s)", socket_path, _buffer_name("energy"), _buffer_name("water"))
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as exc:  # e.g. failed authentication
+                logger.warning("Rejected connection: %s", exc)
+                continue
+            threading.Thread(target=_serve_connection, args=(conn, store), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        listener.close()
+        feeder.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve models and recent-data buffers to API workers")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET or "/tmp/ecogrid-infer.sock")
+    parser.add_argument("--zones", type=int, default=5, help="Water zones kept in the shared buffer")
+    parser.add_argument("--refresh-seconds", type=float, default=30.0)
+    args = parser.parse_args()
+    serve(args.socket, zones=args.zones, refresh_seconds=args.refresh_seconds)
+
+
+__all__ = [
+    "SharedRingBuffer",
+    "RemoteModel",
+    "remote_model",
+    "shared_mode",
+    "shared_recent",
+    "serve",
+]
+
+
+if __name__ == "__main__":
+    main()
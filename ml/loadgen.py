@@ -0,0 +1,383 @@
+"""
+Load generator for the EcoGrid API, driven by a seeded synthetic sensor fleet.
+
+The fleet (sensor metadata plus water and energy signals) is built from the
+same signal models the cascade uses (`_simulate_water_series`,
+`_simulate_energy_series`), anchored at a fixed time derived from the seed
+rather than the wall clock, so a given --seed always produces the same
+sensors and request payloads:
+
+- crud: get / update / create / delete on /api/sensors (fleet is preloaded)
+- predict: latest energy and water predictions and the water outlook
+- impact: /api/simulate/water/impact with the most deviating zones of a
+  random tick of the water signal
+- scenarios: /api/simulate/energy/scenarios with temperature deltas drawn
+  from the energy signal
+- simulate: on-demand /api/simulate/energy and /api/simulate/water runs
+
+Load is open-loop: arrivals follow a seeded Poisson process per group at the
+configured rate and are sent whether or not earlier requests have finished,
+so a slow server shows up as latency (measured from the scheduled send time)
+instead of a lower request rate. The report lists per-endpoint latency
+percentiles, error rates and achieved rate, plus server CPU, RSS and threads
+scraped from /metrics while the test runs. Statuses the workload expects
+(404 on a missing prediction or sensor, 409 on a duplicate create) are
+reported separately from errors.
+
+Run: python -m ml.loadgen --sensors 10000 --zones 1000 --duration 60 \\
+         --rates crud=50,predict=20,impact=5,scenarios=1,simulate=0.2
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from .energy_model import _simulate_energy_series
+from .profiling import seeded
+from .water_model import _simulate_water_series
+
+
+DEFAULT_BASE_URL = os.environ.get("ECOGRID_API_URL", "http://127.0.0.1:8000")
+DEFAULT_RATES = {"crud": 20.0, "predict": 10.0, "impact": 2.0, "scenarios": 0.5, "simulate": 0.2}
+SENSOR_TYPES = ("pressure", "flow", "turbidity", "temperature", "energy")
+# (operation, weight) per group
+OPERATIONS = {
+    "crud": (("get", 0.6), ("update", 0.25), ("create", 0.1), ("delete", 0.05)),
+    "predict": (("energy", 0.45), ("water", 0.45), ("outlook", 0.1)),
+    "impact": (("impact", 1.0),),
+    "scenarios": (("scenarios", 1.0),),
+    "simulate": (("energy", 0.5), ("water", 0.5)),
+}
+# Statuses that are a normal outcome for a group, not a server failure
+EXPECTED_STATUSES = {"crud": (404, 409), "predict": (404,)}
+# Signals end at SIGNAL_EPOCH plus a seed-dependent number of 10-minute steps within a week
+SIGNAL_EPOCH = datetime(2026, 1, 5)
+PROCESS_METRICS = ("process_cpu_seconds_total", "process_resident_memory_bytes", "process_threads", "process_open_fds")
+
+logger = logging.getLogger("loadgen")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+# A prepared request: (group, operation, method, path, json body or None)
+Request = Tuple[str, str, str, str, Optional[dict]]
+
+
+# ---------- Fleet ----------
+class SyntheticFleet:
+    """Seeded sensors and signal-derived request payloads."""
+
+    def __init__(self, sensors: int = 10_000, zones: int = 1_000, seed: int = 0, impact_pool: int = 256):
+        self.rng = np.random.default_rng(seed)
+        self.zones = zones
+        self.signal_end = SIGNAL_EPOCH + timedelta(minutes=10 * (seed % (7 * 24 * 6)))
+        zone_of = self.rng.integers(1, zones + 1, size=sensors)
+        type_of = self.rng.integers(0, len(SENSOR_TYPES), size=sensors)
+        self.sensors = [
+            {"id": f"S{i:06d}", "zone_id": int(zone_of[i]), "type": SENSOR_TYPES[type_of[i]], "location": f"zone-{zone_of[i]}"}
+            for i in range(sensors)
+        ]
+        self._next_id = sensors
+        # The signal models draw from NumPy's global RNG; seed it only while building
+        with seeded(seed):
+            self._impact_payloads = self._build_impact_payloads(impact_pool)
+            self._temperature_deltas = self._build_temperature_deltas()
+
+    def _build_impact_payloads(self, count: int) -> List[dict]:
+        # Pressure deviation of every zone at random ticks of a 6h signal
+        df = _simulate_water_series(self.signal_end - timedelta(hours=6), self.signal_end, range(1, self.zones + 1))
+        pressure = df["pressure"].to_numpy().reshape(self.zones, -1)
+        z = np.abs(pressure - pressure.mean(axis=1, keepdims=True)) / (pressure.std(axis=1, keepdims=True) + 1e-9)
+        payloads = []
+        for tick in self.rng.integers(0, pressure.shape[1], size=count):
+            k = int(self.rng.integers(1, 6))
+            top = np.argsort(-z[:, tick])[:k]
+            payloads.append({"zone_scores": {int(i) + 1: float(z[i, tick]) for i in top}, "hops": 3, "decay": 0.5})
+        return payloads
+
+    def _build_temperature_deltas(self) -> np.ndarray:
+        # Hour-to-hour temperature changes over a week of the energy signal
+        start = self.signal_end.replace(minute=0) - timedelta(hours=167)
+        temperature = _simulate_energy_series(start, 168)["temperature"].to_numpy()
+        return np.round(np.diff(temperature), 2)
+
+    def next_request(self, group: str) -> Request:
+        ops, weights = zip(*OPERATIONS[group])
+        op = ops[int(self.rng.choice(len(ops), p=np.asarray(weights) / sum(weights)))]
+        if group == "crud":
+            if op == "create":
+                self._next_id += 1
+                zone = int(self.rng.integers(1, self.zones + 1))
+                body = {"id": f"S{self._next_id:06d}", "zone_id": zone, "type": SENSOR_TYPES[zone % len(SENSOR_TYPES)]}
+                return group, op, "POST", "/api/sensors/", body
+            sensor = self.sensors[int(self.rng.integers(len(self.sensors)))]
+            path = f"/api/sensors/{sensor['id']}"
+            if op == "update":
+                return group, op, "PUT", path, {"location": f"zone-{sensor['zone_id']}-r{int(self.rng.integers(100))}"}
+            return group, op, "GET" if op == "get" else "DELETE", path, None
+        if group == "predict":
+            if op == "outlook":
+                return group, op, "GET", f"/api/predict/water/outlook?hours={int(self.rng.integers(1, 25))}", None
+            return group, op, "GET", f"/api/predict/{op}", None
+        if group == "impact":
+            return group, op, "POST", "/api/simulate/water/impact", self._impact_payloads[int(self.rng.integers(len(self._impact_payloads)))]
+        if group == "scenarios":
+            deltas = sorted(float(d) for d in self.rng.choice(self._temperature_deltas, size=3, replace=False))
+            return group, op, "POST", "/api/simulate/energy/scenarios", {"perturbations": {"temperature": deltas}, "days": int(self.rng.integers(1, 8))}
+        return group, op, "POST", f"/api/simulate/{op}", None
+
+
+def arrival_schedule(rates: Dict[str, float], duration: float, seed: int = 0) -> List[Tuple[float, str]]:
+    """Seeded Poisson arrival offsets (seconds from start) per group, merged in time order."""
+    rng = np.random.default_rng(seed + 1)
+    arrivals: List[Tuple[float, str]] = []
+    for group, rate in rates.items():
+        if rate <= 0:
+            continue
+        expected = int(rate * duration * 1.5) + 10
+        times = np.cumsum(rng.exponential(1.0 / rate, size=expected))
+        arrivals += [(float(t), group) for t in times[times < duration]]
+    arrivals.sort()
+    return arrivals
+
+
+# ---------- Load Runner ----------
+class LoadRunner:
+    """Sends prepared requests on a thread pool and records their outcomes."""
+
+    def __init__(self, base_url: str, api_key: str, concurrency: int = 64, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"x-api-key": api_key}
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="loadgen")
+        self.results: List[tuple] = []
+        self._results_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _send(self, request: Request, scheduled: float) -> None:
+        group, op, method, path, body = request
+        started = time.perf_counter()
+        try:
+            resp = self._session().request(method, self.base_url + path, json=body, headers=self.headers, timeout=self.timeout)
+            status = resp.status_code
+        except requests.RequestException as exc:
+            status = type(exc).__name__
+        finished = time.perf_counter()
+        # Latency from the scheduled send time, so client-side queueing is not hidden
+        with self._results_lock:
+            self.results.append((group, op, status, finished - scheduled, finished - started, started - scheduled))
+
+    def preload(self, fleet: SyntheticFleet) -> int:
+        """Create every fleet sensor (closed-loop); returns how many were accepted."""
+        def create(sensor: dict) -> bool:
+            resp = self._session().post(f"{self.base_url}/api/sensors/", json=sensor, headers=self.headers, timeout=self.timeout)
+            return resp.status_code in (201, 409)
+
+        return sum(self.pool.map(create, fleet.sensors))
+
+    def run(self, fleet: SyntheticFleet, arrivals: List[Tuple[float, str]]) -> float:
+        """Send `arrivals` open-loop; returns the wall time until all responses are in."""
+        t0 = time.perf_counter()
+        futures = []
+        for offset, group in arrivals:
+            request = fleet.next_request(group)
+            delay = t0 + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(self.pool.submit(self._send, request, t0 + offset))
+        for future in futures:
+            future.result()
+        return time.perf_counter() - t0
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+class MetricsScraper(threading.Thread):
+    """Samples the server's process_* metrics from /metrics every `interval` seconds."""
+
+    def __init__(self, base_url: str, interval: float = 1.0):
+        super().__init__(name="loadgen-scraper", daemon=True)
+        self.url = base_url.rstrip("/") + "/metrics"
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self._stop_event = threading.Event()
+
+    def scrape(self) -> Optional[Dict[str, float]]:
+        try:
+            text = requests.get(self.url, timeout=5).text
+        except requests.RequestException:
+            return None
+        sample = {"t": time.perf_counter()}
+        for line in text.splitlines():
+            name, _, value = line.partition(" ")
+            if name in PROCESS_METRICS:
+                sample[name] = float(value)
+        return sample
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            sample = self.scrape()
+            if sample is not None:
+                self.samples.append(sample)
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join(self.interval + 5)
+        sample = self.scrape()
+        if sample is not None:
+            self.samples.append(sample)
+
+
+# ---------- Report ----------
+def summarize(results: List[tuple], elapsed: float, samples: List[Dict[str, float]]) -> dict:
+    """Per-endpoint latency percentiles and error rates, plus server resource usage."""
+    endpoints: Dict[str, dict] = {}
+    by_key: Dict[Tuple[str, str], List[tuple]] = {}
+    for r in results:
+        by_key.setdefault((r[0], r[1]), []).append(r)
+    for (group, op), rows in sorted(by_key.items()):
+        latency = np.array([r[3] for r in rows]) * 1e3
+        service = np.array([r[4] for r in rows]) * 1e3
+        statuses: Dict[str, int] = {}
+        for r in rows:
+            statuses[str(r[2])] = statuses.get(str(r[2]), 0) + 1
+        expected = EXPECTED_STATUSES.get(group, ())
+        errors = sum(1 for r in rows if not (isinstance(r[2], int) and (r[2] < 400 or r[2] in expected)))
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+        endpoints[f"{group}/{op}"] = {
+            "requests": len(rows),
+            "rate": len(rows) / elapsed if elapsed > 0 else 0.0,
+            "errors": errors,
+            "error_rate": errors / len(rows),
+            "statuses": statuses,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(latency.max()),
+            "mean_service_ms": float(service.mean()),
+            "late_sends": int(sum(1 for r in rows if r[5] > 0.1)),
+        }
+
+    server: dict = {}
+    cpu = [s for s in samples if "process_cpu_seconds_total" in s]
+    if len(cpu) >= 2:
+        server["cpu_utilization"] = (cpu[-1]["process_cpu_seconds_total"] - cpu[0]["process_cpu_seconds_total"]) / max(cpu[-1]["t"] - cpu[0]["t"], 1e-9)
+    for name, key in (("process_resident_memory_bytes", "rss_mb"), ("process_threads", "threads"), ("process_open_fds", "open_fds")):
+        values = [s[name] for s in samples if name in s]
+        if values:
+            scale = 2**20 if key == "rss_mb" else 1
+            server[key] = {"start": values[0] / scale, "max": max(values) / scale, "end": values[-1] / scale}
+    total = len(results)
+    total_errors = sum(e["errors"] for e in endpoints.values())
+    return {
+        "requests": total,
+        "seconds": elapsed,
+        "rate": total / elapsed if elapsed > 0 else 0.0,
+        "error_rate": total_errors / total if total else 0.0,
+        "endpoints": endpoints,
+        "server": server,
+    }
+
+
+def log_report(report: dict) -> None:
+    logger.info("%d requests in %.1fs (%.1f req/s), error rate %.2f%%", report["requests"], report["seconds"], report["rate"], report["error_rate"] * 100)
+    for name, e in report["endpoints"].items():
+        logger.info(
+            "%-22s n=%6d %7.2f/s p50=%8.1fms p95=%8.1fms p99=%8.1fms err=%6.2f%% late=%d %s",
+            name, e["requests"], e["rate"], e["p50_ms"], e["p95_ms"], e["p99_ms"], e["error_rate"] * 100, e["late_sends"], e["statuses"],
+        )
+    server = report["server"]
+    if not server:
+        logger.info("Server metrics unavailable (no process_* metrics at /metrics)")
+        return
+    if "cpu_utilization" in server:
+        logger.info("Server CPU %.0f%% of one core", server["cpu_utilization"] * 100)
+    for key in ("rss_mb", "threads", "open_fds"):
+        if key in server:
+            logger.info("Server %-8s start=%.1f max=%.1f end=%.1f", key, server[key]["start"], server[key]["max"], server[key]["end"])
+
+
+def _parse_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for part in filter(None, value.split(",")):
+        group, _, rate = part.partition("=")
+        if group not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown group {group!r}; expected one of {sorted(OPERATIONS)}")
+        rates[group] = float(rate)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of the EcoGrid API with a synthetic sensor fleet")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--api-key", default=os.environ.get("ECOGRID_API_KEY", "dev-key"))
+    parser.add_argument("--sensors", type=int, default=10_000)
+    parser.add_argument("--zones", type=int, default=1_000)
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of load")
+    parser.add_argument("--rates", type=_parse_rates, default=None, help="Requests/s per group, e.g. crud=50,predict=20,simulate=0")
+    parser.add_argument("--concurrency", type=int, default=64, help="Max in-flight requests")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scrape-interval", type=float, default=1.0)
+    parser.add_argument("--no-preload", action="store_true", help="Do not create the fleet's sensors first")
+    parser.add_argument("--out", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    rates = {**DEFAULT_RATES, **(args.rates or {})}
+    fleet = SyntheticFleet(sensors=args.sensors, zones=args.zones, seed=args.seed)
+    arrivals = arrival_schedule(rates, args.duration, seed=args.seed)
+    logger.info("Fleet: %d sensors in %d zones; %d requests scheduled over %.0fs", args.sensors, args.zones, len(arrivals), args.duration)
+
+    runner = LoadRunner(args.base_url, args.api_key, concurrency=args.concurrency, timeout=args.timeout)
+    try:
+        if not args.no_preload:
+            t0 = time.perf_counter()
+            created = runner.preload(fleet)
+            logger.info("Preloaded %d sensors in %.1fs", created, time.perf_counter() - t0)
+        scraper = MetricsScraper(args.base_url, interval=args.scrape_interval)
+        scraper.start()
+        elapsed = runner.run(fleet, arrivals)
+        scraper.stop()
+    finally:
+        runner.close()
+
+    report = summarize(runner.results, elapsed, scraper.samples)
+    report["meta"] = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "base_url": args.base_url,
+        "sensors": args.sensors,
+        "zones": args.zones,
+        "rates": rates,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+    }
+    log_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info("Wrote %s", args.out)
+
+
+if __name__ == "__main__":
+    main()
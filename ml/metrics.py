@@ -0,0 +1,225 @@
+"""
+Lightweight in-process metrics for the cascade, model modules and API.
+
+Provides counters, histograms and a `span` timer that records per-stage
+durations, rendered in the Prometheus text exposition format (0.0.4). Kept
+dependency-free and cheap (one lock and a bisect per observation) so it can
+stay enabled in production. The standard process_* metrics (CPU seconds,
+resident memory, open fds, threads) are read from getrusage and /proc at
+scrape time.
+
+Usage:
+    with span("energy", "fetch"):
+        df = fetch_energy_data(...)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+import resource
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label key: [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(s[0]), s[1], s[2]) for key, s in self._series.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class ProcessCollector:
+    """Standard process_* metrics of the current process, read at render time."""
+
+    name = "process"
+
+    @staticmethod
+    def _proc_status() -> Dict[str, str]:
+        try:
+            with open("/proc/self/status") as f:
+                return dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            return {}
+
+    def render(self) -> List[str]:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        max_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        status = self._proc_status()
+        rss = int(status["VmRSS"].split()[0]) * 1024 if "VmRSS" in status else max_rss
+        threads = int(status["Threads"]) if "Threads" in status else threading.active_count()
+        samples = [
+            ("process_cpu_seconds_total", "counter", "Total user and system CPU time spent in seconds.", usage.ru_utime + usage.ru_stime),
+            ("process_resident_memory_bytes", "gauge", "Resident memory size in bytes.", rss),
+            ("process_max_resident_memory_bytes", "gauge", "Peak resident memory size in bytes.", max_rss),
+            ("process_threads", "gauge", "Number of OS threads in the process.", threads),
+        ]
+        if os.path.isdir("/proc/self/fd"):
+            samples.append(("process_open_fds", "gauge", "Number of open file descriptors.", len(os.listdir("/proc/self/fd"))))
+        lines: List[str] = []
+        for name, kind, documentation, value in samples:
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "ecogrid_stage_duration_seconds",
+    "Duration of cascade and model pipeline stages.",
+    ("pipeline", "stage"),
+)
+CASCADE_RUNS = REGISTRY.counter(
+    "ecogrid_cascade_runs_total",
+    "Cascade job runs by outcome.",
+    ("pipeline", "status"),
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "ecogrid_http_request_duration_seconds",
+    "HTTP request latency by route handler.",
+    ("method", "handler", "status"),
+)
+REGISTRY._register(ProcessCollector())
+
+
+@contextmanager
+def span(pipeline: str, stage: str) -> Iterator[None]:
+    """Time the enclosed block into ecogrid_stage_duration_seconds{pipeline, stage}."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, pipeline=pipeline, stage=stage)
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render()
+
+
+__all__ = [
+    "CONTENT_TYPE",
+    "REGISTRY",
+    "STAGE_SECONDS",
+    "CASCADE_RUNS",
+    "HTTP_REQUEST_SECONDS",
+    "span",
+    "render_prometheus",
+]
@@ -0,0 +1,95 @@
+"""
+Process-pool helpers shared by the offline jobs and the cascade's water shards.
+
+Workers are started with spawn: forking a process that may already hold
+TensorFlow state is unsafe. Each worker limits TensorFlow to its share of the
+CPUs (cpu_count / workers intra-op threads) so a pool does not oversubscribe
+the machine.
+"""
+
+from __future__ import annotations
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Optional, Sequence
+
+
+def tf_threads_per_worker(workers: int) -> int:
+    """Intra-op threads each of `workers` processes may use."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def limit_tf_threads(tf_threads: int) -> None:
+    """Cap TensorFlow's thread pools in this process (no-op for 0 or without TF)."""
+    if tf_threads <= 0:
+        return
+    try:
+        import tensorflow as tf
+    except Exception:  # pragma: no cover
+        return
+    tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def spawn_context():
+    return multiprocessing.get_context("spawn")
+
+
+def _init_pool_worker(tf_threads: int, initializer: Optional[Callable], initargs: tuple) -> None:
+    limit_tf_threads(tf_threads)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def run_pool(
+    tasks: Sequence[tuple],
+    fn: Callable[..., Any],
+    workers: int,
+    on_result: Callable[[Any], None],
+    on_error: Callable[[tuple, BaseException], None],
+    initializer: Optional[Callable] = None,
+    initargs: tuple = (),
+) -> None:
+    """Run `fn(*task)` for every task and hand each outcome to a callback.
+
+    Results go to `on_result` as they complete; a task that raises goes to
+    `on_error(task, exc)` and the rest keep running. With `workers <= 0`
+    tasks run inline in this process. `initializer(*initargs)` runs once per
+    worker (or once inline); `fn` and `initializer` must be importable, as
+    spawn pickles them by name.
+    """
+    if workers <= 0:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            try:
+                result = fn(*task)
+            except Exception as exc:
+                on_error(task, exc)
+                continue
+            on_result(result)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=spawn_context(),
+        initializer=_init_pool_worker,
+        initargs=(tf_threads_per_worker(workers), initializer, initargs),
+    ) as pool:
+        futures = {pool.submit(fn, *task): task for task in tasks}
+        for fut in as_completed(futures):
+            try:
+                result = fut.result()
+            except Exception as exc:  # includes BrokenProcessPool when a worker dies
+                on_error(futures[fut], exc)
+                continue
+            on_result(result)
+
+
+__all__ = [
+    "limit_tf_threads",
+    "run_pool",
+    "spawn_context",
+    "tf_threads_per_worker",
+]
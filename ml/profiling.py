@@ -0,0 +1,337 @@
+"""
+Opt-in CPU and memory profiling for cascade jobs and API requests.
+
+When armed, the next N cascade jobs and/or API requests run under cProfile and
+tracemalloc. Each capture is written to its own directory under the profile
+dir with:
+    profile.prof   cProfile stats (open with pstats or snakeviz)
+    memory.txt     top allocation sites from a tracemalloc snapshot
+    meta.json      job/request name, inputs, RNG seed, duration, peak memory
+
+Because data is simulated from NumPy's global RNG, each profiled run is seeded
+with a fresh random seed that is recorded in meta.json; `replay` re-seeds and
+re-runs the same job or request so the slow case can be reproduced offline.
+The global RNG is shared by every thread, so a capture only replays exactly if
+nothing else drew from it meanwhile. Cascade ticks run their pipelines one
+after the other while job profiling is armed for that reason; an API-triggered
+run or request overlapping a profiled block can still perturb its draws.
+
+Requests are profiled inside the route handler (which FastAPI runs in a worker
+thread for sync routes), so only handlers decorated with `@profiled("request")`
+are captured; the HTTP middleware merely records method, path, query and body
+for replay via `capture_request_inputs`.
+
+Arming:
+    ECOGRID_PROFILE_NEXT=3 [ECOGRID_PROFILE_KINDS=job,request]  at process start
+    POST /api/admin/profile {"count": 3, "kinds": ["request"]}  at runtime
+
+Replay: python -m ml.profiling replay data/profiles/<capture-dir>
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import cProfile
+import secrets
+import argparse
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+PROFILE_DIR = os.environ.get("ECOGRID_PROFILE_DIR", os.path.join(BASE_DIR, "data", "profiles"))
+PROFILE_KINDS = ("job", "request")
+MAX_CAPTURED_BODY_BYTES = 64 * 1024
+
+logger = logging.getLogger("profiling")
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+_lock = threading.Lock()
+_remaining: Dict[str, int] = {kind: 0 for kind in PROFILE_KINDS}
+# cProfile/tracemalloc are process-wide; only one capture may run at a time
+_active = False
+# Request method/path/query/body recorded by the API middleware for replay
+_request_inputs: ContextVar[Optional[dict]] = ContextVar("ecogrid_request_inputs", default=None)
+
+
+# ---------- Arming ----------
+def arm(count: int, kinds: Sequence[str] = PROFILE_KINDS) -> Dict[str, int]:
+    """Profile the next `count` runs of each kind in `kinds`. Returns remaining counts."""
+    unknown = set(kinds) - set(PROFILE_KINDS)
+    if unknown:
+        raise ValueError(f"Unknown profile kinds: {sorted(unknown)}")
+    with _lock:
+        for kind in kinds:
+            _remaining[kind] = max(0, int(count))
+        return dict(_remaining)
+
+
+def status() -> dict:
+    with _lock:
+        return {"remaining": dict(_remaining), "active": _active, "profile_dir": PROFILE_DIR}
+
+
+def is_armed(kind: str) -> bool:
+    with _lock:
+        return _remaining.get(kind, 0) > 0
+
+
+def capture_request_inputs(method: str, path: str, query: dict, body: bytes, content_type: Optional[str]) -> None:
+    """Record request details for the current context (called from the API middleware)."""
+    inputs = {"method": method, "path": path, "query": query, "headers": {}}
+    if content_type:
+        inputs["headers"]["content-type"] = content_type
+    if body and len(body) <= MAX_CAPTURED_BODY_BYTES:
+        inputs["body"] = body.decode("utf-8", errors="replace")
+    _request_inputs.set(inputs)
+
+
+def list_captures(limit: int = 20) -> List[dict]:
+    """Return metadata of the most recent captures, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    captures: List[dict] = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True)[:limit]:
+        meta_path = os.path.join(PROFILE_DIR, name, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                captures.append({"dir": name, **json.load(f)})
+    return captures
+
+
+def _take(kind: str) -> bool:
+    global _active
+    with _lock:
+        if _active or _remaining.get(kind, 0) <= 0:
+            return False
+        _remaining[kind] -= 1
+        _active = True
+        return True
+
+
+def _release() -> None:
+    global _active
+    with _lock:
+        _active = False
+
+
+def _arm_from_env() -> None:
+    # Runs at import: a bad setting is logged and ignored rather than breaking startup
+    raw = os.environ.get("ECOGRID_PROFILE_NEXT", "0")
+    try:
+        count = int(raw or 0)
+    except ValueError:
+        logger.warning("Ignoring ECOGRID_PROFILE_NEXT=%r: not an integer", raw)
+        return
+    if count > 0:
+        kinds = [k.strip() for k in os.environ.get("ECOGRID_PROFILE_KINDS", ",".join(PROFILE_KINDS)).split(",") if k.strip()]
+        unknown = sorted(set(kinds) - set(PROFILE_KINDS))
+        if unknown:
+            logger.warning("Ignoring unknown ECOGRID_PROFILE_KINDS %s; allowed: %s", unknown, list(PROFILE_KINDS))
+            kinds = [k for k in kinds if k in PROFILE_KINDS]
+        if not kinds:
+            return
+        arm(count, kinds)
+        logger.info("Profiling armed from environment: next %d %s", count, "/".join(kinds))
+
+
+_arm_from_env()
+
+
+# ---------- Capture ----------
+@contextmanager
+def seeded(seed: int) -> Iterator[None]:
+    """Seed NumPy's global RNG for the block, then restore its previous state."""
+    state = np.random.get_state()
+    np.random.seed(seed)
+    try:
+        yield
+    finally:
+        np.random.set_state(state)
+
+
+def _capture_dir(kind: str, name: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or kind
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(PROFILE_DIR, f"{stamp}_{kind}_{safe}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def maybe_profile(kind: str, name: str, inputs: Optional[dict] = None) -> Iterator[Optional[dict]]:
+    """Profile the enclosed block if profiling is armed for `kind`.
+
+    Yields the capture metadata dict (callers may add to `inputs`) or None when
+    not profiling. When profiling, NumPy's global RNG is seeded with the
+    recorded seed for the block and restored afterwards.
+    """
+    if not _take(kind):
+        yield None
+        return
+
+    meta = {
+        "kind": kind,
+        "name": name,
+        "inputs": dict(inputs or {}),
+        "seed": secrets.randbits(32),
+        "started": datetime.utcnow().isoformat(),
+    }
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(25)
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    t0 = time.perf_counter()
+    profiler.enable()
+    try:
+        with seeded(meta["seed"]):
+            yield meta
+    finally:
+        profiler.disable()
+        meta["duration_s"] = time.perf_counter() - t0
+        try:
+            snapshot = tracemalloc.take_snapshot()
+            meta["peak_mem_bytes"] = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            out_dir = _capture_dir(kind, name)
+            profiler.dump_stats(os.path.join(out_dir, "profile.prof"))
+            with open(os.path.join(out_dir, "memory.txt"), "w") as f:
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+            with open(os.path.join(out_dir, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2, default=str)
+            logger.info("Saved %s profile for %s (%.2fs) to %s", kind, name, meta["duration_s"], out_dir)
+        except Exception as exc:
+            logger.warning("Failed to save profile for %s: %s", name, exc)
+        finally:
+            _release()
+
+
+def profiled(kind: str = "job", **inputs) -> Callable:
+    """Decorator form of `maybe_profile`; `inputs` are recorded for replay.
+
+    For kind="request" the request details captured by the API middleware are
+    merged into the recorded inputs.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            recorded = dict(inputs)
+            if kind == "request":
+                recorded.update(_request_inputs.get() or {})
+            with maybe_profile(kind, fn.__name__, inputs=recorded):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# ---------- Replay ----------
+def _replay_job(meta: dict) -> None:
+    from . import cascade
+
+    job = getattr(cascade, meta["name"], None)
+    if job is None or meta["name"] not in cascade.PROFILED_JOBS:
+        raise ValueError(f"Unknown cascade job: {meta['name']}")
+    with seeded(meta["seed"]):
+        job()
+
+
+def _replay_request(meta: dict) -> None:
+    from fastapi.testclient import TestClient
+
+    from ..backend.app.auth import API_KEY
+    from ..backend.app.main import create_app
+
+    inputs = meta["inputs"]
+    headers = {**(inputs.get("headers") or {}), "x-api-key": API_KEY}
+    client = TestClient(create_app())
+    with seeded(meta["seed"]):
+        response = client.request(
+            inputs["method"],
+            inputs["path"],
+            params=inputs.get("query") or None,
+            content=(inputs.get("body") or "").encode(),
+            headers=headers,
+        )
+    logger.info("Replayed %s %s -> %d", inputs["method"], inputs["path"], response.status_code)
+
+
+def replay(capture_dir: str, profile: bool = True) -> None:
+    """Re-run a captured job or request with its recorded seed and inputs."""
+    with open(os.path.join(capture_dir, "meta.json")) as f:
+        meta = json.load(f)
+    runner = _replay_job if meta["kind"] == "job" else _replay_request
+    profiler = cProfile.Profile() if profile else None
+    t0 = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        runner(meta)
+    finally:
+        if profiler:
+            profiler.disable()
+    logger.info("Replay of %s took %.2fs (captured: %.2fs)", meta["name"], time.perf_counter() - t0, meta.get("duration_s", 0.0))
+    if profiler:
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(25)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay captured profiles")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="Print top functions of a capture")
+    show.add_argument("capture_dir")
+    show.add_argument("--limit", type=int, default=25)
+    rep = sub.add_parser("replay", help="Re-run a capture with its seed and inputs")
+    rep.add_argument("capture_dir")
+    rep.add_argument("--no-profile", action="store_true")
+    sub.add_parser("list", help="List recent captures")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        pstats.Stats(os.path.join(args.capture_dir, "profile.prof"), stream=sys.stdout).sort_stats("cumulative").print_stats(args.limit)
+    elif args.command == "replay":
+        replay(args.capture_dir, profile=not args.no_profile)
+    else:
+        for capture in list_captures():
+            print(f"{capture['dir']}  seed={capture['seed']}  {capture.get('duration_s', 0.0):.2f}s")
+
+
+__all__ = [
+    "arm",
+    "status",
+    "is_armed",
+    "capture_request_inputs",
+    "list_captures",
+    "maybe_profile",
+    "profiled",
+    "seeded",
+    "replay",
+]
+
+
+if __name__ == "__main__":
+    main()
+
@@ -0,0 +1,276 @@
+"""
+Retention and downsampling for the cascade prediction tables.
+
+`energy_predictions` and `water_predictions` receive a row every 10 minutes per
+pipeline. This module compacts raw rows older than the raw retention window into
+hourly aggregate tables, expires aggregates past their own retention window, and
+reclaims free pages with incremental vacuum. Per-feeder rows
+(`energy_feeder_predictions`) are summed into `energy_predictions` at write
+time, so they are simply deleted once past the raw window, as are the
+`shard_ticks` and `cascade_ticks` bookkeeping rows.
+
+All deletes run in small, separately committed batches so the cascade writer is
+never blocked on the database lock for longer than a single batch.
+
+Configuration (environment variables):
+    ECOGRID_RAW_RETENTION_DAYS      raw rows kept before compaction (default 7)
+    ECOGRID_AGG_RETENTION_DAYS      hourly aggregates kept (default 365)
+    ECOGRID_RETENTION_BATCH_SIZE    rows per compaction/delete batch (default 500)
+    ECOGRID_RETENTION_VACUUM_PAGES  pages freed per incremental vacuum (default 2000)
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+RAW_RETENTION_DAYS = int(os.environ.get("ECOGRID_RAW_RETENTION_DAYS", "7"))
+AGG_RETENTION_DAYS = int(os.environ.get("ECOGRID_AGG_RETENTION_DAYS", "365"))
+RETENTION_BATCH_SIZE = int(os.environ.get("ECOGRID_RETENTION_BATCH_SIZE", "500"))
+RETENTION_VACUUM_PAGES = int(os.environ.get("ECOGRID_RETENTION_VACUUM_PAGES", "2000"))
+# Short pause between batches so a waiting writer can take the lock
+BATCH_PAUSE_SECONDS = 0.01
+
+logger = logging.getLogger("retention")
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+# ---------- Schema ----------
+def init_retention_schema(con: sqlite3.Connection) -> None:
+    """Create aggregate tables and timestamp indexes; enable incremental vacuum.
+
+    Switching an existing database to incremental auto-vacuum requires a one-off
+    full VACUUM, which is done here the first time only.
+    """
+    cur = con.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS energy_predictions_hourly (
+            bucket TEXT PRIMARY KEY,
+            samples INTEGER,
+            preds_mean_json TEXT,
+            anomaly_count INTEGER,
+            score_sum REAL,
+            score_max REAL
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS water_predictions_hourly (
+            bucket TEXT PRIMARY KEY,
+            samples INTEGER,
+            anomaly_count INTEGER,
+            score_sum REAL,
+            score_max REAL
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_energy_predictions_ts ON energy_predictions(timestamp)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_water_predictions_ts ON water_predictions(timestamp)")
+    con.commit()
+
+    mode = cur.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != 2:  # 2 == INCREMENTAL
+        logger.info("Enabling incremental auto-vacuum (one-off VACUUM)...")
+        cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        con.execute("VACUUM")
+
+
+# ---------- Compaction ----------
+def _bucket(timestamp: str) -> str:
+    # ISO timestamps truncate to the hour lexicographically
+    return timestamp[:13] + ":00:00"
+
+
+def _parse_preds(preds_json: str) -> Optional[np.ndarray]:
+    try:
+        return np.asarray(json.loads(preds_json), dtype=np.float64)
+    except (ValueError, TypeError):
+        return None
+
+
+def _compact_energy_batch(con: sqlite3.Connection, cutoff: str, batch_size: int) -> int:
+    cur = con.cursor()
+    rows = cur.execute(
+        "SELECT id, timestamp, preds_json, anomaly, anomaly_score FROM energy_predictions "
+        "WHERE timestamp < ? ORDER BY id LIMIT ?",
+        (cutoff, batch_size),
+    ).fetchall()
+    if not rows:
+        return 0
+
+    aggs: Dict[str, dict] = {}
+    for _, ts, preds_json, anomaly, score in rows:
+        agg = aggs.setdefault(
+            _bucket(ts),
+            {"samples": 0, "pred_samples": 0, "preds_sum": None, "anomaly_count": 0, "score_sum": 0.0, "score_max": 0.0},
+        )
+        agg["samples"] += 1
+        agg["anomaly_count"] += int(anomaly or 0)
+        agg["score_sum"] += float(score or 0.0)
+        agg["score_max"] = max(agg["score_max"], float(score or 0.0))
+        preds = _parse_preds(preds_json)
+        if preds is not None and preds.size:
+            if agg["preds_sum"] is None:
+                agg["preds_sum"] = np.zeros_like(preds)
+            if preds.shape == agg["preds_sum"].shape:
+                agg["preds_sum"] += preds
+                agg["pred_samples"] += 1
+
+    for bucket, agg in aggs.items():
+        existing = cur.execute(
+            "SELECT samples, preds_mean_json, anomaly_count, score_sum, score_max FROM energy_predictions_hourly WHERE bucket = ?",
+            (bucket,),
+        ).fetchone()
+        preds_sum = agg["preds_sum"]
+        pred_samples = agg["pred_samples"]
+        samples, anomaly_count, score_sum, score_max = agg["samples"], agg["anomaly_count"], agg["score_sum"], agg["score_max"]
+        if existing:
+            old_mean = _parse_preds(existing[1]) if existing[1] else None
+            if old_mean is not None and old_mean.size and (preds_sum is None or old_mean.shape == preds_sum.shape):
+                base = old_mean * existing[0]
+                preds_sum = base if preds_sum is None else preds_sum + base
+                pred_samples += existing[0]
+            samples += existing[0]
+            anomaly_count += existing[2]
+            score_sum += existing[3]
+            score_max = max(score_max, existing[4])
+        preds_mean = json.dumps((preds_sum / pred_samples).tolist()) if preds_sum is not None and pred_samples else None
+        cur.execute(
+            "INSERT OR REPLACE INTO energy_predictions_hourly(bucket, samples, preds_mean_json, anomaly_count, score_sum, score_max) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (bucket, samples, preds_mean, anomaly_count, score_sum, score_max),
+        )
+
+    cur.executemany("DELETE FROM energy_predictions WHERE id = ?", [(r[0],) for r in rows])
+    return len(rows)
+
+
+def _compact_water_batch(con: sqlite3.Connection, cutoff: str, batch_size: int) -> int:
+    cur = con.cursor()
+    rows = cur.execute(
+        "SELECT id, timestamp, anomaly_count, avg_anomaly_score FROM water_predictions "
+        "WHERE timestamp < ? ORDER BY id LIMIT ?",
+        (cutoff, batch_size),
+    ).fetchall()
+    if not rows:
+        return 0
+
+    aggs: Dict[str, List[float]] = {}
+    for _, ts, anomaly_count, score in rows:
+        agg = aggs.setdefault(_bucket(ts), [0, 0, 0.0, 0.0])
+        agg[0] += 1
+        agg[1] += int(anomaly_count or 0)
+        agg[2] += float(score or 0.0)
+        agg[3] = max(agg[3], float(score or 0.0))
+
+    # Sums merge exactly, so the upsert can be done in SQL
+    cur.executemany(
+        "INSERT INTO water_predictions_hourly(bucket, samples, anomaly_count, score_sum, score_max) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(bucket) DO UPDATE SET "
+        "samples = samples + excluded.samples, "
+        "anomaly_count = anomaly_count + excluded.anomaly_count, "
+        "score_sum = score_sum + excluded.score_sum, "
+        "score_max = MAX(score_max, excluded.score_max)",
+        [(bucket, *agg) for bucket, agg in aggs.items()],
+    )
+    cur.executemany("DELETE FROM water_predictions WHERE id = ?", [(r[0],) for r in rows])
+    return len(rows)
+
+
+def _run_batched(con: sqlite3.Connection, step, *args) -> int:
+    """Run `step` in separately committed transactions until it reports no rows."""
+    total = 0
+    while True:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            n = step(con, *args)
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        total += n
+        if n == 0:
+            return total
+        time.sleep(BATCH_PAUSE_SECONDS)
+
+
+def _expire_aggregates_batch(con: sqlite3.Connection, table: str, cutoff: str, batch_size: int) -> int:
+    cur = con.execute(
+        f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE bucket < ? LIMIT ?)",
+        (cutoff, batch_size),
+    )
+    return cur.rowcount
+
+
+def _expire_raw_batch(con: sqlite3.Connection, table: str, cutoff: str, batch_size: int) -> int:
+    cur = con.execute(
+        f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE timestamp < ? LIMIT ?)",
+        (cutoff, batch_size),
+    )
+    return cur.rowcount
+
+
+def _table_exists(con: sqlite3.Connection, table: str) -> bool:
+    return con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def apply_retention(
+    db_path: str,
+    raw_days: int = RAW_RETENTION_DAYS,
+    agg_days: int = AGG_RETENTION_DAYS,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    vacuum_pages: int = RETENTION_VACUUM_PAGES,
+    now: Optional[datetime] = None,
+) -> dict:
+    """Compact expired raw rows into hourly aggregates, expire old aggregates, vacuum.
+
+    Returns a summary dict with row counts per step.
+    """
+    now = now or datetime.utcnow()
+    # Align to the hour so a bucket is never split between raw and compacted rows
+    raw_cutoff = (now - timedelta(days=raw_days)).replace(minute=0, second=0, microsecond=0).isoformat()
+    agg_cutoff = (now - timedelta(days=agg_days)).replace(minute=0, second=0, microsecond=0).isoformat()
+
+    # Autocommit mode: transactions are managed explicitly per batch
+    con = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        summary = {
+            "energy_compacted": _run_batched(con, _compact_energy_batch, raw_cutoff, batch_size),
+            "water_compacted": _run_batched(con, _compact_water_batch, raw_cutoff, batch_size),
+            "energy_agg_expired": _run_batched(con, _expire_aggregates_batch, "energy_predictions_hourly", agg_cutoff, batch_size),
+            "water_agg_expired": _run_batched(con, _expire_aggregates_batch, "water_predictions_hourly", agg_cutoff, batch_size),
+        }
+        for table, key in (
+            ("energy_feeder_predictions", "energy_feeder_expired"),
+            ("shard_ticks", "shard_ticks_expired"),
+            ("cascade_ticks", "cascade_ticks_expired"),
+        ):
+            if _table_exists(con, table):
+                summary[key] = _run_batched(con, _expire_raw_batch, table, raw_cutoff, batch_size)
+        # executescript steps the pragma to completion; execute() frees only one page
+        con.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+        summary["freelist_pages"] = con.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        con.close()
+    return summary
+
+
+__all__ = [
+    "init_retention_schema",
+    "apply_retention",
+]
@@ -0,0 +1,311 @@
+"""
+Zone-sharded water forecasting for city-scale deployments.
+
+Water zones are partitioned across N shard processes with a consistent-hash
+ring (virtual nodes), so changing the shard count only moves about 1/N of the
+zones. Each shard forecasts and logs its own zones through
+`cascade.run_water_forecast(zone_ids=...)`.
+
+The coordinator (inside the cascade process) sends every tick to all shards
+and collects their reports on a result queue. Per shard and tick it records
+start/finish, duration and lag (finish time minus scheduled tick time) in the
+`shard_ticks` table and in metrics, and logs when a tick has completed on all
+shards. A shard that is still busy when new ticks arrive coalesces them: it runs
+only the newest and reports the rest as skipped. A shard process that has died
+is dropped from the ticks still waiting on it, so they do not stay pending.
+
+Each tick carries the min/max scaling of all zones' recent data, so a shard
+scales its zones exactly as an unsharded forecast would.
+
+Configuration: ECOGRID_CASCADE_SHARDS (default 1 = no sharding),
+ECOGRID_WATER_ZONES (default 5)
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import queue
+import sqlite3
+import hashlib
+import logging
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import REGISTRY
+from .parallel import limit_tf_threads, spawn_context, tf_threads_per_worker
+
+
+CASCADE_SHARDS = int(os.environ.get("ECOGRID_CASCADE_SHARDS", "1"))
+WATER_ZONES = int(os.environ.get("ECOGRID_WATER_ZONES", "5"))
+VIRTUAL_NODES = 64
+
+SHARD_TICK_SECONDS = REGISTRY.histogram(
+    "ecogrid_shard_tick_duration_seconds",
+    "Water forecast duration per shard and tick.",
+    ("shard",),
+)
+SHARD_TICK_LAG = REGISTRY.histogram(
+    "ecogrid_shard_tick_lag_seconds",
+    "Seconds between the scheduled tick and the shard finishing it.",
+    ("shard",),
+)
+SHARD_TICKS = REGISTRY.counter(
+    "ecogrid_shard_ticks_total",
+    "Shard ticks by outcome (ok, error, skipped).",
+    ("shard", "status"),
+)
+
+logger = logging.getLogger("sharding")
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+# ---------- Consistent Hashing ----------
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent-hash ring with `vnodes` virtual nodes per node."""
+
+    def __init__(self, nodes: Iterable[Hashable], vnodes: int = VIRTUAL_NODES):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        if not points:
+            raise ValueError("HashRing needs at least one node.")
+        self._keys = [p[0] for p in points]
+        self._nodes = [p[1] for p in points]
+
+    def node_for(self, key: Hashable) -> Hashable:
+        idx = bisect_right(self._keys, _hash(str(key))) % len(self._keys)
+        return self._nodes[idx]
+
+    def assign(self, keys: Iterable[Hashable]) -> Dict[Hashable, List[Hashable]]:
+        out: Dict[Hashable, List[Hashable]] = {}
+        for key in keys:
+            out.setdefault(self.node_for(key), []).append(key)
+        return out
+
+
+def shard_zones(zone_ids: Sequence[int], shards: int) -> Dict[int, List[int]]:
+    """Zones owned by each shard 0..shards-1 (shards may own no zones)."""
+    owned = HashRing(range(shards)).assign(zone_ids)
+    return {shard: sorted(owned.get(shard, [])) for shard in range(shards)}
+
+
+# ---------- DB ----------
+def _init_shard_db(db_path: str) -> None:
+    con = sqlite3.connect(db_path)
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS shard_ticks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            tick_id INTEGER,
+            shard INTEGER,
+            zones INTEGER,
+            status TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            duration_s REAL,
+            lag_s REAL,
+            skipped INTEGER
+        )
+        """
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_shard_ticks_ts ON shard_ticks(timestamp)")
+    con.commit()
+    con.close()
+
+
+# ---------- Shard Process ----------
+def _shard_main(shard: int, zone_ids: List[int], db_path: str, inbox, results, tf_threads: int) -> None:
+    from . import cascade
+
+    cascade.DB_PATH = db_path
+    limit_tf_threads(tf_threads)
+    while True:
+        message = inbox.get()
+        if message is None:
+            return
+        # Coalesce ticks that queued up while the previous one was running
+        skipped = 0
+        while True:
+            try:
+                newer = inbox.get_nowait()
+            except queue.Empty:
+                break
+            if newer is None:
+                return
+            skipped += 1
+            message = newer
+        tick_id, scheduled_ts, bounds = message
+        started = time.time()
+        status = "ok"
+        if zone_ids:
+            preds, _, _ = cascade.run_water_forecast(zone_ids=zone_ids, bounds=bounds)
+            status = "ok" if len(preds) else "error"
+        results.put((shard, tick_id, scheduled_ts, started, time.time(), status, len(zone_ids), skipped))
+
+
+# ---------- Coordinator ----------
+class ShardCoordinator:
+    """Runs shard processes, dispatches ticks and records completion and lag."""
+
+    def __init__(self, db_path: str, shards: int = CASCADE_SHARDS, zone_ids: Optional[Sequence[int]] = None):
+        self.db_path = db_path
+        self.shards = shards
+        self.zone_ids = list(zone_ids or range(1, WATER_ZONES + 1))
+        self.assignment = shard_zones(self.zone_ids, shards)
+        self._ctx = spawn_context()
+        self._results = self._ctx.Queue()
+        self._inboxes = []
+        self._procs = []
+        self._tick_id = 0
+        self._pending: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        self._collector: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        _init_shard_db(self.db_path)
+        tf_threads = tf_threads_per_worker(self.shards)
+        for shard, zones in self.assignment.items():
+            inbox = self._ctx.Queue()
+            proc = self._ctx.Process(
+                target=_shard_main,
+                args=(shard, zones, self.db_path, inbox, self._results, tf_threads),
+                name=f"cascade-shard-{shard}",
+                daemon=True,
+            )
+            proc.start()
+            self._inboxes.append(inbox)
+            self._procs.append(proc)
+            logger.info("Shard %d started (pid %d) with %d zones", shard, proc.pid, len(zones))
+        self._collector = threading.Thread(target=self._collect, name="shard-collector", daemon=True)
+        self._collector.start()
+
+    def dispatch_tick(self, bounds: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> int:
+        """Send a new tick to every running shard; warns about shards still on older ticks.
+
+        `bounds` is the all-zone (min, max) scaling for this tick (None lets
+        each shard scale its own zones).
+        """
+        dead = [shard for shard, proc in enumerate(self._procs) if not proc.is_alive()]
+        for shard in dead:
+            logger.error("Shard %d is not running (exit code %s)", shard, self._procs[shard].exitcode)
+        with self._lock:
+            self._tick_id += 1
+            tick_id = self._tick_id
+            abandoned = self._drop_pending(dead)
+            lagging = sorted({s for t, shards in self._pending.items() for s in shards})
+            self._pending[tick_id] = set(range(self.shards)) - set(dead)
+            if not self._pending[tick_id]:
+                del self._pending[tick_id]
+        for t in abandoned:
+            logger.warning("Tick %d abandoned: shards still owing it are not running", t)
+        if lagging:
+            logger.warning("Tick %d dispatched while shards %s are still behind", tick_id, lagging)
+        scheduled = time.time()
+        for shard, inbox in enumerate(self._inboxes):
+            if shard not in dead:
+                inbox.put((tick_id, scheduled, bounds))
+        return tick_id
+
+    def _drop_pending(self, shards: Sequence[int]) -> List[int]:
+        """Stop waiting on `shards`; returns ticks left with no shard to wait for. Caller holds the lock."""
+        if not shards:
+            return []
+        abandoned = []
+        for t in list(self._pending):
+            if self._pending[t] & set(shards):
+                self._pending[t] -= set(shards)
+                if not self._pending[t]:
+                    del self._pending[t]
+                    abandoned.append(t)
+        return abandoned
+
+    def _collect(self) -> None:
+        while True:
+            item = self._results.get()
+            if item is None:
+                return
+            shard, tick_id, scheduled, started, finished, status, zones, skipped = item
+            duration, lag = finished - started, finished - scheduled
+            label = str(shard)
+            SHARD_TICK_SECONDS.observe(duration, shard=label)
+            SHARD_TICK_LAG.observe(lag, shard=label)
+            SHARD_TICKS.inc(shard=label, status=status)
+            if skipped:
+                SHARD_TICKS.inc(skipped, shard=label, status="skipped")
+            self._record(tick_id, shard, zones, status, scheduled, started, finished, skipped)
+            with self._lock:
+                # A coalesced report also completes the ticks the shard skipped
+                done_ticks = [t for t in self._pending if t <= tick_id and shard in self._pending[t]]
+                completed = []
+                for t in done_ticks:
+                    self._pending[t].discard(shard)
+                    if not self._pending[t]:
+                        del self._pending[t]
+                        completed.append(t)
+            logger.info("Shard %d finished tick %d (%s) in %.2fs, lag %.2fs", shard, tick_id, status, duration, lag)
+            for t in completed:
+                logger.info("Tick %d complete on all %d shards", t, self.shards)
+
+    def _record(self, tick_id, shard, zones, status, scheduled, started, finished, skipped) -> None:
+        con = sqlite3.connect(self.db_path)
+        with con:
+            con.execute(
+                "INSERT INTO shard_ticks(timestamp, tick_id, shard, zones, status, started_at, finished_at, duration_s, lag_s, skipped) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    datetime.utcfromtimestamp(scheduled).isoformat(),
+                    tick_id,
+                    shard,
+                    zones,
+                    status,
+                    datetime.utcfromtimestamp(started).isoformat(),
+                    datetime.utcfromtimestamp(finished).isoformat(),
+                    finished - started,
+                    finished - scheduled,
+                    skipped,
+                ),
+            )
+        con.close()
+
+    def status(self) -> dict:
+        with self._lock:
+            behind = {t: sorted(s) for t, s in self._pending.items()}
+        return {
+            "shards": self.shards,
+            "zones": {shard: len(z) for shard, z in self.assignment.items()},
+            "alive": [p.is_alive() for p in self._procs],
+            "last_tick": self._tick_id,
+            "pending": behind,
+        }
+
+    def stop(self, timeout: float = 30.0) -> None:
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for proc in self._procs:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        self._results.put(None)
+        if self._collector is not None:
+            self._collector.join(timeout)
+
+
+__all__ = [
+    "CASCADE_SHARDS",
+    "HashRing",
+    "shard_zones",
+    "ShardCoordinator",
+]
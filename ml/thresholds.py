@@ -0,0 +1,108 @@
+"""
+Data-driven anomaly thresholds stored alongside each autoencoder.
+
+At training time the reconstruction errors over the training set are reduced
+to a high quantile (overall and per zone) and saved as a JSON sidecar next to
+the model file. Detection looks thresholds up per zone, so on normal data the
+expected alert rate is about (1 - quantile) regardless of each model's scale.
+
+Configuration: ECOGRID_ANOMALY_QUANTILE (default 0.995)
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+ANOMALY_QUANTILE = float(os.environ.get("ECOGRID_ANOMALY_QUANTILE", "0.995"))
+
+_cache: Dict[str, Tuple[float, dict]] = {}
+_cache_lock = threading.Lock()
+
+
+def thresholds_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".thresholds.json"
+
+
+def calibrate(errors: np.ndarray, quantile: float = ANOMALY_QUANTILE, groups: Optional[np.ndarray] = None) -> dict:
+    """Quantile of `errors` overall and per group, in one sort-based pass.
+
+    Per-group quantiles use linear interpolation (numpy's default method) on a
+    single lexsort of (group, error), so cost is O(n log n) for any group count.
+    """
+    errors = np.asarray(errors, dtype=np.float64).ravel()
+    result = {
+        "quantile": quantile,
+        "default": float(np.quantile(errors, quantile)),
+        "samples": int(errors.size),
+        "per_zone": {},
+        "calibrated_at": datetime.utcnow().isoformat(),
+    }
+    if groups is not None:
+        groups = np.asarray(groups).ravel()
+        order = np.lexsort((errors, groups))
+        sorted_err, sorted_grp = errors[order], groups[order]
+        keys, starts, counts = np.unique(sorted_grp, return_index=True, return_counts=True)
+        pos = starts + quantile * (counts - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, starts + counts - 1)
+        values = sorted_err[lo] + (sorted_err[hi] - sorted_err[lo]) * (pos - lo)
+        result["per_zone"] = {str(int(k)): float(v) for k, v in zip(keys, values)}
+    return result
+
+
+def save_thresholds(model_path: str, thresholds: dict) -> str:
+    path = thresholds_path(model_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(thresholds, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def load_thresholds(model_path: str) -> Optional[dict]:
+    """Load the sidecar for `model_path`, cached until the file changes."""
+    path = thresholds_path(model_path)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _cache_lock:
+        _cache[path] = (mtime, data)
+    return data
+
+
+def resolve_thresholds(model_path: str, fallback: float, zone_ids: Optional[Sequence[int]] = None, n: int = 1) -> np.ndarray:
+    """Per-row thresholds: per-zone if calibrated, else the calibrated default, else `fallback`."""
+    data = load_thresholds(model_path)
+    default = float(data["default"]) if data else fallback
+    if zone_ids is None or not data or not data.get("per_zone"):
+        return np.full(n, default, dtype=np.float64)
+    per_zone = data["per_zone"]
+    unique, inverse = np.unique(np.asarray(zone_ids), return_inverse=True)
+    values = np.asarray([per_zone.get(str(int(z)), default) for z in unique], dtype=np.float64)
+    return values[inverse.ravel()]
+
+
+__all__ = [
+    "ANOMALY_QUANTILE",
+    "calibrate",
+    "save_thresholds",
+    "load_thresholds",
+    "resolve_thresholds",
+]
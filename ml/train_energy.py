@@ -9,7 +9,7 @@ from __future__ import annotations
 
 import argparse
 import logging
-from typing import Tuple
+from typing import Optional, Tuple
 
 import numpy as np
 
@@ -18,6 +18,7 @@ from .energy_model import (
     preprocess_energy_data,
     train_energy_model,
 )
+from .training import CHECKPOINT_DIR
 
 logger = logging.getLogger("train_energy")
 if not logger.handlers:
@@ -52,9 +53,15 @@ def evaluate_model() -> Tuple[float, float]:
     return mse, mae
 
 
-def train_and_save(days: int = 30, epochs: int = 10):
+def train_and_save(
+    days: int = 30,
+    epochs: int = 10,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    patience: Optional[int] = None,
+):
     df = load_energy_data(days)
-    _ = train_energy_model(df=df, epochs=epochs)
+    _ = train_energy_model(df=df, epochs=epochs, checkpoint_dir=checkpoint_dir, resume=resume, patience=patience)
     logger.info("Energy model trained and saved.")
 
 
@@ -63,9 +70,18 @@ def main():
     parser.add_argument("--days", type=int, default=30)
     parser.add_argument("--epochs", type=int, default=10)
     parser.add_argument("--eval", action="store_true", help="Run quick evaluation after training")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="Where per-epoch checkpoints are kept")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint if one exists")
+    parser.add_argument("--patience", type=int, default=None, help="Stop after N epochs without val_loss improvement")
     args = parser.parse_args()
 
-    train_and_save(days=args.days, epochs=args.epochs)
+    train_and_save(
+        days=args.days,
+        epochs=args.epochs,
+        checkpoint_dir=args.checkpoint_dir,
+        resume=args.resume,
+        patience=args.patience,
+    )
     if args.eval:
         evaluate_model()
 
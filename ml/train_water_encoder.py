@@ -9,7 +9,7 @@ from __future__ import annotations
 
 import argparse
 import logging
-from typing import Tuple
+from typing import Optional, Tuple
 
 import numpy as np
 
@@ -17,6 +17,7 @@ from .water_model import (
     fetch_water_data,
     train_water_autoencoder,
 )
+from .training import CHECKPOINT_DIR
 
 logger = logging.getLogger("train_water_autoencoder")
 if not logger.handlers:
@@ -44,9 +45,15 @@ def evaluate_autoencoder() -> float:
     return mse
 
 
-def train_and_save(hours: int = 72, epochs: int = 10):
+def train_and_save(
+    hours: int = 72,
+    epochs: int = 10,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    patience: Optional[int] = None,
+):
     df = load_water_data(hours)
-    _ = train_water_autoencoder(df=df, epochs=epochs)
+    _ = train_water_autoencoder(df=df, epochs=epochs, checkpoint_dir=checkpoint_dir, resume=resume, patience=patience)
     logger.info("Water AE trained and saved.")
 
 
@@ -55,9 +62,18 @@ def main():
     parser.add_argument("--hours", type=int, default=72)
     parser.add_argument("--epochs", type=int, default=10)
     parser.add_argument("--eval", action="store_true", help="Run quick evaluation after training")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR, help="Where per-epoch checkpoints are kept")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint if one exists")
+    parser.add_argument("--patience", type=int, default=None, help="Stop after N epochs without val_loss improvement")
     args = parser.parse_args()
 
-    train_and_save(hours=args.hours, epochs=args.epochs)
+    train_and_save(
+        hours=args.hours,
+        epochs=args.epochs,
+        checkpoint_dir=args.checkpoint_dir,
+        resume=args.resume,
+        patience=args.patience,
+    )
     if args.eval:
         evaluate_autoencoder()
 
@@ -0,0 +1,214 @@
+"""
+Checkpointing, early stopping and epoch timing for model training.
+
+`prepare_training` returns the model to fit (fresh, or restored from the last
+checkpoint when resuming), the epoch to start from, and the callbacks:
+
+- epoch timing: logs each epoch's duration and losses, and records it as
+  ecogrid_stage_duration_seconds{pipeline=<name>, stage="train_epoch"}
+- checkpointing (when a checkpoint dir is given): after every epoch the full
+  model (weights + optimizer state) is saved to <name>.last.keras, the best
+  weights so far to <name>.best.weights.h5, and progress to <name>.state.json.
+  Writes go through a temp file and rename, so a kill mid-save leaves the
+  previous checkpoint intact. At the end of training the best weights seen
+  across all resumed segments are restored.
+- early stopping on val_loss with best-weight restore (when patience is set)
+
+Call `clear_checkpoint` once the trained model has been saved, so the next
+run starts fresh instead of resuming a finished one.
+
+`load_model_cached` is the inference-side counterpart: it keeps one loaded
+model per file and reloads it only when the file's mtime changes (after a
+retrain), so forecasts reuse the model and its traced predict function
+instead of loading and re-tracing on every call.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import tensorflow as tf
+    from tensorflow.keras import callbacks as keras_callbacks, models
+except Exception:  # pragma: no cover
+    tf = None  # type: ignore
+    keras_callbacks = None  # type: ignore
+    models = None  # type: ignore
+
+from .metrics import STAGE_SECONDS
+
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+CHECKPOINT_DIR = os.environ.get("ECOGRID_CHECKPOINT_DIR", os.path.join(BASE_DIR, "data", "checkpoints"))
+
+logger = logging.getLogger("training")
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+_Callback = keras_callbacks.Callback if keras_callbacks is not None else object
+
+_model_cache: Dict[str, Tuple[float, "models.Model"]] = {}
+_model_cache_lock = threading.Lock()
+
+
+def _paths(checkpoint_dir: str, name: str) -> Tuple[str, str, str]:
+    base = os.path.join(checkpoint_dir, name)
+    return base + ".last.keras", base + ".best.weights.h5", base + ".state.json"
+
+
+def _load_state(checkpoint_dir: str, name: str) -> Optional[dict]:
+    last_path, _, state_path = _paths(checkpoint_dir, name)
+    if not (os.path.exists(state_path) and os.path.exists(last_path)):
+        return None
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class EpochTimer(_Callback):
+    """Logs per-epoch wall time and losses."""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+        self._t0 = 0.0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._t0 = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self._t0
+        STAGE_SECONDS.observe(elapsed, pipeline=self.name, stage="train_epoch")
+        logs = logs or {}
+        logger.info(
+            "%s epoch %d: %.2fs loss=%.5f val_loss=%.5f",
+            self.name, epoch + 1, elapsed, logs.get("loss", float("nan")), logs.get("val_loss", float("nan")),
+        )
+
+
+class CheckpointState(_Callback):
+    """Saves last model, best weights and progress after every epoch."""
+
+    def __init__(self, checkpoint_dir: str, name: str, best: float = float("inf"), started_at: Optional[str] = None):
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.name = name
+        self.best = best
+        self.started_at = started_at or datetime.utcnow().isoformat()
+
+    def on_epoch_end(self, epoch, logs=None):
+        last_path, best_path, state_path = _paths(self.checkpoint_dir, self.name)
+        val_loss = float((logs or {}).get("val_loss", float("inf")))
+        if val_loss < self.best:
+            self.best = val_loss
+            tmp = best_path[: -len(".weights.h5")] + ".tmp.weights.h5"
+            self.model.save_weights(tmp)
+            os.replace(tmp, best_path)
+        tmp = last_path[: -len(".keras")] + ".tmp.keras"
+        self.model.save(tmp)
+        os.replace(tmp, last_path)
+        state = {"epoch": epoch, "best_val_loss": self.best, "started_at": self.started_at, "saved_at": datetime.utcnow().isoformat()}
+        with open(state_path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(state_path + ".tmp", state_path)
+
+    def on_train_end(self, logs=None):
+        # Best weights may predate a resume, which EarlyStopping cannot see
+        _, best_path, _ = _paths(self.checkpoint_dir, self.name)
+        if os.path.exists(best_path):
+            self.model.load_weights(best_path)
+
+
+def prepare_training(
+    name: str,
+    build: Callable[[], "models.Model"],
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    patience: Optional[int] = None,
+) -> Tuple["models.Model", int, List]:
+    """Return (model, initial_epoch, callbacks) for `model.fit`."""
+    state = _load_state(checkpoint_dir, name) if (checkpoint_dir and resume) else None
+    model = None
+    initial_epoch = 0
+    if state is not None:
+        last_path, _, _ = _paths(checkpoint_dir, name)
+        try:
+            # Compiled load keeps the optimizer state for a seamless resume
+            model = models.load_model(last_path)
+            initial_epoch = int(state["epoch"]) + 1
+            logger.info("Resuming %s from epoch %d (best val_loss %.5f)", name, initial_epoch, state["best_val_loss"])
+        except Exception as exc:
+            logger.warning("Failed to load checkpoint for %s (%s); starting fresh.", name, exc)
+            state = None
+    if model is None:
+        model = build()
+
+    cbs: List = [EpochTimer(name)]
+    if patience is not None:
+        cbs.append(
+            keras_callbacks.EarlyStopping(
+                monitor="val_loss",
+                patience=patience,
+                restore_best_weights=True,
+                # After a resume, only beating the earlier best resets patience
+                baseline=state["best_val_loss"] if state else None,
+            )
+        )
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        if state is None:
+            clear_checkpoint(checkpoint_dir, name)
+        cbs.append(
+            CheckpointState(
+                checkpoint_dir,
+                name,
+                best=state["best_val_loss"] if state else float("inf"),
+                started_at=state.get("started_at") if state else None,
+            )
+        )
+    return model, initial_epoch, cbs
+
+
+def clear_checkpoint(checkpoint_dir: Optional[str], name: str) -> None:
+    if not checkpoint_dir:
+        return
+    for path in _paths(checkpoint_dir, name):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# ---------- Model Cache ----------
+def load_model_cached(path: str) -> "models.Model":
+    """Load `path` once per file version (mtime); raises like `load_model` on failure."""
+    mtime = os.path.getmtime(path)
+    cached = _model_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _model_cache_lock:
+        cached = _model_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _model_cache[path] = (mtime, models.load_model(path, compile=False))
+            logger.info("Loaded %s", path)
+    return cached[1]
+
+
+__all__ = [
+    "CHECKPOINT_DIR",
+    "EpochTimer",
+    "CheckpointState",
+    "prepare_training",
+    "clear_checkpoint",
+    "load_model_cached",
+]
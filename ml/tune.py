@@ -0,0 +1,380 @@
+"""
+Parallel hyperparameter search for the energy and water LSTM forecasters.
+
+Trials sample LSTM widths, dropout, dense width, learning rate and batch size
+and train `_build_energy_lstm` / `_build_water_lstm` with them. Trials run in a
+spawn process pool; each worker limits TensorFlow to cpu_count / workers
+intra-op threads so the pool does not oversubscribe the machine.
+
+The preprocessed dataset is built once and cached as .npy files under
+data/tuning/, which workers open with mmap instead of each re-simulating and
+re-windowing the data.
+
+Every epoch's validation loss is written to SQLite. From `--warmup-epochs` on,
+a trial whose loss is worse than the median of the other completed or running
+trials at the same epoch is pruned (median pruning), once at least
+`--min-trials` of them have reported that epoch. Trial parameters are derived from (seed, trial id), so
+rerunning the same --study skips finished trials and resumes the search. A
+trial that crashes is recorded as failed and retried when the study resumes.
+
+Run: python -m ml.tune --pipeline energy --trials 32 --workers 4 --epochs 20
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from . import energy_model, water_model
+from .parallel import run_pool
+
+try:
+    import tensorflow as tf
+except Exception:  # pragma: no cover
+    tf = None  # type: ignore
+
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+TUNING_DIR = os.path.join(BASE_DIR, "data", "tuning")
+TUNING_DB_PATH = os.path.join(BASE_DIR, "data", "tuning.db")
+
+SEARCH_SPACE = {
+    "lstm_units_1": [32, 64, 128],
+    "lstm_units_2": [16, 32, 64],
+    "dropout": (0.0, 0.4),
+    "dense_units": [16, 32, 64],
+    "learning_rate": (1e-4, 3e-3),
+    "batch_size": [32, 64, 128],
+}
+
+logger = logging.getLogger("tune")
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    logger.addHandler(handler)
+logger.setLevel(logging.INFO)
+
+
+# ---------- DB ----------
+def _connect(db_path: str) -> sqlite3.Connection:
+    # Workers report epochs concurrently; wait for the lock instead of failing
+    con = sqlite3.connect(db_path, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    return con
+
+
+def _init_tuning_db(db_path: str) -> None:
+    con = _connect(db_path)
+    cur = con.cursor()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tuning_trials (
+            study TEXT,
+            trial_id INTEGER,
+            params_json TEXT,
+            status TEXT,
+            best_val_loss REAL,
+            epochs_run INTEGER,
+            seconds REAL,
+            finished_at TEXT,
+            PRIMARY KEY (study, trial_id)
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tuning_epochs (
+            study TEXT,
+            trial_id INTEGER,
+            epoch INTEGER,
+            val_loss REAL,
+            PRIMARY KEY (study, trial_id, epoch)
+        )
+        """
+    )
+    con.commit()
+    con.close()
+
+
+def _finished_trials(db_path: str, study: str) -> set:
+    con = _connect(db_path)
+    rows = con.execute(
+        "SELECT trial_id FROM tuning_trials WHERE study = ? AND status IN ('complete', 'pruned')", (study,)
+    ).fetchall()
+    con.close()
+    return {r[0] for r in rows}
+
+
+# ---------- Dataset ----------
+def prepare_dataset(pipeline: str, days: int, sequence_length: int, seed: int) -> str:
+    """Build (or reuse) the cached X.npy / y.npy for `pipeline`; returns the directory."""
+    out_dir = os.path.join(TUNING_DIR, f"{pipeline}_d{days}_s{sequence_length}_seed{seed}")
+    if os.path.exists(os.path.join(out_dir, "y.npy")):
+        return out_dir
+    np.random.seed(seed)
+    if pipeline == "energy":
+        df = energy_model.fetch_energy_data(hours_back=days * 24)
+        X, y, _ = energy_model.preprocess_energy_data(df, sequence_length=sequence_length)
+    else:
+        df = water_model.fetch_water_data(hours_back=days * 24)
+        X, y, _ = water_model.preprocess_water_data(df, sequence_length=sequence_length)
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "X.npy"), X.astype(np.float32))
+    # y last: its presence marks a complete cache entry
+    np.save(os.path.join(out_dir, "y.npy"), y.astype(np.float32))
+    logger.info("Cached %s dataset %s -> %s", pipeline, X.shape, out_dir)
+    return out_dir
+
+
+def _load_dataset(dataset_dir: str) -> Tuple[np.ndarray, np.ndarray]:
+    X = np.load(os.path.join(dataset_dir, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(dataset_dir, "y.npy"), mmap_mode="r")
+    return X, y
+
+
+# ---------- Trials ----------
+def sample_params(seed: int, trial_id: int) -> dict:
+    """Deterministic draw from SEARCH_SPACE for `trial_id`."""
+    rng = np.random.default_rng([seed, trial_id])
+    lo, hi = SEARCH_SPACE["learning_rate"]
+    return {
+        "lstm_units": (int(rng.choice(SEARCH_SPACE["lstm_units_1"])), int(rng.choice(SEARCH_SPACE["lstm_units_2"]))),
+        "dropout": float(rng.uniform(*SEARCH_SPACE["dropout"])),
+        "dense_units": int(rng.choice(SEARCH_SPACE["dense_units"])),
+        "learning_rate": float(np.exp(rng.uniform(np.log(lo), np.log(hi)))),
+        "batch_size": int(rng.choice(SEARCH_SPACE["batch_size"])),
+    }
+
+
+class _MedianPruner(tf.keras.callbacks.Callback if tf is not None else object):
+    """Records val_loss per epoch and stops the trial when it trails the median.
+
+    The median is over trials that completed or are still running; pruned and
+    failed trials stopped early for their own reasons and would bias it.
+    """
+
+    def __init__(self, db_path: str, study: str, trial_id: int, warmup_epochs: int, min_trials: int):
+        super().__init__()
+        self.db_path = db_path
+        self.study = study
+        self.trial_id = trial_id
+        self.warmup_epochs = warmup_epochs
+        self.min_trials = min_trials
+        self.pruned = False
+        self.epochs_run = 0
+        self.best = float("inf")
+
+    def on_train_begin(self, logs=None):
+        # A retried trial starts afresh: drop its failed attempt's epochs and status
+        con = _connect(self.db_path)
+        try:
+            with con:
+                con.execute("DELETE FROM tuning_epochs WHERE study = ? AND trial_id = ?", (self.study, self.trial_id))
+                con.execute("DELETE FROM tuning_trials WHERE study = ? AND trial_id = ?", (self.study, self.trial_id))
+        finally:
+            con.close()
+
+    def on_epoch_end(self, epoch, logs=None):
+        val_loss = float((logs or {}).get("val_loss", np.nan))
+        self.epochs_run = epoch + 1
+        self.best = min(self.best, val_loss)
+        con = _connect(self.db_path)
+        try:
+            with con:
+                con.execute(
+                    "INSERT OR REPLACE INTO tuning_epochs(study, trial_id, epoch, val_loss) VALUES (?, ?, ?, ?)",
+                    (self.study, self.trial_id, epoch, val_loss),
+                )
+            others = [
+                r[0]
+                for r in con.execute(
+                    "SELECT e.val_loss FROM tuning_epochs e "
+                    "LEFT JOIN tuning_trials t ON t.study = e.study AND t.trial_id = e.trial_id "
+                    "WHERE e.study = ? AND e.epoch = ? AND e.trial_id != ? "
+                    "AND (t.status IS NULL OR t.status = 'complete')",
+                    (self.study, epoch, self.trial_id),
+                )
+            ]
+        finally:
+            con.close()
+        if epoch + 1 >= self.warmup_epochs and len(others) >= self.min_trials and val_loss > float(np.median(others)):
+            self.pruned = True
+            self.model.stop_training = True
+
+
+def _run_trial(
+    pipeline: str,
+    study: str,
+    trial_id: int,
+    params: dict,
+    dataset_dir: str,
+    epochs: int,
+    db_path: str,
+    warmup_epochs: int,
+    min_trials: int,
+) -> dict:
+    t0 = time.perf_counter()
+    tf.keras.utils.set_random_seed(trial_id)
+    X, y = _load_dataset(dataset_dir)
+    # Same holdout as validation_split=0.1 in the train_* functions
+    split = int(len(X) * 0.9)
+    build = energy_model._build_energy_lstm if pipeline == "energy" else water_model._build_water_lstm
+    model = build(
+        input_shape=(X.shape[1], X.shape[2]),
+        lstm_units=tuple(params["lstm_units"]),
+        dropout=params["dropout"],
+        dense_units=params["dense_units"],
+        learning_rate=params["learning_rate"],
+    )
+    pruner = _MedianPruner(db_path, study, trial_id, warmup_epochs, min_trials)
+    model.fit(
+        X[:split],
+        y[:split],
+        validation_data=(X[split:], y[split:]),
+        epochs=epochs,
+        batch_size=params["batch_size"],
+        callbacks=[pruner],
+        verbose=0,
+    )
+    return {
+        "trial_id": trial_id,
+        "params": params,
+        "status": "pruned" if pruner.pruned else "complete",
+        "best_val_loss": pruner.best,
+        "epochs_run": pruner.epochs_run,
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+def _record_trial(db_path: str, study: str, result: dict) -> None:
+    con = _connect(db_path)
+    with con:
+        con.execute(
+            "INSERT OR REPLACE INTO tuning_trials(study, trial_id, params_json, status, best_val_loss, epochs_run, seconds, finished_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                study,
+                result["trial_id"],
+                json.dumps(result["params"]),
+                result["status"],
+                result["best_val_loss"],
+                result["epochs_run"],
+                result["seconds"],
+                datetime.utcnow().isoformat(),
+            ),
+        )
+    con.close()
+
+
+def best_trials(study: str, limit: int = 5, db_path: str = TUNING_DB_PATH) -> List[dict]:
+    con = _connect(db_path)
+    rows = con.execute(
+        "SELECT trial_id, params_json, best_val_loss, epochs_run FROM tuning_trials "
+        "WHERE study = ? AND status = 'complete' ORDER BY best_val_loss LIMIT ?",
+        (study, limit),
+    ).fetchall()
+    con.close()
+    return [{"trial_id": r[0], "params": json.loads(r[1]), "best_val_loss": r[2], "epochs_run": r[3]} for r in rows]
+
+
+def run_search(
+    pipeline: str = "energy",
+    trials: int = 16,
+    workers: int = 2,
+    epochs: int = 20,
+    study: Optional[str] = None,
+    seed: int = 0,
+    days: int = 30,
+    sequence_length: Optional[int] = None,
+    warmup_epochs: int = 3,
+    min_trials: int = 3,
+    db_path: str = TUNING_DB_PATH,
+) -> str:
+    """Run (or resume) a study; returns its name."""
+    if pipeline not in ("energy", "water"):
+        raise ValueError(f"Unknown pipeline: {pipeline}")
+    sequence_length = sequence_length or (24 if pipeline == "energy" else 12)
+    study = study or f"{pipeline}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}"
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    _init_tuning_db(db_path)
+    dataset_dir = prepare_dataset(pipeline, days, sequence_length, seed)
+
+    done = _finished_trials(db_path, study)
+    pending = [t for t in range(trials) if t not in done]
+    logger.info("Study %s: %d trials pending (%d already finished)", study, len(pending), len(done))
+    common = (dataset_dir, epochs, db_path, warmup_epochs, min_trials)
+    t0 = time.perf_counter()
+
+    def _report(result: dict) -> None:
+        _record_trial(db_path, study, result)
+        logger.info(
+            "Trial %d %s after %d epochs: best val_loss %.5f (%.1fs) %s",
+            result["trial_id"], result["status"], result["epochs_run"], result["best_val_loss"], result["seconds"], result["params"],
+        )
+
+    def _report_failure(task: tuple, exc: BaseException) -> None:
+        # Not counted as finished, so resuming the study retries the trial
+        trial_id, params = task[2], task[3]
+        _record_trial(
+            db_path,
+            study,
+            {"trial_id": trial_id, "params": params, "status": "failed", "best_val_loss": None, "epochs_run": None, "seconds": None},
+        )
+        logger.error("Trial %d failed: %r %s", trial_id, exc, params)
+
+    tasks = [(pipeline, study, t, sample_params(seed, t), *common) for t in pending]
+    run_pool(tasks, _run_trial, workers, on_result=_report, on_error=_report_failure)
+
+    logger.info("Study %s finished in %.1fs", study, time.perf_counter() - t0)
+    for rank, trial in enumerate(best_trials(study, db_path=db_path), start=1):
+        logger.info("#%d trial %d val_loss %.5f %s", rank, trial["trial_id"], trial["best_val_loss"], trial["params"])
+    return study
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter search for the LSTM forecasters")
+    parser.add_argument("--pipeline", choices=["energy", "water"], default="energy")
+    parser.add_argument("--trials", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes; 0 runs inline")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--study", default=None, help="Reuse to resume a study")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=30, help="Days of simulated history in the dataset")
+    parser.add_argument("--warmup-epochs", type=int, default=3, help="Epochs before a trial can be pruned")
+    parser.add_argument("--min-trials", type=int, default=3, help="Reports needed at an epoch before pruning")
+    parser.add_argument("--db", default=TUNING_DB_PATH)
+    args = parser.parse_args()
+
+    run_search(
+        pipeline=args.pipeline,
+        trials=args.trials,
+        workers=args.workers,
+        epochs=args.epochs,
+        study=args.study,
+        seed=args.seed,
+        days=args.days,
+        warmup_epochs=args.warmup_epochs,
+        min_trials=args.min_trials,
+        db_path=args.db,
+    )
+
+
+__all__ = [
+    "SEARCH_SPACE",
+    "prepare_dataset",
+    "sample_params",
+    "run_search",
+    "best_trials",
+]
+
+
+if __name__ == "__main__":
+    main()
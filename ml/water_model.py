@@ -5,19 +5,23 @@ Provides simulated SCADA/IoT water sensor data for Delhi zones, an autoencoder f
 anomaly detection (pressure/flow deviation), an LSTM forecaster for next-hour flow
 and pressure, and helper utilities to train, predict, and detect anomalies.
 
+A sparse zone adjacency graph spreads anomaly scores to downstream zones.
+
 Python: 3.10+
-Dependencies: tensorflow, keras, pandas, numpy, scikit-learn
+Dependencies: tensorflow, keras, pandas, numpy, scipy, scikit-learn
 """
 
 from __future__ import annotations
 
 import os
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Tuple, Optional, List
+from typing import Dict, Tuple, Optional, List, Sequence
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.preprocessing import MinMaxScaler
 
 try:
@@ -28,6 +32,11 @@ except Exception:  # pragma: no cover
     layers = None  # type: ignore
     models = None  # type: ignore
 
+from .features import column_block, fit_scale_inplace, segment_bounds, sort_order, take_column
+from .inference_server import remote_model, shared_recent
+from .metrics import span
+from .training import clear_checkpoint, load_model_cached, prepare_training
+from .thresholds import ANOMALY_QUANTILE, calibrate, resolve_thresholds, save_thresholds
 
 # ---------- Paths and Logger ----------
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
@@ -38,6 +47,18 @@ os.makedirs(DATA_DIR, exist_ok=True)
 
 WATER_AE_PATH = os.path.join(MODELS_DIR, "water_autoencoder.h5")
 WATER_LSTM_PATH = os.path.join(MODELS_DIR, "water_lstm.h5")
+# Used only when no calibrated thresholds have been saved with the water AE
+DEFAULT_WATER_THRESHOLD = 0.8
+# Simulated zones are numbered 1..N
+DEFAULT_WATER_ZONES = 5
+# Zones chained by the default impact graph when no graph file exists
+CITY_WATER_ZONES = int(os.environ.get("ECOGRID_WATER_ZONES", str(DEFAULT_WATER_ZONES)))
+WATER_FEATURE_COLS = ["pressure", "flow", "turbidity", "temperature", "zone_id"]
+MAX_HORIZON_STEPS = 24 * 6
+# Sensor readings (and cascade ticks) fall on this grid
+WATER_STEP = "10min"
+# Directed edge list (source,target[,weight]) of the distribution network
+ZONE_GRAPH_PATH = os.environ.get("ECOGRID_ZONE_GRAPH", os.path.join(DATA_DIR, "zone_graph.csv"))
 
 logger = logging.getLogger("water_model")
 if not logger.handlers:
@@ -49,37 +70,55 @@ logger.setLevel(logging.INFO)
 
 
 # ---------- Data Simulation ----------
-def fetch_water_data(hours_back: int = 48, zones: int = 5) -> pd.DataFrame:
+def _simulate_water_series(start: datetime, end: datetime, zone_ids: Sequence[int]) -> pd.DataFrame:
+    """Vectorized SCADA simulation for `zone_ids` at 10-minute resolution over [start, end]."""
+    timestamps = pd.date_range(start=start, end=end, freq="10min")
+    zone_arr = np.asarray(list(zone_ids), dtype=np.int64)
+    n_t, n_z = len(timestamps), len(zone_arr)
+    shape = (n_z, n_t)
+
+    # Diurnal patterns
+    minute_of_day = (timestamps.hour * 60 + timestamps.minute).to_numpy()
+    diurnal = np.sin(2 * np.pi * (minute_of_day / (24 * 60)))[np.newaxis, :]
+    hourly = np.sin(2 * np.pi * timestamps.hour.to_numpy() / 24)[np.newaxis, :]
+    base_pressure = (3.0 + 0.2 * zone_arr)[:, np.newaxis]
+    base_flow = (50 + 5 * zone_arr)[:, np.newaxis]
+
+    pressure = base_pressure + 0.3 * diurnal + np.random.normal(0, 0.05, shape)
+    flow = base_flow + 10 * diurnal + np.random.normal(0, 1.5, shape)
+    turbidity = 1.0 + 0.2 * np.abs(diurnal) + np.random.normal(0, 0.05, shape)
+    temperature = 22 + 4 * hourly + np.random.normal(0, 0.3, shape)
+
+    # Zone-major row order, matching sort_values(["zone_id", "timestamp"])
+    return pd.DataFrame(
+        {
+            "timestamp": np.tile(timestamps.to_numpy(), n_z),
+            "zone_id": np.repeat(zone_arr, n_t),
+            "pressure": np.maximum(0.1, pressure).ravel(),
+            "flow": np.maximum(0.0, flow).ravel(),
+            "turbidity": turbidity.ravel(),
+            "temperature": temperature.ravel(),
+        }
+    )
+
+
+def fetch_water_data(
+    hours_back: int = 48, zones: int = DEFAULT_WATER_ZONES, zone_ids: Optional[Sequence[int]] = None
+) -> pd.DataFrame:
     """Simulate water SCADA sensor readings for multiple zones.
 
+    Zones 1..`zones` are returned unless `zone_ids` selects specific zones.
     Columns: timestamp, zone_id, pressure, flow, turbidity, temperature
     """
-    end = datetime.utcnow()
+    zone_ids = list(zone_ids) if zone_ids is not None else list(range(1, zones + 1))
+    # Multi-worker deployments read the loader process's shared buffer
+    shared = shared_recent("water", hours_back, zones=max(zone_ids))
+    if shared is not None:
+        return shared[shared["zone_id"].isin(zone_ids)].reset_index(drop=True)
+    # Readings land on the 10-minute grid, so fetches within one tick share timestamps
+    end = pd.Timestamp(datetime.utcnow()).floor(WATER_STEP).to_pydatetime()
     start = end - timedelta(hours=hours_back)
-    timestamps = pd.date_range(start=start, end=end, freq="10min")
-    records: List[dict] = []
-    for zone_id in range(1, zones + 1):
-        base_pressure = 3.0 + 0.2 * zone_id
-        base_flow = 50 + 5 * zone_id
-        for i, ts in enumerate(timestamps):
-            # Diurnal patterns
-            diurnal = np.sin(2 * np.pi * ((ts.hour * 60 + ts.minute) / (24 * 60)))
-            pressure = base_pressure + 0.3 * diurnal + np.random.normal(0, 0.05)
-            flow = base_flow + 10 * diurnal + np.random.normal(0, 1.5)
-            turbidity = 1.0 + 0.2 * np.abs(diurnal) + np.random.normal(0, 0.05)
-            temperature = 22 + 4 * np.sin(2 * np.pi * ts.hour / 24) + np.random.normal(0, 0.3)
-            records.append(
-                {
-                    "timestamp": ts,
-                    "zone_id": zone_id,
-                    "pressure": max(0.1, float(pressure)),
-                    "flow": max(0.0, float(flow)),
-                    "turbidity": float(turbidity),
-                    "temperature": float(temperature),
-                }
-            )
-    df = pd.DataFrame.from_records(records)
-    return df
+    return _simulate_water_series(start, end, zone_ids)
 
 
 # ---------- Preprocessing ----------
@@ -89,45 +128,47 @@ def preprocess_water_data(df: pd.DataFrame, sequence_length: int = 12) -> Tuple[
     Input features per step: pressure, flow, turbidity, temperature, zone_id (scaled)
     Output: next-step [flow, pressure]
     """
-    df = df.copy().sort_values(["zone_id", "timestamp"]).reset_index(drop=True)
-    feature_cols = ["pressure", "flow", "turbidity", "temperature", "zone_id"]
-
-    scaler = MinMaxScaler()
-    scaled = scaler.fit_transform(df[feature_cols])
-    df_scaled = pd.DataFrame(scaled, columns=feature_cols)
-    df_scaled[["timestamp", "zone_id_orig"]] = df[["timestamp", "zone_id"]]
-
-    X_list: List[np.ndarray] = []
-    y_list: List[np.ndarray] = []
-    for zone_id, g in df_scaled.groupby("zone_id_orig"):
-        g = g.sort_values("timestamp")
-        values = g[feature_cols].values
-        for i in range(len(values) - sequence_length - 1):
-            X_list.append(values[i : i + sequence_length])
-            next_step = values[i + sequence_length]
-            # Output positions: flow=1, pressure=0
-            y_list.append(next_step[[1, 0]])
-
-    X = np.asarray(X_list, dtype=np.float32)
-    y = np.asarray(y_list, dtype=np.float32)
-    return X, y, scaler
+    order = sort_order(df, ["zone_id", "timestamp"])
+    scaled = column_block(df, WATER_FEATURE_COLS, order)
+    zone_ids = take_column(df, "zone_id", order)
+    scaler = fit_scale_inplace(scaled)
+
+    X_parts: List[np.ndarray] = []
+    y_parts: List[np.ndarray] = []
+    for lo, hi in zip(*segment_bounds(zone_ids)):
+        n = hi - lo - sequence_length - 1
+        if n <= 0:
+            continue
+        X_parts.append(np.lib.stride_tricks.sliding_window_view(scaled[lo:hi], (sequence_length, scaled.shape[1]))[:n, 0])
+        # Output positions: flow=1, pressure=0
+        y_parts.append(scaled[lo + sequence_length : lo + sequence_length + n][:, [1, 0]])
+    if not X_parts:
+        return np.empty((0, sequence_length, len(WATER_FEATURE_COLS)), np.float32), np.empty((0, 2), np.float32), scaler
+    return np.concatenate(X_parts), np.concatenate(y_parts), scaler
 
 
 # ---------- Models ----------
-def _build_water_lstm(input_shape: Tuple[int, int]) -> models.Model:
+def _build_water_lstm(
+    input_shape: Tuple[int, int],
+    lstm_units: Tuple[int, int] = (64, 32),
+    dropout: float = 0.2,
+    dense_units: int = 16,
+    learning_rate: Optional[float] = None,
+) -> models.Model:
     if tf is None:
         raise RuntimeError("TensorFlow is required to build water LSTM.")
     model = models.Sequential(
         [
             layers.Input(shape=input_shape),
-            layers.LSTM(64, return_sequences=True),
-            layers.Dropout(0.2),
-            layers.LSTM(32),
-            layers.Dense(16, activation="relu"),
+            layers.LSTM(lstm_units[0], return_sequences=True),
+            layers.Dropout(dropout),
+            layers.LSTM(lstm_units[1]),
+            layers.Dense(dense_units, activation="relu"),
             layers.Dense(2, activation="linear"),  # [flow, pressure]
         ]
     )
-    model.compile(optimizer="adam", loss="mse")
+    optimizer = tf.keras.optimizers.Adam(learning_rate) if learning_rate else "adam"
+    model.compile(optimizer=optimizer, loss="mse")
     return model
 
 
@@ -145,97 +186,381 @@ def _build_water_autoencoder(vector_length: int = 2) -> models.Model:
 
 
 # ---------- Training ----------
-def train_water_autoencoder(df: Optional[pd.DataFrame] = None, epochs: int = 10) -> models.Model:
+def train_water_autoencoder(
+    df: Optional[pd.DataFrame] = None,
+    epochs: int = 10,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    patience: Optional[int] = None,
+) -> models.Model:
+    """Train and save the water AE and its per-zone thresholds.
+
+    With `checkpoint_dir`, progress is checkpointed every epoch and `resume`
+    continues an interrupted run; `patience` enables early stopping.
+    """
     if df is None:
         df = fetch_water_data(hours_back=72)
     # Assume most of the data is normal; train AE on [flow, pressure]
-    feats = df.sort_values(["zone_id", "timestamp"])[["flow", "pressure"]].values.astype(np.float32)
-    ae = _build_water_autoencoder(vector_length=2)
-    ae.fit(feats, feats, epochs=epochs, batch_size=64, validation_split=0.1, verbose=0)
+    order = sort_order(df, ["zone_id", "timestamp"])
+    feats = column_block(df, ["flow", "pressure"], order)
+    ae, initial_epoch, callbacks = prepare_training(
+        "water_ae", lambda: _build_water_autoencoder(vector_length=2), checkpoint_dir, resume, patience
+    )
+    ae.fit(feats, feats, epochs=epochs, initial_epoch=initial_epoch, batch_size=64, validation_split=0.1, callbacks=callbacks, verbose=0)
     ae.save(WATER_AE_PATH)
+    clear_checkpoint(checkpoint_dir, "water_ae")
     logger.info("Saved water AE to %s", WATER_AE_PATH)
+    # Per-zone alert thresholds from training reconstruction errors
+    recon = ae.predict(feats, batch_size=4096, verbose=0)
+    errors = np.mean((recon - feats) ** 2, axis=1)
+    thresholds = calibrate(errors, quantile=ANOMALY_QUANTILE, groups=take_column(df, "zone_id", order))
+    save_thresholds(WATER_AE_PATH, thresholds)
+    logger.info("Water AE thresholds (q=%.3f) for %d zones, default %.4f", ANOMALY_QUANTILE, len(thresholds["per_zone"]), thresholds["default"])
     return ae
 
 
-def train_water_lstm(df: Optional[pd.DataFrame] = None, sequence_length: int = 12, epochs: int = 10) -> models.Model:
+def train_water_lstm(
+    df: Optional[pd.DataFrame] = None,
+    sequence_length: int = 12,
+    epochs: int = 10,
+    checkpoint_dir: Optional[str] = None,
+    resume: bool = False,
+    patience: Optional[int] = None,
+) -> models.Model:
     if df is None:
         df = fetch_water_data(hours_back=72)
     X, y, _ = preprocess_water_data(df, sequence_length=sequence_length)
     if len(X) < 10:
         raise ValueError("Not enough data to train water LSTM.")
-    model = _build_water_lstm(input_shape=(X.shape[1], X.shape[2]))
-    model.fit(X, y, epochs=epochs, batch_size=64, validation_split=0.1, verbose=0)
+    model, initial_epoch, callbacks = prepare_training(
+        "water_lstm", lambda: _build_water_lstm(input_shape=(X.shape[1], X.shape[2])), checkpoint_dir, resume, patience
+    )
+    model.fit(X, y, epochs=epochs, initial_epoch=initial_epoch, batch_size=64, validation_split=0.1, callbacks=callbacks, verbose=0)
     model.save(WATER_LSTM_PATH)
+    clear_checkpoint(checkpoint_dir, "water_lstm")
     logger.info("Saved water LSTM to %s", WATER_LSTM_PATH)
     return model
 
 
 def _load_or_train_water_lstm() -> models.Model:
+    remote = remote_model("water_lstm")
+    if remote is not None:
+        return remote
     if os.path.exists(WATER_LSTM_PATH):
         try:
-            return models.load_model(WATER_LSTM_PATH)
+            return load_model_cached(WATER_LSTM_PATH)
         except Exception:
             logger.warning("Failed to load water LSTM; retraining.")
     return train_water_lstm()
 
 
 def _load_or_train_water_ae() -> models.Model:
+    remote = remote_model("water_ae")
+    if remote is not None:
+        return remote
     if os.path.exists(WATER_AE_PATH):
         try:
-            return models.load_model(WATER_AE_PATH)
+            return load_model_cached(WATER_AE_PATH)
         except Exception:
             logger.warning("Failed to load water AE; retraining.")
     return train_water_autoencoder()
 
 
 # ---------- Inference ----------
-def predict_water_conditions(df_recent: Optional[pd.DataFrame] = None, sequence_length: int = 12) -> Tuple[np.ndarray, dict]:
+def _unscale_outputs(out: np.ndarray, scaler: MinMaxScaler) -> np.ndarray:
+    """Scaled model outputs [..., (flow, pressure)] in sensor units, as a new array."""
+    # Feature positions are pressure=0, flow=1
+    data_min = np.array([scaler.data_min_[1], scaler.data_min_[0]], dtype=np.float32)
+    data_range = np.array([scaler.data_range_[1], scaler.data_range_[0]], dtype=np.float32)
+    return out * data_range + data_min
+
+
+def water_scaling_bounds(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-feature (min, max) of `df`, for scaling zone subsets of it identically."""
+    block = column_block(df, WATER_FEATURE_COLS)
+    return block.min(axis=0), block.max(axis=0)
+
+
+def predict_water_conditions(
+    df_recent: Optional[pd.DataFrame] = None,
+    sequence_length: int = 12,
+    bounds: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Tuple[np.ndarray, dict]:
     """Forecast next-step [flow, pressure] per zone using LSTM.
 
-    Returns tuple of (predictions array of shape (num_zones, 2), meta dict)
+    Features are min/max scaled over `df_recent`, or with `bounds` (from
+    `water_scaling_bounds` over all zones) when it holds only some zones.
+    Returns tuple of (scaled predictions array of shape (num_zones, 2), meta
+    dict); meta["sensor_preds"] holds the same predictions in sensor units.
     """
     if df_recent is None:
         df_recent = fetch_water_data(hours_back=6)
-    model = _load_or_train_water_lstm()
+    with span("water", "model_load"):
+        model = _load_or_train_water_lstm()
 
     # Use latest window per zone
-    df_recent = df_recent.sort_values(["zone_id", "timestamp"]).reset_index(drop=True)
-    feature_cols = ["pressure", "flow", "turbidity", "temperature", "zone_id"]
-    scaler = MinMaxScaler()
-    scaled = scaler.fit_transform(df_recent[feature_cols])
-    df_scaled = pd.DataFrame(scaled, columns=feature_cols)
-    df_scaled[["timestamp", "zone_id_orig"]] = df_recent[["timestamp", "zone_id"]]
+    with span("water", "scale"):
+        order = sort_order(df_recent, ["zone_id", "timestamp"])
+        scaled = column_block(df_recent, WATER_FEATURE_COLS, order)
+        zone_ids = take_column(df_recent, "zone_id", order)
+        scaler = fit_scale_inplace(scaled, bounds)
 
     preds: List[np.ndarray] = []
     zones: List[int] = []
-    for zone_id, g in df_scaled.groupby("zone_id_orig"):
-        values = g[feature_cols].values
-        if len(values) < sequence_length:
-            continue
-        seq = values[-sequence_length:]
-        pred = model.predict(seq[np.newaxis, ...], verbose=0)[0]
-        preds.append(pred)
-        zones.append(int(zone_id))
+    with span("water", "predict"):
+        for lo, hi in zip(*segment_bounds(zone_ids)):
+            if hi - lo < sequence_length:
+                continue
+            zone_id = zone_ids[lo]
+            seq = scaled[hi - sequence_length : hi]
+            pred = model.predict(seq[np.newaxis, ...], verbose=0)[0]
+            preds.append(pred)
+            zones.append(int(zone_id))
     if not preds:
         raise ValueError("Insufficient data for any zone to predict.")
-    return np.vstack(preds), {"zones": zones}
+    preds_arr = np.vstack(preds)
+    return preds_arr, {"zones": zones, "sensor_preds": _unscale_outputs(preds_arr, scaler)}
 
 
-def detect_water_anomalies(observed: np.ndarray, threshold: float = 0.8) -> Tuple[np.ndarray, np.ndarray]:
+def detect_water_anomalies(
+    observed: np.ndarray, threshold: Optional[float] = None, zone_ids: Optional[Sequence[int]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
     """Detect anomalies using AE reconstruction error on [flow, pressure].
 
+    When threshold is None, per-zone thresholds calibrated at AE training time
+    are used (zone_ids gives the zone of each row of `observed`).
     Returns (is_anomaly_bool_array, reconstruction_errors)
     """
-    ae = _load_or_train_water_ae()
-    recon = ae.predict(observed, verbose=0)
-    errors = np.mean((recon - observed) ** 2, axis=1)
+    with span("water", "anomaly_model_load"):
+        ae = _load_or_train_water_ae()
+    with span("water", "anomaly_score"):
+        recon = ae.predict(observed, verbose=0)
+        errors = np.mean((recon - observed) ** 2, axis=1)
+    if threshold is None:
+        threshold = resolve_thresholds(WATER_AE_PATH, DEFAULT_WATER_THRESHOLD, zone_ids=zone_ids, n=len(errors))
     return (errors > threshold), errors
 
 
-# ---------- GNN Placeholder ----------
-# from tensorflow.keras import Model  # Placeholder for future GNN integration
-# class WaterZonalImpactGNN(Model):
-#     pass
+# ---------- Multi-step Horizon ----------
+# (tick, read-only rollout in sensor units, zones, scaled window after the rollout, scaler);
+# the window lets a longer request for the same tick continue the cached rollout
+_HorizonEntry = Tuple[pd.Timestamp, np.ndarray, List[int], np.ndarray, MinMaxScaler]
+_horizon_cache: Dict[int, _HorizonEntry] = {}
+_horizon_lock = threading.Lock()
+# One lock per (sequence_length, tick), so concurrent misses roll out once
+_horizon_key_locks: Dict[Tuple[int, pd.Timestamp], threading.Lock] = {}
+
+
+def _rollout_water(model, window: np.ndarray, steps: int) -> np.ndarray:
+    """Autoregressive rollout of scaled windows (Z, T, features) for `steps` steps.
+
+    Each step is one batched call for all zones. Predicted [flow, pressure] are
+    fed back in; turbidity and temperature are held at their last value.
+    `window` is advanced in place, so a later call continues the rollout.
+    Returns scaled predictions of shape (Z, steps, 2).
+    """
+    out = np.empty((window.shape[0], steps, 2), dtype=np.float32)
+    for step in range(steps):
+        # predict_on_batch avoids predict()'s per-call dataset setup inside the loop
+        pred = np.asarray(model.predict_on_batch(window))
+        out[:, step] = pred
+        next_row = window[:, -1].copy()
+        next_row[:, 0] = pred[:, 1]
+        next_row[:, 1] = pred[:, 0]
+        window[:, :-1] = window[:, 1:]
+        window[:, -1] = next_row
+    return out
+
+
+def _horizon_window(df_recent: pd.DataFrame, sequence_length: int) -> Tuple[np.ndarray, List[int], MinMaxScaler]:
+    """(scaled last `sequence_length` rows per zone as (Z, T, features), zone ids, scaler)."""
+    order = sort_order(df_recent, ["zone_id", "timestamp"])
+    scaled = column_block(df_recent, WATER_FEATURE_COLS, order)
+    zone_ids = take_column(df_recent, "zone_id", order)
+    scaler = fit_scale_inplace(scaled)
+    starts, stops = segment_bounds(zone_ids)
+    full = (stops - starts) >= sequence_length
+    if not full.any():
+        raise ValueError("Insufficient data for any zone to predict.")
+    keep = zone_ids[starts[full]]
+    # Last `sequence_length` rows of each kept zone (rows are zone-major)
+    ends = stops[full]
+    idx = ends[:, np.newaxis] - sequence_length + np.arange(sequence_length)[np.newaxis, :]
+    window = np.ascontiguousarray(scaled[idx], dtype=np.float32)
+    return window, [int(z) for z in keep], scaler
+
+
+def _horizon_rollout(df_recent: pd.DataFrame, steps: int, sequence_length: int) -> Tuple[np.ndarray, List[int]]:
+    """(rollout of shape (num_zones, steps, 2) in sensor units, zone ids) from `df_recent`."""
+    with span("water", "model_load"):
+        model = _load_or_train_water_lstm()
+    with span("water", "scale"):
+        window, zones, scaler = _horizon_window(df_recent, sequence_length)
+    with span("water", "rollout"):
+        out = _unscale_outputs(_rollout_water(model, window, steps), scaler)
+    return out, zones
+
+
+def _cached_horizon(sequence_length: int, tick: pd.Timestamp, steps: int) -> Optional[_HorizonEntry]:
+    # An entry for this tick or a later one, covering at least `steps`, is good enough
+    with _horizon_lock:
+        cached = _horizon_cache.get(sequence_length)
+    return cached if cached is not None and cached[0] >= tick and cached[1].shape[1] >= steps else None
+
+
+def _extend_horizon(sequence_length: int, tick: pd.Timestamp, steps: int, df_recent: pd.DataFrame) -> _HorizonEntry:
+    # Caller holds the key lock for (sequence_length, tick)
+    with span("water", "model_load"):
+        model = _load_or_train_water_lstm()
+    with _horizon_lock:
+        current = _horizon_cache.get(sequence_length)
+    if current is not None and current[0] == tick:
+        # Same tick, too short: continue from the cached window
+        _, prev, zones, window, scaler = current
+        window = window.copy()
+        with span("water", "rollout"):
+            more = _unscale_outputs(_rollout_water(model, window, steps - prev.shape[1]), scaler)
+        out = np.concatenate([prev, more], axis=1)
+    else:
+        with span("water", "scale"):
+            window, zones, scaler = _horizon_window(df_recent, sequence_length)
+        with span("water", "rollout"):
+            out = _unscale_outputs(_rollout_water(model, window, steps), scaler)
+    out.flags.writeable = False
+    entry = (tick, out, zones, window, scaler)
+    with _horizon_lock:
+        current = _horizon_cache.get(sequence_length)
+        if current is None or current[0] <= tick:
+            _horizon_cache[sequence_length] = entry
+        for stale in [k for k in _horizon_key_locks if k[0] == sequence_length and k[1] < tick]:
+            del _horizon_key_locks[stale]
+    return entry
+
+
+def forecast_water_horizon(
+    df_recent: Optional[pd.DataFrame] = None, steps: int = 36, sequence_length: int = 12
+) -> Tuple[np.ndarray, dict]:
+    """Forecast [flow, pressure] for the next `steps` 10-minute steps in every zone.
+
+    Returns (array of shape (num_zones, steps, 2) in sensor units, meta dict).
+    Without `df_recent`, the rollout is cached per 10-minute tick of the latest
+    reading: a miss rolls out only `steps`, a longer request for the same tick
+    continues the cached rollout, and results are read-only views. Concurrent
+    misses wait for a single rollout.
+    """
+    if not 1 <= steps <= MAX_HORIZON_STEPS:
+        raise ValueError(f"steps must be between 1 and {MAX_HORIZON_STEPS}")
+    if df_recent is not None:
+        out, zones = _horizon_rollout(df_recent, steps, sequence_length)
+        return out, {"zones": zones, "cached": False}
+
+    df_recent = fetch_water_data(hours_back=6)
+    # Shared-buffer readings need not sit on the grid; key on their tick
+    tick = pd.Timestamp(df_recent["timestamp"].max()).floor(WATER_STEP)
+    cached = _cached_horizon(sequence_length, tick, steps)
+    hit = cached is not None
+    if not hit:
+        key = (sequence_length, tick)
+        with _horizon_lock:
+            key_lock = _horizon_key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            cached = _cached_horizon(sequence_length, tick, steps)
+            hit = cached is not None
+            if not hit:
+                cached = _extend_horizon(sequence_length, tick, steps, df_recent)
+    out, zones = cached[1], cached[2]
+    return out[:, :steps], {"zones": list(zones), "data_timestamp": cached[0].isoformat(), "cached": hit}
+
+
+# ---------- Zone Impact Graph ----------
+# One entry per graph file: (mtime, adjacency, nodes)
+_graph_cache: Dict[str, Tuple[Optional[float], sparse.csr_matrix, np.ndarray]] = {}
+_graph_lock = threading.Lock()
+
+
+def load_zone_graph(path: Optional[str] = None) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """Load the zone network as a sparse (N, N) CSR matrix and its sorted zone ids.
+
+    A[i, j] is the share of zone i's impact passed downstream to zone j; each
+    row is normalised to sum to 1. Edges come from a CSV with columns
+    source,target[,weight]; without that file, zones 1..ECOGRID_WATER_ZONES are
+    chained in order (1 -> 2 -> ... -> N). Cached until the file changes.
+    """
+    path = path or ZONE_GRAPH_PATH
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    # Building under the lock keeps concurrent misses to a single load
+    with _graph_lock:
+        cached = _graph_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        if mtime is not None:
+            edges = pd.read_csv(path)
+            src = edges["source"].to_numpy(dtype=np.int64)
+            dst = edges["target"].to_numpy(dtype=np.int64)
+            weight = edges["weight"].to_numpy(dtype=np.float64) if "weight" in edges.columns else np.ones(len(edges))
+            nodes = np.unique(np.concatenate([src, dst]))
+        else:
+            nodes = np.arange(1, CITY_WATER_ZONES + 1, dtype=np.int64)
+            src, dst, weight = nodes[:-1], nodes[1:], np.ones(len(nodes) - 1)
+
+        n = len(nodes)
+        adjacency = sparse.csr_matrix(
+            (weight, (np.searchsorted(nodes, src), np.searchsorted(nodes, dst))), shape=(n, n)
+        )
+        out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+        out_weight[out_weight == 0] = 1.0
+        adjacency = sparse.diags(1.0 / out_weight).dot(adjacency).tocsr()
+        _graph_cache[path] = (mtime, adjacency, nodes)
+    return adjacency, nodes
+
+
+def propagate_impact(adjacency: sparse.csr_matrix, scores: np.ndarray, hops: int = 3, decay: float = 0.5) -> np.ndarray:
+    """Spread per-zone anomaly scores downstream over `hops` hops.
+
+    Each hop is one sparse mat-vec (O(edges)); impact decays by `decay` per hop
+    and a zone keeps the strongest impact reaching it at any hop. `scores` may
+    be (N,) or (N, B) to propagate B score vectors together.
+    """
+    frontier = np.asarray(scores, dtype=np.float64)
+    impact = frontier.copy()
+    downstream = adjacency.T.tocsr()
+    for _ in range(hops):
+        frontier = decay * downstream.dot(frontier)
+        np.maximum(impact, frontier, out=impact)
+    return impact
+
+
+def impacted_zones(
+    zone_scores: Dict[int, float],
+    hops: int = 3,
+    decay: float = 0.5,
+    min_impact: float = 0.0,
+    path: Optional[str] = None,
+) -> List[dict]:
+    """Zones reached by the given anomaly scores, strongest impact first."""
+    adjacency, nodes = load_zone_graph(path=path)
+    ids = np.asarray(list(zone_scores), dtype=np.int64)
+    values = np.asarray(list(zone_scores.values()), dtype=np.float64)
+    pos = np.searchsorted(nodes, ids).clip(max=max(len(nodes) - 1, 0))
+    known = nodes[pos] == ids if len(nodes) else np.zeros(len(ids), dtype=bool)
+    scores = np.zeros(len(nodes))
+    scores[pos[known]] = values[known]
+
+    impact = propagate_impact(adjacency, scores, hops=hops, decay=decay)
+    hit = np.flatnonzero(impact > min_impact)
+    results = [
+        {"zone_id": int(nodes[i]), "impact": float(impact[i]), "source": bool(scores[i] > 0)}
+        for i in hit
+    ]
+    # Zones missing from the graph have no edges: they only impact themselves
+    results += [
+        {"zone_id": int(z), "impact": float(v), "source": bool(v > 0)}
+        for z, v in zip(ids[~known], values[~known])
+        if v > min_impact
+    ]
+    results.sort(key=lambda r: -r["impact"])
+    return results
 
 
 __all__ = [
@@ -243,8 +568,13 @@ __all__ = [
     "preprocess_water_data",
     "train_water_autoencoder",
     "train_water_lstm",
+    "water_scaling_bounds",
     "predict_water_conditions",
     "detect_water_anomalies",
+    "forecast_water_horizon",
+    "load_zone_graph",
+    "propagate_impact",
+    "impacted_zones",
 ]
 
 
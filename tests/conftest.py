@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Run the ml modules as the `ml` package (as `python -m ml.<module>` does)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
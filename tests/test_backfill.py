@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from ml import backfill, energy_model, water_model
+from ml.features import fit_scale_inplace
+
+
+class _RecordingModel:
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.inputs = []
+
+    def predict(self, X, batch_size=None, verbose=0):
+        self.inputs.append(np.array(X))
+        return np.zeros((len(X), self.outputs), dtype=np.float32)
+
+
+def _no_anomalies(predicted, actual, *args, **kwargs):
+    return np.zeros(len(predicted), dtype=bool), np.zeros(len(predicted))
+
+
+@pytest.fixture
+def energy_model_stub(monkeypatch):
+    model = _RecordingModel(backfill.ENERGY_HORIZON)
+    monkeypatch.setattr(energy_model, "_load_or_train_energy", lambda: model)
+    monkeypatch.setattr(energy_model, "detect_energy_anomalies_batch", _no_anomalies)
+    return model
+
+
+@pytest.fixture
+def water_model_stub(monkeypatch):
+    model = _RecordingModel(2)
+    monkeypatch.setattr(water_model, "_load_or_train_water_lstm", lambda: model)
+    monkeypatch.setattr(water_model, "detect_water_anomalies", lambda observed, zone_ids=None: _no_anomalies(observed, None))
+    return model
+
+
+def test_chunks_cover_range_without_gaps():
+    start, end = datetime(2026, 3, 1), datetime(2026, 3, 9, 5)
+    chunks = backfill._chunks(start, end, 48)
+    assert chunks[0][0] == start and chunks[-1][1] == end
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    assert [c[1] - c[0] for c in chunks[:-1]] == [timedelta(hours=48)] * 4
+    assert chunks[-1][1] - chunks[-1][0] == timedelta(hours=5)
+
+
+def test_energy_windows_match_live_preprocessing(energy_model_stub):
+    start, end = datetime(2026, 3, 1), datetime(2026, 3, 1, 12)
+    rows = backfill._energy_chunk(start, end, seed=7)
+    assert [r[0] for r in rows] == [(start + timedelta(hours=h)).isoformat() for h in range(12)]
+
+    # Same history the chunk simulated, then each tick's 30h fetch scaled as live
+    np.random.seed(7)
+    hist_start = start - timedelta(hours=backfill.ENERGY_LOOKBACK_HOURS - 1)
+    periods = int((end - hist_start).total_seconds() // 3600) + backfill.ENERGY_HORIZON
+    df = energy_model._simulate_energy_series(start=hist_start, periods=periods, freq_minutes=60)
+    X = energy_model_stub.inputs[0]
+    for tick in range(12):
+        live = df.iloc[tick : tick + backfill.ENERGY_LOOKBACK_HOURS]
+        scaled, _, _ = energy_model._energy_feature_block(live)
+        fit_scale_inplace(scaled)
+        np.testing.assert_allclose(X[tick], scaled[-backfill.ENERGY_SEQUENCE_LENGTH :], atol=1e-5)
+
+
+def test_water_windows_match_live_preprocessing(water_model_stub):
+    start, end = datetime(2026, 3, 1), datetime(2026, 3, 1, 1)
+    zone_ids = [1, 2, 3]
+    rows = backfill._water_chunk(start, end, seed=3, zone_ids=zone_ids)
+    assert [r[0] for r in rows] == [(start + timedelta(minutes=10 * i)).isoformat() for i in range(6)]
+
+    np.random.seed(3)
+    hist_start = start - timedelta(minutes=10 * backfill.WATER_LOOKBACK_STEPS)
+    df = water_model._simulate_water_series(hist_start, end + timedelta(minutes=10), zone_ids)
+    X = water_model_stub.inputs[0].reshape(-1, len(zone_ids), backfill.WATER_SEQUENCE_LENGTH, len(backfill.WATER_FEATURE_COLS))
+    for tick in range(6):
+        ts = start + timedelta(minutes=10 * tick)
+        live = df[(df["timestamp"] >= ts - timedelta(hours=12)) & (df["timestamp"] <= ts)]
+        bounds = water_model.water_scaling_bounds(live)
+        for z, zone in enumerate(zone_ids):
+            zone_rows = live[live["zone_id"] == zone].sort_values("timestamp")
+            scaled = zone_rows[water_model.WATER_FEATURE_COLS].to_numpy(dtype=np.float32)
+            fit_scale_inplace(scaled, bounds)
+            np.testing.assert_allclose(X[tick, z], scaled[-backfill.WATER_SEQUENCE_LENGTH :], atol=1e-5)
+
+
+def test_failed_chunk_is_skipped_and_retried(tmp_path, monkeypatch):
+    db = str(tmp_path / "backfill.db")
+    calls = []
+
+    def flaky(pipeline, c_start, c_end, seed, zone_ids):
+        calls.append(c_start)
+        if c_start == datetime(2026, 3, 2) and len(calls) <= 3:
+            raise RuntimeError("worker ran out of memory")
+        return pipeline, c_start.isoformat(), c_end.isoformat(), [], 0.0
+
+    monkeypatch.setattr(backfill, "_run_chunk", flaky)
+    args = dict(pipelines=["energy"], chunk_hours=24, workers=0, run_id="r1", db_path=db)
+    assert backfill.run_backfill(datetime(2026, 3, 1), datetime(2026, 3, 4), **args) == ("r1", 1)
+    assert backfill._completed_chunks(db, "r1") == {("energy", "2026-03-01T00:00:00"), ("energy", "2026-03-03T00:00:00")}
+
+    assert backfill.run_backfill(datetime(2026, 3, 1), datetime(2026, 3, 4), **args) == ("r1", 0)
+    assert calls[3:] == [datetime(2026, 3, 2)]
+    assert len(backfill._completed_chunks(db, "r1")) == 3
+
+
+@pytest.mark.parametrize("failed,code", [(0, None), (2, 1)])
+def test_cli_exits_nonzero_on_failed_chunks(monkeypatch, failed, code):
+    monkeypatch.setattr(backfill, "run_backfill", lambda **kwargs: ("r1", failed))
+    monkeypatch.setattr("sys.argv", ["backfill", "--start", "2026-03-01", "--end", "2026-03-02"])
+    if code is None:
+        backfill.main()
+    else:
+        with pytest.raises(SystemExit) as exc:
+            backfill.main()
+        assert exc.value.code == code
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml import batch_score, water_model
+
+
+class _WindowMeanModel:
+    def predict(self, X, batch_size=None, verbose=0):
+        # Depends on every row of the window, so a misplaced tail changes the output
+        return X.mean(axis=1)[:, :2] + 0.01 * (X[:, :, 2] @ np.arange(X.shape[1]))[:, np.newaxis]
+
+
+class _Autoencoder:
+    def predict(self, X, verbose=0):
+        return X * 0.9
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    monkeypatch.setattr(water_model, "_load_or_train_water_lstm", lambda: _WindowMeanModel())
+    monkeypatch.setattr(water_model, "_load_or_train_water_ae", lambda: _Autoencoder())
+    np.random.seed(2)
+    df = water_model._simulate_water_series(datetime(2026, 1, 1, 22), datetime(2026, 1, 2, 4), [1, 2, 3])
+    # Time-major, as SCADA exports usually arrive
+    df = df.sort_values(["timestamp", "zone_id"]).reset_index(drop=True)
+    path = tmp_path / "export.csv"
+    df[batch_score.INPUT_COLS].to_csv(path, index=False)
+    return tmp_path, df
+
+
+def _score(tmp_path, chunk_rows):
+    out = tmp_path / f"scored_{chunk_rows}.csv"
+    batch_score.score_file(str(tmp_path / "export.csv"), str(out), chunk_rows=chunk_rows, threshold=0.5)
+    return out
+
+
+def test_output_is_independent_of_chunk_size(export):
+    tmp_path, df = export
+    texts = [_score(tmp_path, rows).read_text() for rows in (3, 7, 40, 10_000)]
+    assert all(t == texts[0] for t in texts[1:])
+
+    scored = pd.read_csv(tmp_path / "scored_10000.csv", parse_dates=["timestamp"])
+    # Input order is kept, and each zone's first `sequence_length` rows have no forecast
+    pd.testing.assert_series_equal(scored["timestamp"], df["timestamp"], check_dtype=False)
+    assert (scored["zone_id"].to_numpy() == df["zone_id"].to_numpy()).all()
+    assert scored.groupby("zone_id")["pred_flow"].apply(lambda s: s.isna().sum()).tolist() == [12, 12, 12]
+
+
+def test_forecasts_match_unchunked_windows(export):
+    tmp_path, df = export
+    scored = pd.read_csv(_score(tmp_path, 5))
+    data_min = df[batch_score.WATER_FEATURE_COLS].min().to_numpy(dtype=np.float32)
+    data_range = (df[batch_score.WATER_FEATURE_COLS].max().to_numpy(dtype=np.float32) - data_min)
+    model = _WindowMeanModel()
+    for zone, rows in df.groupby("zone_id"):
+        scaled = (rows[batch_score.WATER_FEATURE_COLS].to_numpy(dtype=np.float32) - data_min) / data_range
+        i = 20
+        out = model.predict(scaled[np.newaxis, i - 12 : i])[0]
+        expected_flow = out[0] * data_range[1] + data_min[1]
+        np.testing.assert_allclose(scored.loc[rows.index[i], "pred_flow"], expected_flow, rtol=1e-4)
+
+
+def test_csv_timestamps_keep_a_single_format(export):
+    tmp_path, _ = export
+    # With 3 zones, some 3-row chunks hold only midnight readings
+    lines = _score(tmp_path, 3).read_text().splitlines()[1:]
+    assert any(line.startswith("2026-01-02 00:00:00,") for line in lines)
+    assert {len(line.split(",")[0]) for line in lines} == {19}
@@ -0,0 +1,60 @@
+import sqlite3
+import time
+
+import pytest
+
+from ml import cascade
+
+
+@pytest.fixture
+def tick_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(cascade, "DB_PATH", str(tmp_path / "cascade.db"))
+    cascade._init_db()
+    return cascade.DB_PATH
+
+
+def _boom():
+    raise RuntimeError("model file corrupt")
+
+
+def test_failing_pipeline_is_recorded_and_tick_logged(tick_db, monkeypatch):
+    monkeypatch.setattr(cascade, "_energy_tick", _boom)
+    monkeypatch.setattr(cascade, "_water_tick", lambda: "ok")
+    outcome = cascade.run_cascade_tick(timeout=30)
+    assert outcome["energy"][0] == "error" and outcome["water"][0] == "ok"
+    con = sqlite3.connect(tick_db)
+    rows = con.execute("SELECT energy_status, water_status FROM cascade_ticks").fetchall()
+    con.close()
+    assert rows == [("error", "ok")]
+    # The failed run released its lock
+    assert not cascade._pipeline_locks["energy"].locked()
+
+
+def test_pipeline_run_excludes_ticks_and_other_runs(tick_db, monkeypatch):
+    monkeypatch.setattr(cascade, "_energy_tick", lambda: "ok")
+    monkeypatch.setattr(cascade, "_water_tick", lambda: "ok")
+    with cascade.pipeline_run("water"):
+        with pytest.raises(cascade.PipelineBusy):
+            with cascade.pipeline_run("water"):
+                pass
+        outcome = cascade.run_cascade_tick(timeout=30)
+    assert outcome["water"] == ("skipped", None) and outcome["energy"][0] == "ok"
+    assert not cascade._pipeline_locks["water"].locked()
+
+
+def test_pipelines_run_one_at_a_time_while_job_profiling_is_armed(tick_db, monkeypatch):
+    running, overlaps = [], []
+
+    def job():
+        running.append(1)
+        overlaps.append(len(running))
+        time.sleep(0.05)
+        running.pop()
+        return "ok"
+
+    monkeypatch.setattr(cascade, "_energy_tick", job)
+    monkeypatch.setattr(cascade, "_water_tick", job)
+    monkeypatch.setattr(cascade, "is_armed", lambda kind: True)
+    outcome = cascade.run_cascade_tick(timeout=30)
+    assert outcome["energy"][0] == outcome["water"][0] == "ok"
+    assert overlaps == [1, 1]
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+
+from ml import energy_model
+
+LOOKBACK = 30  # hours fetched per live forecast; 29 feature rows after dropna
+
+
+def _reference_window(df, sequence_length=24):
+    # What predict_energy_demand did on each fresh 30h fetch
+    df = df.sort_values("timestamp").tail(LOOKBACK).copy()
+    df["previous_demand"] = df["demand"].shift(1)
+    df = df.dropna()
+    return MinMaxScaler().fit_transform(df[energy_model.ENERGY_FEATURE_COLS])[-sequence_length:]
+
+
+@pytest.fixture
+def series():
+    np.random.seed(4)
+    return energy_model._simulate_energy_series(datetime(2026, 2, 1), 24 * 6)
+
+
+def test_window_matches_dataframe_reference_as_rows_arrive(series):
+    buf = energy_model.EnergyFeatureBuffer(window=LOOKBACK - 1, sequence_length=24)
+    rng = np.random.default_rng(0)
+    end = LOOKBACK
+    buf.extend(series.iloc[:end])
+    while end < len(series):
+        np.testing.assert_allclose(buf.latest_window(), _reference_window(series.iloc[:end]), atol=1e-5)
+        step = int(rng.integers(1, 5))
+        # Overlapping, unsorted chunks: only rows newer than the last one are added
+        chunk = series.iloc[max(0, end - 3) : end + step].sample(frac=1.0, random_state=end)
+        assert buf.extend(chunk) == min(step, len(series) - end)
+        end = min(end + step, len(series))
+    np.testing.assert_allclose(buf.latest_window(), _reference_window(series), atol=1e-5)
+
+
+def test_window_is_read_only_view(series):
+    buf = energy_model.EnergyFeatureBuffer(window=LOOKBACK - 1, sequence_length=24)
+    buf.extend(series.iloc[:LOOKBACK])
+    window = buf.latest_window()
+    assert not window.flags.writeable and not window.flags.owndata
+    with pytest.raises(ValueError):
+        window[0, 0] = 1.0
+
+
+def test_rescales_only_when_window_extremes_change(series):
+    buf = energy_model.EnergyFeatureBuffer(window=LOOKBACK - 1, sequence_length=24)
+    buf.extend(series)
+    # hour and day wrap every step, so some rescaling is expected, but not on every row
+    assert 0 < buf.rescales < len(series) - 1
+
+
+def test_insufficient_rows_and_bad_sizes(series):
+    buf = energy_model.EnergyFeatureBuffer(window=LOOKBACK - 1, sequence_length=24)
+    buf.extend(series.iloc[:10])
+    assert len(buf) == 9
+    with pytest.raises(ValueError):
+        buf.latest_window()
+    with pytest.raises(ValueError):
+        energy_model.EnergyFeatureBuffer(window=10, sequence_length=24)
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from ml.energy_model import _simulate_energy_series
+
+
+def test_simulated_series_has_daily_cycle():
+    np.random.seed(0)
+    df = _simulate_energy_series(pd.Timestamp("2026-01-01"), periods=24 * 14)
+    by_hour = df.groupby("hour")[["temperature", "demand"]].mean()
+    # temperature = 25 + 7 sin(2*pi*h/24): peak at 06:00, trough at 18:00
+    assert by_hour["temperature"].idxmax() in (5, 6, 7)
+    assert by_hour["temperature"].idxmin() in (17, 18, 19)
+    assert by_hour["temperature"].max() - by_hour["temperature"].min() > 12
+    assert by_hour["demand"].max() - by_hour["demand"].min() > 250
+
+
+def test_phase_follows_wall_clock_for_any_datetime_unit():
+    start = pd.Timestamp("2026-03-01 05:00")
+    for unit in ("s", "us", "ns"):
+        np.random.seed(1)
+        df = _simulate_energy_series(start.as_unit(unit), periods=6)
+        np.random.seed(1)
+        ref = _simulate_energy_series(start, periods=6)
+        np.testing.assert_allclose(df["temperature"], ref["temperature"])
+    # Adjacent windows continue the same curve
+    np.random.seed(2)
+    a = _simulate_energy_series(start, periods=48)
+    b = _simulate_energy_series(start + pd.Timedelta(hours=24), periods=24)
+    assert np.abs(a["temperature"].to_numpy()[24:] - b["temperature"].to_numpy()).max() < 3
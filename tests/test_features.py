@@ -0,0 +1,114 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+
+from ml import energy_model, features, water_model
+
+
+# ---------- Reference: the DataFrame-based preprocessing features.* replaced ----------
+def _old_energy(df, sequence_length=24, horizon=6):
+    df = df.copy().sort_values("timestamp")
+    df["previous_demand"] = df["demand"].shift(1)
+    df.dropna(inplace=True)
+    scaled = MinMaxScaler().fit_transform(df[energy_model.ENERGY_FEATURE_COLS])
+    X, y = [], []
+    for i in range(len(df) - sequence_length - horizon + 1):
+        X.append(scaled[i : i + sequence_length])
+        y.append(df["demand"].values[i + sequence_length : i + sequence_length + horizon])
+    return np.asarray(X, dtype=np.float32), np.asarray(y, dtype=np.float32)
+
+
+def _old_feeder_energy(df, sequence_length=24, horizon=6):
+    df = df.sort_values(["feeder_id", "timestamp"])
+    df = df.assign(previous_demand=df.groupby("feeder_id")["demand"].shift(1)).dropna(subset=["previous_demand"])
+    scaled = MinMaxScaler().fit_transform(df[energy_model.ENERGY_FEATURE_COLS]).astype(np.float32)
+    demand = df["demand"].to_numpy(dtype=np.float32)
+    X, y = [], []
+    for feeder in df["feeder_id"].unique():
+        idx = np.flatnonzero(df["feeder_id"].to_numpy() == feeder)
+        for i in range(len(idx) - sequence_length - horizon + 1):
+            X.append(scaled[idx[i : i + sequence_length]])
+            y.append(demand[idx[i + sequence_length : i + sequence_length + horizon]])
+    return np.asarray(X, dtype=np.float32), np.asarray(y, dtype=np.float32)
+
+
+def _old_water(df, sequence_length=12):
+    df = df.copy().sort_values(["zone_id", "timestamp"]).reset_index(drop=True)
+    cols = water_model.WATER_FEATURE_COLS
+    scaled = pd.DataFrame(MinMaxScaler().fit_transform(df[cols]), columns=cols)
+    scaled[["timestamp", "zone_id_orig"]] = df[["timestamp", "zone_id"]]
+    X, y = [], []
+    for _, g in scaled.groupby("zone_id_orig"):
+        values = g.sort_values("timestamp")[cols].values
+        for i in range(len(values) - sequence_length - 1):
+            X.append(values[i : i + sequence_length])
+            y.append(values[i + sequence_length][[1, 0]])
+    return np.asarray(X, dtype=np.float32), np.asarray(y, dtype=np.float32)
+
+
+def _shuffled(df, seed=0):
+    return df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    np.random.seed(11)
+
+
+def test_energy_matches_old_preprocessing():
+    df = _shuffled(energy_model._simulate_energy_series(datetime(2026, 1, 1), 24 * 5))
+    X, y, _ = energy_model.preprocess_energy_data(df)
+    X_old, y_old = _old_energy(df)
+    assert X.shape == X_old.shape and X.dtype == np.float32
+    np.testing.assert_allclose(X, X_old, atol=1e-5)
+    np.testing.assert_allclose(y, y_old, rtol=1e-6)
+
+
+def test_feeder_energy_matches_old_preprocessing():
+    df = _shuffled(energy_model._simulate_feeder_series(datetime(2026, 1, 1), 24 * 3, feeders=4))
+    X, y, _ = energy_model.preprocess_energy_data(df)
+    X_old, y_old = _old_feeder_energy(df)
+    assert X.shape == X_old.shape
+    np.testing.assert_allclose(X, X_old, atol=1e-5)
+    np.testing.assert_allclose(y, y_old, rtol=1e-6)
+
+
+def test_water_matches_old_preprocessing():
+    df = _shuffled(water_model._simulate_water_series(datetime(2026, 1, 1), datetime(2026, 1, 1, 8), [3, 1, 2]))
+    X, y, _ = water_model.preprocess_water_data(df)
+    X_old, y_old = _old_water(df)
+    assert X.shape == X_old.shape
+    np.testing.assert_allclose(X, X_old, atol=1e-5)
+    np.testing.assert_allclose(y, y_old, atol=1e-5)
+
+
+def test_preprocessing_leaves_input_untouched():
+    df = _shuffled(water_model._simulate_water_series(datetime(2026, 1, 1), datetime(2026, 1, 1, 4), [1, 2]))
+    before = df.copy()
+    water_model.preprocess_water_data(df)
+    energy_df = _shuffled(energy_model._simulate_energy_series(datetime(2026, 1, 1), 48))
+    energy_before = energy_df.copy()
+    energy_model.preprocess_energy_data(energy_df)
+    pd.testing.assert_frame_equal(df, before)
+    pd.testing.assert_frame_equal(energy_df, energy_before)
+
+
+def test_fit_scale_inplace_matches_minmax_scaler():
+    block = np.random.normal(size=(50, 4)).astype(np.float32)
+    block[:, 2] = 3.0  # constant column maps to 0
+    expected = MinMaxScaler().fit_transform(block)
+    scaler = features.fit_scale_inplace(block)
+    np.testing.assert_allclose(block, expected, atol=1e-6)
+    assert scaler.n_features_in_ == 4
+
+
+def test_sort_order_and_segment_bounds():
+    df = pd.DataFrame({"zone_id": [2, 1, 2, 1], "timestamp": [1, 2, 0, 1]})
+    order = features.sort_order(df, ["zone_id", "timestamp"])
+    assert order.tolist() == [3, 1, 2, 0]
+    assert features.sort_order(df.iloc[order], ["zone_id", "timestamp"]) is None
+    starts, stops = features.segment_bounds(np.array([1, 1, 2, 5, 5, 5]))
+    assert starts.tolist() == [0, 2, 3] and stops.tolist() == [2, 3, 6]
@@ -0,0 +1,67 @@
+import json
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from ml import cascade, energy_model
+
+
+class _WindowModel:
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, X, batch_size=None, verbose=0):
+        self.batches.append(len(X))
+        # Every row and feature of the window matters
+        return X.sum(axis=2)[:, -6:] + 0.1 * X.sum(axis=(1, 2))[:, np.newaxis]
+
+
+@pytest.fixture
+def feeders(monkeypatch):
+    model = _WindowModel()
+    monkeypatch.setattr(energy_model, "_load_or_train_energy", lambda df=None: model)
+    np.random.seed(8)
+    df = energy_model._simulate_feeder_series(datetime(2026, 3, 1), 30, feeders=4)
+    # Feeder 2 lost its oldest hours; feeder 3 has too little history to forecast
+    df = df.drop(df.index[(df["feeder_id"] == 2).to_numpy().nonzero()[0][:3]])
+    df = df.drop(df.index[(df["feeder_id"] == 3).to_numpy().nonzero()[0][:12]])
+    return model, df.sample(frac=1.0, random_state=1).reset_index(drop=True)
+
+
+def test_batched_forecast_matches_per_feeder(feeders):
+    model, df = feeders
+    preds, feeder_ids = energy_model.predict_energy_demand_by_feeder(df)
+    assert model.batches == [3]
+    assert feeder_ids == [1, 2, 4]
+    for row, feeder in enumerate(feeder_ids):
+        single, _ = energy_model.predict_energy_demand(df[df["feeder_id"] == feeder])
+        np.testing.assert_allclose(preds[row], single, rtol=1e-5)
+
+
+def test_no_feeder_with_enough_history(feeders):
+    _, df = feeders
+    with pytest.raises(ValueError):
+        energy_model.predict_energy_demand_by_feeder(df[df["feeder_id"] == 3])
+
+
+def test_feeder_tick_logs_one_row_per_feeder(feeders, tmp_path, monkeypatch):
+    _, df = feeders
+    monkeypatch.setattr(cascade, "DB_PATH", str(tmp_path / "cascade.db"))
+    cascade._init_db()
+    monkeypatch.setattr(cascade, "fetch_energy_data", lambda hours_back, feeders: df)
+    flags = np.array([False, True, False])
+    scores = np.array([0.1, 0.9, 0.2])
+    monkeypatch.setattr(cascade, "detect_energy_anomalies_batch", lambda predicted, actual: (flags, scores))
+
+    total, any_anom, worst = cascade._run_feeder_forecast(4)
+    preds, _ = energy_model.predict_energy_demand_by_feeder(df)
+    np.testing.assert_allclose(total, preds.sum(axis=0), rtol=1e-6)
+    assert any_anom and worst == 0.9
+
+    con = sqlite3.connect(cascade.DB_PATH)
+    rows = con.execute("SELECT feeder_id, preds_json, anomaly, anomaly_score FROM energy_feeder_predictions ORDER BY feeder_id").fetchall()
+    con.close()
+    assert [(r[0], r[2], r[3]) for r in rows] == [(1, 0, 0.1), (2, 1, 0.9), (4, 0, 0.2)]
+    np.testing.assert_allclose([json.loads(r[1]) for r in rows], preds, rtol=1e-6)
@@ -0,0 +1,172 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+from multiprocessing.connection import Listener
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml import inference_server, water_model
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    # A unique prefix per test keeps segments from colliding across runs
+    monkeypatch.setattr(inference_server, "SHM_PREFIX", f"ecogrid_test_{uuid.uuid4().hex[:8]}")
+    monkeypatch.setattr(inference_server, "INFERENCE_SOCKET", "/nonexistent.sock")
+    monkeypatch.setattr(inference_server, "_buffers", {})
+    created = []
+
+    def create(kind, rows, max_age=0):
+        buf = inference_server.SharedRingBuffer.create(
+            inference_server._buffer_name(kind), len(rows), rows.shape[1], max_age=max_age
+        )
+        buf.append(rows)
+        created.append(buf)
+        return buf
+
+    yield create
+    for buf in created:
+        if buf._header is not None:
+            buf.close()
+
+
+def _water_rows(end, hours, zones):
+    df = water_model._simulate_water_series(end - timedelta(hours=hours) + timedelta(minutes=10), end, zones)
+    return inference_server._frame_to_rows("water", df.sort_values(["timestamp", "zone_id"]))
+
+
+def test_ring_wraps_around_in_order():
+    name = f"ecogrid_test_{uuid.uuid4().hex[:8]}"
+    buf = inference_server.SharedRingBuffer.create(name, capacity=5, columns=2)
+    try:
+        rows = np.arange(26, dtype=np.float64).reshape(13, 2)
+        buf.append(rows[:3])
+        np.testing.assert_array_equal(buf.latest(), rows[:3])
+        buf.append(rows[3:7])
+        np.testing.assert_array_equal(buf.latest(), rows[2:7])
+        np.testing.assert_array_equal(buf.latest(2), rows[5:7])
+        # One append larger than the ring keeps only its newest rows
+        buf.append(rows[7:13])
+        np.testing.assert_array_equal(buf.latest(), rows[8:13])
+
+        reader = inference_server.SharedRingBuffer.attach(name)
+        np.testing.assert_array_equal(reader.latest(), rows[8:13])
+    finally:
+        buf.close()
+
+
+def test_reader_retries_while_a_write_is_in_progress():
+    buf = inference_server.SharedRingBuffer.create(f"ecogrid_test_{uuid.uuid4().hex[:8]}", capacity=4, columns=1)
+    try:
+        buf.append(np.ones((2, 1)))
+        buf._header[3] += 1  # writer mid-append
+        with pytest.raises(RuntimeError):
+            buf.latest(retries=3)
+
+        timer = threading.Timer(0.01, lambda: buf._header.__setitem__(3, buf._header[3] + 1))
+        timer.start()
+        np.testing.assert_array_equal(buf.latest(retries=10**7), np.ones((2, 1)))
+        timer.join()
+    finally:
+        buf.close()
+
+
+def test_existing_segment_is_never_taken_over(shared):
+    shared("water", np.zeros((2, 6)))
+    with pytest.raises(RuntimeError, match="already exists"):
+        inference_server.SharedRingBuffer.create(inference_server._buffer_name("water"), 2, 6)
+
+
+def test_shared_recent_filters_zones_and_hours(shared):
+    end = datetime.utcnow().replace(second=0, microsecond=0)
+    end -= timedelta(minutes=end.minute % 10)
+    shared("water", _water_rows(end, 12, [1, 2, 3, 4]))
+
+    df = inference_server.shared_recent("water", 6, zones=3)
+    assert sorted(df["zone_id"].unique()) == [1, 2, 3]
+    assert df["timestamp"].max() == pd.Timestamp(end)
+    assert df["timestamp"].min() == pd.Timestamp(end - timedelta(hours=6) + timedelta(minutes=10))
+    assert (df.groupby("zone_id")["timestamp"].is_monotonic_increasing).all()
+    assert list(df["zone_id"]) == sorted(df["zone_id"])
+
+    assert inference_server.shared_recent("water", 6, zones=5) is None
+    assert inference_server.shared_recent("water", 13) is None
+    assert inference_server.shared_recent("energy", 6) is None
+
+
+def test_stale_buffer_is_rejected(shared):
+    end = datetime.utcnow() - timedelta(hours=2)
+    shared("water", _water_rows(end, 6, [1, 2]), max_age=900)
+    assert inference_server.shared_recent("water", 3) is None
+
+
+def test_workers_reattach_after_loader_restart(shared):
+    end = datetime.utcnow().replace(second=0, microsecond=0)
+    old = shared("water", _water_rows(end, 6, [1, 2]))
+    assert inference_server.shared_recent("water", 3)["zone_id"].max() == 2
+
+    old.close()
+    shared("water", _water_rows(end, 6, [1, 2, 3]))
+    assert inference_server.shared_recent("water", 3)["zone_id"].max() == 3
+
+
+def test_stale_mapping_is_replaced_after_a_crashed_loader(shared):
+    old = shared("water", _water_rows(datetime.utcnow() - timedelta(hours=2), 6, [1, 2]), max_age=900)
+    assert inference_server.shared_recent("water", 3) is None
+    # Crashed loader: the segment is removed by hand, never retired
+    old.shm.unlink()
+    old.owner = False
+    shared("water", _water_rows(datetime.utcnow(), 6, [1, 2, 3]), max_age=900)
+    assert inference_server.shared_recent("water", 3)["zone_id"].max() == 3
+
+
+class _Store:
+    def predict(self, name, x):
+        if name == "missing":
+            raise KeyError(name)
+        return x.sum(axis=-1)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    path = str(tmp_path / "infer.sock")
+    monkeypatch.setattr(inference_server, "INFERENCE_SOCKET", path)
+    monkeypatch.setattr(inference_server, "AUTHKEY", b"test-key")
+    monkeypatch.setattr(inference_server._local, "conn", None, raising=False)
+    listener = Listener(path, family="AF_UNIX", authkey=b"test-key")
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=inference_server._serve_connection, args=(conn, _Store()), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield path
+    listener.close()
+
+
+def test_remote_model_round_trip(server):
+    model = inference_server.RemoteModel("water_lstm")
+    x = np.arange(12, dtype=np.float64).reshape(2, 3, 2)
+    np.testing.assert_allclose(model.predict(x), x.sum(axis=-1))
+    np.testing.assert_allclose(model.predict_on_batch(x), x.sum(axis=-1))
+    with pytest.raises(RuntimeError, match="Inference server error"):
+        inference_server.RemoteModel("missing").predict(x)
+
+
+def test_remote_model_requires_authkey(server, monkeypatch):
+    monkeypatch.setattr(inference_server, "AUTHKEY", b"")
+    with pytest.raises(RuntimeError, match="ECOGRID_INFERENCE_AUTHKEY"):
+        inference_server.RemoteModel("water_lstm").predict(np.zeros((1, 2)))
+
+
+def test_remote_model_only_in_shared_mode(monkeypatch):
+    monkeypatch.setattr(inference_server, "INFERENCE_SOCKET", "")
+    assert inference_server.remote_model("water_lstm") is None
+    monkeypatch.setattr(inference_server, "INFERENCE_SOCKET", "/tmp/x.sock")
+    assert isinstance(inference_server.remote_model("water_lstm"), inference_server.RemoteModel)
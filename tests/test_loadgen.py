@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+import numpy as np
+
+from ml import loadgen
+
+
+def _fleet(seed):
+    return loadgen.SyntheticFleet(sensors=50, zones=8, seed=seed, impact_pool=16)
+
+
+def test_same_seed_builds_same_payloads():
+    a, b = _fleet(3), _fleet(3)
+    # Anchored on the seed, not the wall clock
+    assert a.signal_end == loadgen.SIGNAL_EPOCH + timedelta(minutes=30)
+    assert a.sensors == b.sensors
+    assert a._impact_payloads == b._impact_payloads
+    np.testing.assert_array_equal(a._temperature_deltas, b._temperature_deltas)
+    assert [a.next_request("scenarios") for _ in range(5)] == [b.next_request("scenarios") for _ in range(5)]
+    assert _fleet(4)._impact_payloads != a._impact_payloads
+
+
+def test_building_a_fleet_leaves_the_global_rng_alone():
+    np.random.seed(99)
+    state = np.random.get_state()
+    _fleet(1)
+    after = np.random.random(3)
+    np.random.set_state(state)
+    np.testing.assert_array_equal(after, np.random.random(3))
@@ -0,0 +1,25 @@
+from ml import parallel
+
+
+def _collect(workers, tasks, fn=divmod):
+    results, errors = [], []
+    parallel.run_pool(tasks, fn, workers, on_result=results.append, on_error=lambda task, exc: errors.append((task, type(exc))))
+    return sorted(results), errors
+
+
+def test_inline_and_pool_report_results_and_failures_alike():
+    tasks = [(7, 2), (1, 0), (9, 4)]
+    expected = ([(2, 1), (3, 1)], [((1, 0), ZeroDivisionError)])
+    assert _collect(0, tasks) == expected
+    assert _collect(2, tasks) == expected
+
+
+def test_inline_runs_initializer_once(monkeypatch):
+    calls = []
+    parallel.run_pool([(1, 1)], divmod, 0, on_result=lambda r: None, on_error=None, initializer=calls.append, initargs=("x",))
+    assert calls == ["x"]
+
+
+def test_threads_per_worker(monkeypatch):
+    monkeypatch.setattr(parallel.os, "cpu_count", lambda: 8)
+    assert [parallel.tf_threads_per_worker(n) for n in (0, 1, 3, 16)] == [8, 8, 2, 1]
@@ -0,0 +1,135 @@
+import importlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+# The routes import ml via `....ml`, so the app loads as <repo dir>.backend.app
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.dirname(REPO_DIR))
+APP_PACKAGE = f"{os.path.basename(REPO_DIR)}.backend.app"
+
+HEADERS = {"x-api-key": "dev-key"}
+# Full scan + sort of 10^9 generated rows: only the progress handler ends it in time
+SLOW_VIEW = (
+    "CREATE VIEW energy_predictions AS WITH RECURSIVE c(id) AS "
+    "(SELECT 1 UNION ALL SELECT id + 1 FROM c LIMIT 1000000000) SELECT id FROM c"
+)
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    main = importlib.import_module(f"{APP_PACKAGE}.main")
+    predict = importlib.import_module(f"{APP_PACKAGE}.routes.predict")
+    db = str(tmp_path / "ecogrid.db")
+    con = sqlite3.connect(db)
+    con.execute("CREATE TABLE energy_predictions (id INTEGER PRIMARY KEY, demand REAL)")
+    con.execute("INSERT INTO energy_predictions (demand) VALUES (42.0)")
+    con.commit()
+    con.close()
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-read-test")
+    monkeypatch.setattr(predict, "DB_PATH", db)
+    monkeypatch.setattr(predict, "DB_QUERY_TIMEOUT", 0.2)
+    monkeypatch.setattr(predict, "_DB_EXECUTOR", executor)
+    monkeypatch.setattr(predict, "_DB_SLOTS", threading.BoundedSemaphore(1))
+    with TestClient(main.create_app()) as client:
+        yield client, predict, db
+    executor.shutdown(wait=True)
+
+
+def _reads(predict, outcome):
+    return predict.DB_READS._values.get((outcome,), 0.0)
+
+
+def _wait_for_slot(predict, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predict._DB_SLOTS.acquire(blocking=False):
+        assert time.monotonic() < deadline, "read slot never released"
+        time.sleep(0.01)
+    predict._DB_SLOTS.release()
+
+
+def test_latest_row(api):
+    client, predict, _ = api
+    ok = _reads(predict, "ok")
+    response = client.get("/api/predict/energy", headers=HEADERS)
+    assert response.status_code == 200 and response.json() == {"id": 1, "demand": 42.0}
+    assert _reads(predict, "ok") == ok + 1
+
+
+def test_busy_when_all_slots_are_taken(api):
+    client, predict, _ = api
+    busy = _reads(predict, "busy")
+    assert predict._DB_SLOTS.acquire(blocking=False)
+    try:
+        response = client.get("/api/predict/energy", headers=HEADERS)
+        assert response.status_code == 503
+        assert _reads(predict, "busy") == busy + 1
+    finally:
+        predict._DB_SLOTS.release()
+    assert client.get("/api/predict/energy", headers=HEADERS).status_code == 200
+
+
+def test_request_timeout_holds_slot_until_worker_finishes(api, monkeypatch):
+    client, predict, _ = api
+    release = threading.Event()
+
+    def stuck(query, timeout):
+        release.wait(5)
+        return {"id": 0}
+
+    monkeypatch.setattr(predict, "_fetch_one", stuck)
+    timeouts = _reads(predict, "timeout")
+    start = time.monotonic()
+    response = client.get("/api/predict/energy", headers=HEADERS)
+    assert response.status_code == 504
+    assert 0.2 + 0.5 <= time.monotonic() - start < 3
+    assert _reads(predict, "timeout") == timeouts + 1
+
+    # The abandoned worker still owns the only slot
+    assert client.get("/api/predict/energy", headers=HEADERS).status_code == 503
+    release.set()
+    _wait_for_slot(predict)
+    assert client.get("/api/predict/energy", headers=HEADERS).json() == {"id": 0}
+
+
+def test_slow_query_is_interrupted(api):
+    client, predict, db = api
+    con = sqlite3.connect(db)
+    con.execute("DROP TABLE energy_predictions")
+    con.execute(SLOW_VIEW)
+    con.commit()
+    con.close()
+
+    start = time.monotonic()
+    response = client.get("/api/predict/energy", headers=HEADERS)
+    assert response.status_code == 504
+    # Interrupted at the query deadline, before the request timeout
+    assert time.monotonic() - start < 0.2 + 0.5
+    # The worker is done, so the slot is free straight away
+    assert predict._DB_SLOTS.acquire(blocking=False)
+    predict._DB_SLOTS.release()
+
+
+def test_locked_db_times_out(api):
+    client, predict, db = api
+    writer = sqlite3.connect(db, isolation_level=None)
+    writer.execute("BEGIN EXCLUSIVE")
+    try:
+        timeouts = _reads(predict, "timeout")
+        start = time.monotonic()
+        response = client.get("/api/predict/energy", headers=HEADERS)
+        assert response.status_code == 504
+        assert time.monotonic() - start < 0.2 + 0.5
+        assert _reads(predict, "timeout") == timeouts + 1
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+    _wait_for_slot(predict)
+    assert client.get("/api/predict/energy", headers=HEADERS).status_code == 200
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from ml import profiling
+
+
+@pytest.fixture(autouse=True)
+def disarmed(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    profiling.arm(0)
+    yield
+    profiling.arm(0)
+
+
+@pytest.mark.parametrize("count,kinds", [("three", "job"), ("2", "job,bogus"), ("2", "bogus")])
+def test_bad_env_settings_are_ignored(monkeypatch, count, kinds):
+    monkeypatch.setenv("ECOGRID_PROFILE_NEXT", count)
+    monkeypatch.setenv("ECOGRID_PROFILE_KINDS", kinds)
+    profiling._arm_from_env()
+    expected_job = 2 if kinds == "job,bogus" else 0
+    assert profiling.status()["remaining"] == {"job": expected_job, "request": 0}
+
+
+def test_capture_seeds_block_and_restores_global_rng():
+    profiling.arm(1, ["job"])
+    np.random.seed(123)
+    state = np.random.get_state()
+    with profiling.maybe_profile("job", "demo") as meta:
+        inside = np.random.random(3)
+    after = np.random.random(3)
+
+    np.random.set_state(state)
+    assert np.array_equal(after, np.random.random(3))
+    np.random.seed(meta["seed"])
+    assert np.array_equal(inside, np.random.random(3))
+    assert profiling.list_captures()[0]["seed"] == meta["seed"]
@@ -0,0 +1,101 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from ml import cascade, retention
+
+NOW = datetime(2026, 3, 20, 12, 5)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(cascade, "DB_PATH", str(tmp_path / "cascade.db"))
+    monkeypatch.setattr(retention, "BATCH_PAUSE_SECONDS", 0)
+    cascade._init_db()
+    rng = np.random.default_rng(5)
+    con = sqlite3.connect(cascade.DB_PATH)
+    energy, water = [], []
+    for i in range(10 * 24 * 6):
+        ts = (NOW - timedelta(minutes=10 * i)).isoformat()
+        energy.append((ts, json.dumps(rng.normal(500, 50, 6).round(3).tolist()), int(rng.random() < 0.1), float(rng.random())))
+        water.append((ts, "[1, 2]", "[]", int(rng.integers(0, 3)), float(rng.random())))
+    with con:
+        con.executemany("INSERT INTO energy_predictions(timestamp, preds_json, anomaly, anomaly_score) VALUES (?, ?, ?, ?)", energy)
+        con.executemany(
+            "INSERT INTO water_predictions(timestamp, zone_ids, preds_json, anomaly_count, avg_anomaly_score) VALUES (?, ?, ?, ?, ?)", water
+        )
+    con.close()
+    return cascade.DB_PATH, energy, water
+
+
+def _expected(rows, cutoff):
+    buckets = {}
+    for row in rows:
+        if row[0] < cutoff:
+            buckets.setdefault(row[0][:13] + ":00:00", []).append(row)
+    return buckets
+
+
+def test_batched_compaction_matches_single_pass(db):
+    path, energy, water = db
+    cutoff = (NOW - timedelta(days=7)).replace(minute=0).isoformat()
+    # 7 rows per batch splits every hourly bucket across batches
+    summary = retention.apply_retention(path, raw_days=7, batch_size=7, now=NOW)
+    expected_energy = _expected(energy, cutoff)
+    expected_water = _expected(water, cutoff)
+    assert summary["energy_compacted"] == sum(map(len, expected_energy.values()))
+    assert summary["water_compacted"] == sum(map(len, expected_water.values()))
+
+    con = sqlite3.connect(path)
+    assert con.execute("SELECT COUNT(*) FROM energy_predictions WHERE timestamp < ?", (cutoff,)).fetchone()[0] == 0
+    assert con.execute("SELECT COUNT(*) FROM energy_predictions").fetchone()[0] == len(energy) - summary["energy_compacted"]
+    hourly = {r[0]: r[1:] for r in con.execute("SELECT bucket, samples, preds_mean_json, anomaly_count, score_sum, score_max FROM energy_predictions_hourly")}
+    assert set(hourly) == set(expected_energy)
+    for bucket, rows in expected_energy.items():
+        samples, preds_mean, anomalies, score_sum, score_max = hourly[bucket]
+        assert samples == len(rows) and anomalies == sum(r[2] for r in rows)
+        np.testing.assert_allclose(json.loads(preds_mean), np.mean([json.loads(r[1]) for r in rows], axis=0))
+        assert score_sum == pytest.approx(sum(r[3] for r in rows))
+        assert score_max == max(r[3] for r in rows)
+
+    water_hourly = {r[0]: r[1:] for r in con.execute("SELECT bucket, samples, anomaly_count, score_sum, score_max FROM water_predictions_hourly")}
+    con.close()
+    for bucket, rows in expected_water.items():
+        samples, anomalies, score_sum, score_max = water_hourly[bucket]
+        assert (samples, anomalies) == (len(rows), sum(r[3] for r in rows))
+        assert score_sum == pytest.approx(sum(r[4] for r in rows)) and score_max == max(r[4] for r in rows)
+
+
+def test_each_batch_commits_separately(db, monkeypatch):
+    path, _, _ = db
+    sizes = []
+    step = retention._compact_water_batch
+
+    def counting(con, cutoff, batch_size):
+        # Every batch runs in its own explicit transaction
+        assert con.in_transaction
+        n = step(con, cutoff, batch_size)
+        sizes.append(n)
+        return n
+
+    monkeypatch.setattr(retention, "_compact_water_batch", counting)
+    summary = retention.apply_retention(path, raw_days=7, batch_size=50, now=NOW)
+    assert sizes[-1] == 0 and all(0 < n <= 50 for n in sizes[:-1])
+    assert sum(sizes) == summary["water_compacted"]
+
+
+def test_rerun_is_idempotent_and_expires_aggregates(db):
+    path, _, _ = db
+    retention.apply_retention(path, raw_days=7, batch_size=100, now=NOW)
+    again = retention.apply_retention(path, raw_days=7, batch_size=100, now=NOW)
+    assert again["energy_compacted"] == again["water_compacted"] == 0
+
+    expired = retention.apply_retention(path, raw_days=7, agg_days=8, batch_size=10, now=NOW)
+    con = sqlite3.connect(path)
+    oldest = con.execute("SELECT MIN(bucket) FROM energy_predictions_hourly").fetchone()[0]
+    con.close()
+    assert expired["energy_agg_expired"] > 0
+    assert oldest >= (NOW - timedelta(days=8)).replace(minute=0).isoformat()
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from ml import energy_model
+
+
+class _LastStepModel:
+    """Predicts the last step's scaled features, so outputs expose the windows."""
+
+    def __init__(self):
+        self.inputs = []
+
+    def predict(self, X, batch_size=None, verbose=0):
+        self.inputs.append(np.array(X))
+        return X[:, -1, :]
+
+
+@pytest.fixture
+def history():
+    return energy_model._simulate_energy_series(datetime(2026, 1, 1), 24 * 5 + 25)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = _LastStepModel()
+    monkeypatch.setattr(energy_model, "_load_or_train_energy", lambda: fake)
+    return fake
+
+
+def test_one_window_per_day_ending_at_latest_row(history, model):
+    out = energy_model.simulate_energy_scenarios({}, days=5, df_history=history)
+    assert out["windows"] == 5 and out["scenarios"] == []
+
+    scaled, _, _ = energy_model._energy_feature_block(history)
+    energy_model.fit_scale_inplace(scaled)
+    windows = model.inputs[0]
+    assert windows.shape == (5, 24, len(energy_model.ENERGY_FEATURE_COLS))
+    for i, window in enumerate(windows):
+        end = len(scaled) - 1 - 24 * i
+        np.testing.assert_array_equal(window, scaled[end - 23 : end + 1])
+
+
+def test_windows_capped_by_available_history(history, model):
+    out = energy_model.simulate_energy_scenarios({}, days=30, df_history=history)
+    assert out["windows"] == 6
+
+
+def test_perturbations_shift_only_their_feature(history, model):
+    out = energy_model.simulate_energy_scenarios({"temperature": [1.0, 2.0], "humidity": [5.0]}, days=3, df_history=history)
+    assert [s["perturbation"] for s in out["scenarios"]] == [
+        {"temperature": 1.0, "humidity": 5.0},
+        {"temperature": 2.0, "humidity": 5.0},
+    ]
+    X = model.inputs[0].reshape(3, 3, 24, -1)
+    shifted = X[1:] - X[:1]
+    temp, hum = energy_model.ENERGY_FEATURE_COLS.index("temperature"), energy_model.ENERGY_FEATURE_COLS.index("humidity")
+    untouched = [j for j in range(X.shape[-1]) if j not in (temp, hum)]
+    assert np.allclose(shifted[..., untouched], 0)
+    np.testing.assert_allclose(shifted[1, ..., temp], 2 * shifted[0, ..., temp], rtol=1e-4)
+    assert np.all(shifted[..., hum] > 0)
+
+
+def test_oversized_grid_rejected_before_fetching(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("history fetched for a grid that is rejected")
+
+    monkeypatch.setattr(energy_model, "fetch_energy_data", fail)
+    monkeypatch.setattr(energy_model, "product", fail)
+    huge = {name: range(1000) for name in energy_model.SCENARIO_FEATURES}
+    with pytest.raises(ValueError, match="too large"):
+        energy_model.simulate_energy_scenarios(huge)
+
+
+def test_grid_times_windows_rejected_before_building(history, model, monkeypatch):
+    monkeypatch.setattr(energy_model, "MAX_SCENARIO_WINDOWS", 10)
+    monkeypatch.setattr(energy_model, "product", lambda *a: pytest.fail("grid built"))
+    with pytest.raises(ValueError, match="3 scenarios x 5 windows"):
+        energy_model.simulate_energy_scenarios({"temperature": [1.0, 2.0]}, days=5, df_history=history)
+    assert model.inputs == []
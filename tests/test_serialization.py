@@ -0,0 +1,92 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+
+from backend.app import serialization
+
+
+def _decode_array(obj, data=None):
+    # Wire arrays are little-endian with the byte-order mark stripped from dtype
+    raw = base64.b64decode(obj["data"]) if data is None else data
+    return np.frombuffer(raw, dtype="<" + obj["dtype"]).reshape(obj["shape"])
+
+
+CONTENT = {
+    "floats": np.linspace(0, 1, 12).reshape(3, 4),
+    "view": np.arange(20, dtype=np.float64).reshape(4, 5)[:, ::2],
+    "big_endian": np.arange(3, dtype=">f8"),
+    "big_int": np.array([1, 2], dtype=">i4"),
+    "ints": np.array([[1, -2], [3, 4]], dtype=np.int64),
+    "flags": np.array([True, False, True]),
+    "scalar": np.float32(0.5),
+    "zones": [1, 2],
+}
+
+
+def _expected_lists():
+    return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in CONTENT.items()}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_round_trip(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    decoded = json.loads(serialization.encode_json(CONTENT))
+    expected = _expected_lists()
+    assert decoded.keys() == expected.keys()
+    for key in expected:
+        np.testing.assert_allclose(decoded[key], expected[key], rtol=1e-6)
+    assert decoded["big_endian"] == [0.0, 1.0, 2.0] and decoded["big_int"] == [1, 2]
+    assert decoded["flags"] == [True, False, True] and isinstance(decoded["ints"][0][0], int)
+
+
+def test_b64_round_trip():
+    decoded = json.loads(serialization.encode_b64_json(CONTENT))
+    for key in ("floats", "view", "big_endian"):
+        arr = _decode_array(decoded[key])
+        assert arr.dtype == np.float32
+        np.testing.assert_allclose(arr, CONTENT[key], rtol=1e-6)
+    for key in ("big_int", "ints", "flags"):
+        arr = _decode_array(decoded[key])
+        assert arr.dtype.kind == CONTENT[key].dtype.kind
+        np.testing.assert_array_equal(arr, CONTENT[key])
+    assert decoded["scalar"] == 0.5 and decoded["zones"] == [1, 2]
+
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+    response = serialization.negotiated_response(CONTENT, serialization.MEDIA_MSGPACK)
+    assert response.media_type == serialization.MEDIA_MSGPACK
+    decoded = msgpack.unpackb(response.body, raw=False)
+    for key in ("floats", "view", "big_endian", "big_int", "ints", "flags"):
+        np.testing.assert_allclose(_decode_array(decoded[key], decoded[key]["data"]), CONTENT[key], rtol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "accept,media",
+    [
+        (None, serialization.MEDIA_JSON),
+        ("*/*", serialization.MEDIA_JSON),
+        ("application/json;q=0.5, application/vnd.ecogrid.b64+json", serialization.MEDIA_B64_JSON),
+        ("application/vnd.ecogrid.b64+json;q=0.2, application/json;q=0.9", serialization.MEDIA_JSON),
+        ("application/vnd.ecogrid.b64+json;q=0, */*", serialization.MEDIA_JSON),
+        ("text/html, application/vnd.ecogrid.b64+json;q=0.1", serialization.MEDIA_B64_JSON),
+        ("application/vnd.ecogrid.b64+json;q=bogus", serialization.MEDIA_JSON),
+    ],
+)
+def test_accept_q_values(accept, media):
+    response = serialization.negotiated_response({"a": np.zeros(2)}, accept)
+    assert response.media_type == media
+    assert response.headers["vary"] == "Accept"
+
+
+def test_msgpack_falls_back_to_json_without_msgpack(monkeypatch):
+    monkeypatch.setattr(serialization, "msgpack", None)
+    response = serialization.negotiated_response({"a": np.arange(3)}, "application/msgpack")
+    assert response.media_type == serialization.MEDIA_JSON
+    assert json.loads(response.body) == {"a": [0, 1, 2]}
+    assert response.headers["vary"] == "Accept"
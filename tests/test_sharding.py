@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from ml import features, sharding
+
+
+class _Proc:
+    def __init__(self, alive):
+        self.alive = alive
+        self.exitcode = None if alive else 1
+
+    def is_alive(self):
+        return self.alive
+
+
+class _Inbox:
+    def __init__(self):
+        self.items = []
+
+    def put(self, item):
+        self.items.append(item)
+
+
+def test_hash_ring_balances_zones():
+    owned = sharding.shard_zones(list(range(1, 10001)), 8)
+    sizes = [len(z) for z in owned.values()]
+    assert sum(sizes) == 10000
+    # Shares spread about 1/sqrt(64 virtual nodes) around the mean
+    assert max(sizes) < 1.5 * 1250 and min(sizes) > 0.6 * 1250
+
+
+def test_hash_ring_is_deterministic_and_moves_few_zones_on_resize():
+    zones = list(range(1, 5001))
+    before = sharding.shard_zones(zones, 8)
+    assert sharding.shard_zones(zones, 8) == before
+    after = sharding.shard_zones(zones, 9)
+    owner_before = {z: s for s, zs in before.items() for z in zs}
+    owner_after = {z: s for s, zs in after.items() for z in zs}
+    moved = [z for z in zones if owner_before[z] != owner_after[z]]
+    # Only zones taken over by the new shard move (about 1/9 of them)
+    assert all(owner_after[z] == 8 for z in moved)
+    assert len(moved) < 2 * len(zones) / 9
+
+
+def test_single_node_ring_and_empty_ring():
+    assert sharding.shard_zones([3, 1, 2], 1) == {0: [1, 2, 3]}
+    with pytest.raises(ValueError):
+        sharding.HashRing([])
+
+
+def _coordinator(alive):
+    coord = sharding.ShardCoordinator(":memory:", shards=len(alive), zone_ids=range(1, 9))
+    coord._procs = [_Proc(a) for a in alive]
+    coord._inboxes = [_Inbox() for _ in alive]
+    return coord
+
+
+def test_dead_shard_is_dropped_from_pending_ticks():
+    coord = _coordinator([True, True, True])
+    first = coord.dispatch_tick()
+    assert coord.status()["pending"] == {first: [0, 1, 2]}
+
+    coord._procs[1].alive = False
+    second = coord.dispatch_tick()
+    assert coord.status()["pending"] == {first: [0, 2], second: [0, 2]}
+    assert len(coord._inboxes[1].items) == 1
+
+
+def test_tick_owed_only_by_dead_shards_is_abandoned():
+    coord = _coordinator([True, True])
+    first = coord.dispatch_tick()
+    with coord._lock:
+        coord._pending[first].discard(0)
+    coord._procs[1].alive = False
+    coord.dispatch_tick()
+    assert first not in coord.status()["pending"]
+
+
+def test_ticks_carry_shared_bounds():
+    coord = _coordinator([True, True])
+    bounds = (np.zeros(5, np.float32), np.ones(5, np.float32))
+    tick = coord.dispatch_tick(bounds)
+    for inbox in coord._inboxes:
+        assert inbox.items[-1][0] == tick and inbox.items[-1][2] is bounds
+
+
+def test_shared_bounds_scale_subsets_like_the_whole():
+    rng = np.random.default_rng(0)
+    block = rng.normal(size=(60, 5)).astype(np.float32)
+    bounds = (block.min(axis=0), block.max(axis=0))
+    whole = block.copy()
+    features.fit_scale_inplace(whole)
+    part = block[20:45].copy()
+    features.fit_scale_inplace(part, bounds)
+    np.testing.assert_array_equal(part, whole[20:45])
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from ml import cascade, thresholds
+
+
+def test_calibrate_matches_numpy_quantiles_per_group():
+    rng = np.random.default_rng(1)
+    groups = rng.integers(1, 8, size=5000)
+    errors = rng.gamma(2.0, groups / 10.0)
+    result = thresholds.calibrate(errors, quantile=0.99, groups=groups)
+
+    assert result["samples"] == 5000
+    assert result["default"] == pytest.approx(np.quantile(errors, 0.99))
+    assert set(result["per_zone"]) == {str(g) for g in range(1, 8)}
+    for g in range(1, 8):
+        assert result["per_zone"][str(g)] == pytest.approx(np.quantile(errors[groups == g], 0.99))
+
+
+def test_calibrate_single_sample_group():
+    result = thresholds.calibrate(np.array([0.5, 1.0, 2.0]), quantile=0.9, groups=np.array([1, 1, 2]))
+    assert result["per_zone"]["2"] == 2.0
+    assert result["per_zone"]["1"] == pytest.approx(np.quantile([0.5, 1.0], 0.9))
+
+
+def test_resolve_uses_zone_then_default_then_fallback(tmp_path):
+    model_path = str(tmp_path / "ae.h5")
+    assert thresholds.resolve_thresholds(model_path, 0.8, zone_ids=[1, 2], n=2).tolist() == [0.8, 0.8]
+
+    saved = thresholds.calibrate(np.arange(100.0), quantile=0.5, groups=np.repeat([1, 2], 50))
+    thresholds.save_thresholds(model_path, saved)
+    resolved = thresholds.resolve_thresholds(model_path, 0.8, zone_ids=[2, 9, 1, 2], n=4)
+    assert resolved.tolist() == [saved["per_zone"]["2"], saved["default"], saved["per_zone"]["1"], saved["per_zone"]["2"]]
+
+
+def test_water_anomalies_scored_in_sensor_units(tmp_path, monkeypatch):
+    monkeypatch.setattr(cascade, "DB_PATH", str(tmp_path / "cascade.db"))
+    cascade._init_db()
+    scaled = np.array([[0.4, 0.6], [0.5, 0.7]], dtype=np.float32)
+    sensor = np.array([[60.0, 3.9], [65.0, 4.1]], dtype=np.float32)
+    scored = {}
+
+    def detect(observed, threshold=None, zone_ids=None):
+        scored["observed"] = observed
+        return np.zeros(len(observed), dtype=bool), np.zeros(len(observed))
+
+    monkeypatch.setattr(cascade, "fetch_water_data", lambda **kwargs: None)
+    monkeypatch.setattr(cascade, "predict_water_conditions", lambda **kwargs: (scaled, {"zones": [1, 2], "sensor_preds": sensor}))
+    monkeypatch.setattr(cascade, "detect_water_anomalies", detect)
+    cascade.run_water_forecast()
+    noise = scored["observed"] - sensor
+    assert np.all(np.abs(noise) < 6 * cascade.WATER_SENSOR_NOISE)
@@ -0,0 +1,154 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from ml import training
+
+keras_callbacks = training.keras_callbacks
+if keras_callbacks is None:  # pragma: no cover
+    pytest.skip("TensorFlow is required", allow_module_level=True)
+
+from tensorflow.keras import layers, models
+
+
+def _build():
+    inp = layers.Input(shape=(3,))
+    model = models.Model(inputs=inp, outputs=layers.Dense(1)(inp))
+    model.compile(optimizer="adam", loss="mse")
+    return model
+
+
+def _data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(40, 3)).astype(np.float32)
+    return X, X @ np.array([[1.0], [-2.0], [0.5]], dtype=np.float32)
+
+
+def _checkpoint(model, tmp_path, name="m"):
+    cb = training.CheckpointState(str(tmp_path), name)
+    cb.set_model(model)
+    return cb
+
+
+def _set_weights(model, value):
+    model.set_weights([np.full_like(w, value) for w in model.get_weights()])
+
+
+def _early_stopping(cbs):
+    return next(cb for cb in cbs if isinstance(cb, keras_callbacks.EarlyStopping))
+
+
+def _checkpoint_cb(cbs):
+    return next(cb for cb in cbs if isinstance(cb, training.CheckpointState))
+
+
+def test_checkpoint_writes_are_atomic(tmp_path, monkeypatch):
+    model = _build()
+    cb = _checkpoint(model, tmp_path)
+    cb.on_epoch_end(0, {"val_loss": 1.0})
+    last, best, state = training._paths(str(tmp_path), "m")
+    assert all(os.path.exists(p) for p in (last, best, state))
+    assert not [f for f in os.listdir(tmp_path) if ".tmp" in f]
+
+    # A kill mid-save leaves the previous checkpoint intact
+    before = {p: open(p, "rb").read() for p in (last, best, state)}
+
+    def crash(path, *args, **kwargs):
+        open(path, "wb").write(b"partial")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(model, "save", crash)
+    monkeypatch.setattr(model, "save_weights", crash)
+    with pytest.raises(KeyboardInterrupt):
+        cb.on_epoch_end(1, {"val_loss": 0.5})
+    assert {p: open(p, "rb").read() for p in (last, best, state)} == before
+    assert json.load(open(state))["epoch"] == 0
+    assert training._load_state(str(tmp_path), "m")["best_val_loss"] == 1.0
+
+
+def test_resume_continues_after_last_epoch_with_baseline(tmp_path):
+    X, y = _data()
+    model, initial_epoch, cbs = training.prepare_training("m", _build, str(tmp_path), resume=True, patience=2)
+    assert initial_epoch == 0 and _early_stopping(cbs).baseline is None
+    model.fit(X, y, epochs=3, initial_epoch=initial_epoch, validation_split=0.25, callbacks=cbs, verbose=0)
+    state = training._load_state(str(tmp_path), "m")
+    assert state["epoch"] == 2
+
+    resumed, initial_epoch, cbs = training.prepare_training("m", _build, str(tmp_path), resume=True, patience=2)
+    assert initial_epoch == 3
+    assert _early_stopping(cbs).baseline == state["best_val_loss"]
+    assert _checkpoint_cb(cbs).best == state["best_val_loss"]
+    assert _checkpoint_cb(cbs).started_at == state["started_at"]
+    # The restored model carries its optimizer state
+    assert int(resumed.optimizer.iterations.numpy()) == int(model.optimizer.iterations.numpy())
+
+    resumed.fit(X, y, epochs=5, initial_epoch=initial_epoch, validation_split=0.25, callbacks=cbs, verbose=0)
+    assert training._load_state(str(tmp_path), "m")["epoch"] == 4
+
+
+def test_best_weights_restored_across_resumed_segments(tmp_path):
+    model = _build()
+    cb = _checkpoint(model, tmp_path)
+    _set_weights(model, 1.0)
+    cb.on_epoch_end(0, {"val_loss": 1.0})
+    _set_weights(model, 2.0)
+    cb.on_epoch_end(1, {"val_loss": 2.0})
+
+    # Second segment never beats the first segment's best
+    resumed, initial_epoch, cbs = training.prepare_training("m", _build, str(tmp_path), resume=True, patience=5)
+    assert initial_epoch == 2
+    np.testing.assert_array_equal(resumed.get_weights()[0], 2.0)
+    _set_weights(resumed, 3.0)
+    cb = _checkpoint_cb(cbs)
+    cb.set_model(resumed)
+    cb.on_epoch_end(2, {"val_loss": 3.0})
+    cb.on_train_end()
+    for w in resumed.get_weights():
+        np.testing.assert_array_equal(w, 1.0)
+
+
+def test_resume_when_already_finished(tmp_path):
+    X, y = _data()
+    model, initial_epoch, cbs = training.prepare_training("m", _build, str(tmp_path), patience=3)
+    model.fit(X, y, epochs=2, validation_split=0.25, callbacks=cbs, verbose=0)
+    best = model.get_weights()
+
+    resumed, initial_epoch, cbs = training.prepare_training("m", _build, str(tmp_path), resume=True, patience=3)
+    assert initial_epoch == 2
+    _set_weights(resumed, 0.0)
+    history = resumed.fit(X, y, epochs=2, initial_epoch=initial_epoch, validation_split=0.25, callbacks=cbs, verbose=0)
+    assert history.history == {}
+    for got, want in zip(resumed.get_weights(), best):
+        np.testing.assert_allclose(got, want)
+    assert training._load_state(str(tmp_path), "m")["epoch"] == 1
+
+
+def test_clear_checkpoint_after_save_starts_fresh(tmp_path):
+    model = _build()
+    _checkpoint(model, tmp_path).on_epoch_end(4, {"val_loss": 1.0})
+    training.clear_checkpoint(str(tmp_path), "m")
+    assert os.listdir(tmp_path) == []
+    training.clear_checkpoint(str(tmp_path), "m")
+    training.clear_checkpoint(None, "m")
+
+    _, initial_epoch, cbs = training.prepare_training("m", _build, str(tmp_path), resume=True, patience=2)
+    assert initial_epoch == 0 and _checkpoint_cb(cbs).best == float("inf")
+
+
+def test_fresh_run_discards_stale_checkpoint(tmp_path):
+    model = _build()
+    _checkpoint(model, tmp_path).on_epoch_end(4, {"val_loss": 1.0})
+    _, initial_epoch, _ = training.prepare_training("m", _build, str(tmp_path), resume=False)
+    assert initial_epoch == 0 and os.listdir(tmp_path) == []
+
+
+def test_unreadable_checkpoint_starts_fresh(tmp_path):
+    model = _build()
+    _checkpoint(model, tmp_path).on_epoch_end(0, {"val_loss": 1.0})
+    last, _, _ = training._paths(str(tmp_path), "m")
+    open(last, "wb").write(b"corrupt")
+    _, initial_epoch, cbs = training.prepare_training("m", _build, str(tmp_path), resume=True, patience=2)
+    assert initial_epoch == 0 and _early_stopping(cbs).baseline is None
+    assert not os.path.exists(last)
@@ -0,0 +1,70 @@
+import sqlite3
+
+from ml import tune
+
+
+def test_crashing_trial_is_marked_failed_and_retried(tmp_path, monkeypatch):
+    db = str(tmp_path / "tuning.db")
+    calls = []
+
+    def trial(pipeline, study, trial_id, params, *args):
+        calls.append(trial_id)
+        if trial_id == 1 and calls.count(1) == 1:
+            raise RuntimeError("NaN loss")
+        return {"trial_id": trial_id, "params": params, "status": "complete", "best_val_loss": 0.1 * trial_id, "epochs_run": 2, "seconds": 0.0}
+
+    monkeypatch.setattr(tune, "prepare_dataset", lambda *args: str(tmp_path))
+    monkeypatch.setattr(tune, "_run_trial", trial)
+    tune.run_search(trials=3, workers=0, study="s", db_path=db)
+
+    con = sqlite3.connect(db)
+    statuses = dict(con.execute("SELECT trial_id, status FROM tuning_trials WHERE study = 's'").fetchall())
+    assert statuses == {0: "complete", 1: "failed", 2: "complete"}
+
+    tune.run_search(trials=3, workers=0, study="s", db_path=db)
+    assert calls == [0, 1, 2, 1]
+    statuses = dict(con.execute("SELECT trial_id, status FROM tuning_trials WHERE study = 's'").fetchall())
+    con.close()
+    assert statuses == {0: "complete", 1: "complete", 2: "complete"}
+    assert [t["trial_id"] for t in tune.best_trials("s", db_path=db)] == [0, 1, 2]
+
+
+class _Stoppable:
+    stop_training = False
+
+
+def test_pruner_median_ignores_pruned_and_failed_trials(tmp_path):
+    db = str(tmp_path / "tuning.db")
+    tune._init_tuning_db(db)
+    con = sqlite3.connect(db)
+    with con:
+        # Trials 1-2 completed, 3 is still running, 4-6 stopped early with poor losses
+        con.executemany(
+            "INSERT INTO tuning_epochs(study, trial_id, epoch, val_loss) VALUES ('s', ?, 2, ?)",
+            [(1, 0.4), (2, 0.4), (3, 0.45), (4, 5.0), (5, 5.0), (6, 5.0)],
+        )
+        con.executemany(
+            "INSERT INTO tuning_trials(study, trial_id, status) VALUES ('s', ?, ?)",
+            [(1, "complete"), (2, "complete"), (4, "pruned"), (5, "failed"), (6, "failed")],
+        )
+    con.close()
+
+    pruner = tune._MedianPruner(db, "s", trial_id=9, warmup_epochs=1, min_trials=3)
+    pruner.set_model(_Stoppable())
+    pruner.on_epoch_end(2, {"val_loss": 0.5})
+    # Median of 0.4, 0.4, 0.45; the stopped trials would have lifted it to 2.7
+    assert pruner.pruned and pruner.model.stop_training
+
+
+def test_retried_trial_starts_with_a_clean_history(tmp_path):
+    db = str(tmp_path / "tuning.db")
+    tune._init_tuning_db(db)
+    con = sqlite3.connect(db)
+    with con:
+        con.execute("INSERT INTO tuning_epochs(study, trial_id, epoch, val_loss) VALUES ('s', 1, 4, 9.0)")
+        con.execute("INSERT INTO tuning_trials(study, trial_id, status) VALUES ('s', 1, 'failed')")
+    pruner = tune._MedianPruner(db, "s", trial_id=1, warmup_epochs=1, min_trials=3)
+    pruner.on_train_begin()
+    assert con.execute("SELECT COUNT(*) FROM tuning_epochs").fetchone()[0] == 0
+    assert con.execute("SELECT COUNT(*) FROM tuning_trials").fetchone()[0] == 0
+    con.close()
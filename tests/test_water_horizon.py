@@ -0,0 +1,115 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from ml import water_model
+
+
+class _SlowModel:
+    def __init__(self):
+        self.calls = 0
+
+    def predict_on_batch(self, window):
+        self.calls += 1
+        time.sleep(0.001)
+        return window[:, -1, [1, 0]]
+
+
+@pytest.fixture
+def horizon(monkeypatch):
+    model = _SlowModel()
+    data = {"end": datetime(2026, 3, 1, 12)}
+
+    def fetch(hours_back=6, **kwargs):
+        end = data["end"]
+        np.random.seed(int(end.timestamp()) % 2**32)
+        return water_model._simulate_water_series(end - timedelta(hours=hours_back), end, [1, 2, 3])
+
+    monkeypatch.setattr(water_model, "fetch_water_data", fetch)
+    monkeypatch.setattr(water_model, "_load_or_train_water_lstm", lambda: model)
+    monkeypatch.setattr(water_model, "_horizon_cache", {})
+    monkeypatch.setattr(water_model, "_horizon_key_locks", {})
+    return model, data
+
+
+def test_concurrent_misses_roll_out_once(horizon):
+    model, _ = horizon
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(water_model.forecast_water_horizon(steps=12))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert model.calls == 12
+    assert sum(not meta["cached"] for _, meta in results) == 1
+    first = results[0][0]
+    assert all(np.array_equal(out, first) for out, _ in results)
+
+
+def test_cached_rollout_is_read_only(horizon):
+    out, _ = water_model.forecast_water_horizon(steps=6)
+    with pytest.raises(ValueError):
+        out[0, 0, 0] = 0.0
+    again, meta = water_model.forecast_water_horizon(steps=6)
+    assert meta["cached"] and np.array_equal(again, out)
+
+
+def test_longer_request_continues_cached_rollout(horizon):
+    model, _ = horizon
+    short, _ = water_model.forecast_water_horizon(steps=6)
+    longer, meta = water_model.forecast_water_horizon(steps=24)
+    assert not meta["cached"] and model.calls == 24
+    np.testing.assert_array_equal(longer[:, :6], short)
+    df = water_model.fetch_water_data(hours_back=6)
+    full, _ = water_model.forecast_water_horizon(df, steps=24)
+    np.testing.assert_allclose(longer, full, rtol=1e-6)
+    _, meta = water_model.forecast_water_horizon(steps=12)
+    assert meta["cached"] and model.calls == 48
+
+
+def test_cache_keyed_on_latest_reading(horizon):
+    model, data = horizon
+    _, meta = water_model.forecast_water_horizon(steps=6)
+    assert meta["data_timestamp"] == "2026-03-01T12:00:00"
+    data["end"] += timedelta(minutes=10)
+    _, meta = water_model.forecast_water_horizon(steps=6)
+    assert not meta["cached"] and meta["data_timestamp"] == "2026-03-01T12:10:00"
+    assert model.calls == 2 * 6
+    assert list(water_model._horizon_key_locks) == [(12, water_model.pd.Timestamp("2026-03-01 12:10"))]
+
+
+def test_explicit_data_is_not_cached(horizon):
+    model, data = horizon
+    df = water_model.fetch_water_data(hours_back=6)
+    out, meta = water_model.forecast_water_horizon(df, steps=6)
+    assert out.shape == (3, 6, 2) and out.flags.writeable and not meta["cached"]
+    assert model.calls == 6 and water_model._horizon_cache == {}
+
+
+def test_real_fetch_hits_within_a_tick(monkeypatch):
+    model = _SlowModel()
+    clock = {"now": datetime(2026, 3, 1, 12, 3, 17, 123456)}
+
+    class _Clock(datetime):
+        @classmethod
+        def utcnow(cls):
+            return clock["now"]
+
+    monkeypatch.setattr(water_model, "datetime", _Clock)
+    monkeypatch.setattr(water_model, "_load_or_train_water_lstm", lambda: model)
+    monkeypatch.setattr(water_model, "_horizon_cache", {})
+    monkeypatch.setattr(water_model, "_horizon_key_locks", {})
+    metas = []
+    for _ in range(3):
+        clock["now"] += timedelta(seconds=41, microseconds=7)
+        metas.append(water_model.forecast_water_horizon(steps=6)[1])
+    assert [m["cached"] for m in metas] == [False, True, True] and model.calls == 6
+    assert metas[0]["data_timestamp"] == "2026-03-01T12:00:00"
+
+    clock["now"] += timedelta(minutes=10)
+    _, meta = water_model.forecast_water_horizon(steps=6)
+    assert not meta["cached"] and meta["data_timestamp"] == "2026-03-01T12:10:00"
+    assert len(water_model._horizon_key_locks) == 1
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+from ml import water_model
+
+
+@pytest.fixture
+def no_graph_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(water_model, "CITY_WATER_ZONES", 5)
+    water_model._graph_cache.clear()
+    return str(tmp_path / "missing.csv")
+
+
+def test_default_chain_propagates_downstream(no_graph_file):
+    result = water_model.impacted_zones({2: 1.0}, hops=3, decay=0.5, path=no_graph_file)
+    assert [(r["zone_id"], r["impact"], r["source"]) for r in result] == [
+        (2, 1.0, True), (3, 0.5, False), (4, 0.25, False), (5, 0.125, False),
+    ]
+
+
+def test_cache_holds_one_graph_per_file(no_graph_file):
+    for zones in ({1: 1.0}, {2: 1.0, 3: 0.5}, {4: 2.0, 900: 1.0}, {7: 1.0}):
+        water_model.impacted_zones(zones, path=no_graph_file)
+    assert list(water_model._graph_cache) == [no_graph_file]
+
+
+def test_zones_outside_graph_only_impact_themselves(no_graph_file):
+    result = water_model.impacted_zones({900: 3.0, 4: 1.0}, hops=2, decay=0.5, path=no_graph_file)
+    assert result[0] == {"zone_id": 900, "impact": 3.0, "source": True}
+    assert {r["zone_id"] for r in result} == {900, 4, 5}
+
+
+def test_graph_file_is_reloaded_when_changed(tmp_path):
+    path = tmp_path / "graph.csv"
+    path.write_text("source,target\n1,2\n")
+    water_model._graph_cache.clear()
+    _, nodes = water_model.load_zone_graph(path=str(path))
+    np.testing.assert_array_equal(nodes, [1, 2])
+    path.write_text("source,target,weight\n1,2,1\n1,3,3\n")
+    os.utime(path, (1, os.path.getmtime(path) + 10))
+    adjacency, nodes = water_model.load_zone_graph(path=str(path))
+    np.testing.assert_array_equal(nodes, [1, 2, 3])
+    np.testing.assert_allclose(adjacency.toarray()[0], [0, 0.25, 0.75])